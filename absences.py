@@ -0,0 +1,150 @@
+"""
+Absenz-Buchungen über beliebig lange Zeiträume.
+
+Die gebuchten Tage werden über einen Arbeitstag-Kalender (Wochenende,
+kantonale Feiertage) vektorisiert erzeugt. Das Ergebnis sind zwei
+DataFrames (Projekt-Rapport und AZK), die in einem einzigen
+Schreibvorgang gespeichert werden - ein Monat Ferien kostet gleich viel
+I/O wie ein einzelner Tag.
+"""
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+from lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
+if TYPE_CHECKING:
+    import pandas
+
+
+DEFAULT_CANTON = "ZH"
+WEEKMASK = "Mon Tue Wed Thu Fri"
+# Schutz vor Tippfehlern im Jahr (z.B. 2062 statt 2026), keine fachliche Grenze.
+MAX_RANGE_DAYS = 366
+
+# Feiertage relativ zu Ostersonntag bzw. als fixes Datum (Monat, Tag).
+EASTER_OFFSETS = {
+    "Karfreitag": -2,
+    "Ostermontag": 1,
+    "Auffahrt": 39,
+    "Pfingstmontag": 50,
+    "Fronleichnam": 60,
+}
+FIXED_DATES = {
+    "Neujahr": (1, 1),
+    "Berchtoldstag": (1, 2),
+    "Tag der Arbeit": (5, 1),
+    "Bundesfeier": (8, 1),
+    "Mariä Himmelfahrt": (8, 15),
+    "Allerheiligen": (11, 1),
+    "Mariä Empfängnis": (12, 8),
+    "Weihnachten": (12, 25),
+    "Stephanstag": (12, 26),
+}
+
+_BASE = ["Neujahr", "Karfreitag", "Ostermontag", "Auffahrt", "Pfingstmontag", "Bundesfeier", "Weihnachten", "Stephanstag"]
+_CATHOLIC = ["Fronleichnam", "Mariä Himmelfahrt", "Allerheiligen", "Mariä Empfängnis"]
+CANTON_HOLIDAYS: Dict[str, List[str]] = {
+    "ZH": _BASE + ["Berchtoldstag", "Tag der Arbeit"],
+    "BE": _BASE + ["Berchtoldstag"],
+    "AG": _BASE + ["Berchtoldstag"] + _CATHOLIC,
+    "LU": _BASE + ["Berchtoldstag"] + _CATHOLIC,
+    "SO": _BASE + ["Berchtoldstag", "Tag der Arbeit"] + _CATHOLIC,
+    "SG": _BASE + ["Allerheiligen"],
+    "TG": _BASE + ["Berchtoldstag", "Tag der Arbeit"],
+    "BL": _BASE + ["Tag der Arbeit"],
+    "BS": _BASE + ["Tag der Arbeit"],
+}
+
+
+def easter_sunday(year: int) -> date:
+    # Gregorianischer Osteralgorithmus (Meeus/Jones/Butcher)
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    month = (h + l - 7 * m + 90) // 25
+    day = (h + l - 7 * m + 33 * month + 19) % 32
+    return date(year, month, day)
+
+
+def holidays(years: Iterable[int], canton: str = DEFAULT_CANTON) -> Dict[date, str]:
+    """
+    Feiertage eines Kantons für die angegebenen Jahre (Datum -> Name).
+    Unbekannte Kantone erhalten die schweizweit üblichen Feiertage.
+    """
+    names = CANTON_HOLIDAYS.get(str(canton).upper(), _BASE)
+    result = {}
+    for year in years:
+        easter = easter_sunday(year)
+        for name in names:
+            if name in EASTER_OFFSETS:
+                result[easter + timedelta(days=EASTER_OFFSETS[name])] = name
+            else:
+                month, day = FIXED_DATES[name]
+                result[date(year, month, day)] = name
+    return result
+
+
+class WorkCalendar:
+    """
+    Arbeitstag-Kalender: Montag bis Freitag ohne kantonale Feiertage.
+    extra_holidays ergänzt betriebliche Ruhetage (z.B. Betriebsferien).
+    """
+
+    def __init__(self, canton: str = DEFAULT_CANTON, extra_holidays: Iterable = ()):
+        self.canton = str(canton or DEFAULT_CANTON).upper()
+        self.extra_holidays = {pd.Timestamp(d).date() for d in extra_holidays}
+
+    def holidays(self, start: date, end: date) -> List[date]:
+        days = set(holidays(range(start.year, end.year + 1), self.canton)) | self.extra_holidays
+        return sorted(d for d in days if start <= d <= end)
+
+    def business_days(self, start: date, end: date, skip_holidays: bool = True) -> pandas.DatetimeIndex:
+        if end < start:
+            return pd.DatetimeIndex([])
+        return pd.bdate_range(
+            start, end, freq="C", weekmask=WEEKMASK,
+            holidays=self.holidays(start, end) if skip_holidays else [],
+        )
+
+
+def build_absence_rows(
+    days: pandas.DatetimeIndex,
+    ts_str: str,
+    project: str,
+    user_name: str,
+    hours: float,
+    a_typ: str,
+    note: str,
+    status: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> Tuple[pandas.DataFrame, pandas.DataFrame]:
+    """
+    Erzeugt die Zeilen für Baustellen_Rapport.csv und Arbeitszeit_AKZ.csv.
+    Alle Tage eines Blocks teilen sich den Erfasst-Stempel (ein Hash pro Block).
+    Der eingegebene Zeitraum (von/bis) wird in der AZK mitgeschrieben, weil
+    Wochenenden und Feiertage an den Rändern nicht gebucht werden; nur so
+    lässt sich der Idempotenz-Hash später rekonstruieren.
+    """
+    base = pd.DataFrame({
+        "Erfasst": ts_str,
+        "Datum": days.strftime("%Y-%m-%d"),
+        "Projekt": project,
+        "Mitarbeiter": user_name,
+    })
+    rows_p = base.assign(Arbeit=f"Abwesenheit: {a_typ}", Material="", Bemerkung=note, Status=status)
+    rows_z = base.assign(
+        Start="-", Ende="-", Pause_Min=0, Stunden_Total=hours,
+        R_Wohn_Bau_Min=0, R_Bau_Wohn_Min=0, Reisezeit_bezahlt_Min=0,
+        Arbeitszeit_inkl_Reisezeit=hours, Absenz_Typ=a_typ, Status=status,
+        Absenz_Von=str(start_date or days.min().date()), Absenz_Bis=str(end_date or days.max().date()),
+    )
+    return rows_p, rows_z
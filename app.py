@@ -1,19 +1,35 @@
+from __future__ import annotations
+
 import streamlit as st
-import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 import time
-import io
-import hashlib
+import os
+import tempfile
 import urllib.parse
-from googleapiclient.http import MediaIoBaseDownload
+import uuid
 
 import drive_store as ds
+import lazy_imports
+from drive_changes import ChangeWatcher
+from prefetch import Prefetcher
+from jobs import JobRunner
+import jobs
+import rapport_query as rq
+import idempotency as idem
+import rapport_import as rimp
+import absences as absn
+import azk_export as azk
+import rollover
+from shared_cache import SharedCache, NullCache
+
+pd = lazy_imports.lazy_import("pandas")
 
 # ==========================================
 # 1. KOSMISCHE PARAMETER & KONSTANTEN (BACKEND)
 # ==========================================
 SPACING_27 = 27         
-BLOCK_SEC_108 = 108     # Idempotenz-Sperrfrist gegen Doppelklicks
+IDEMPOTENZ_TTL_SEC = 86400  # Sperrfrist für identische Buchungen (alle Sessions & Geräte)
+BILD_ENDUNGEN = ('.png', '.jpg', '.jpeg')  # Nur diese werden für st.image vorab geladen
 
 # Workflow Status
 ST_OFFEN = "Offen"
@@ -53,18 +69,28 @@ def init_session_state():
     if "user_role" not in st.session_state: st.session_state["user_role"] = ""
     if "user_name" not in st.session_state: st.session_state["user_name"] = ""
     if "view" not in st.session_state: st.session_state["view"] = "Start"
-    if "last_tx_time" not in st.session_state: st.session_state["last_tx_time"] = 0.0
-    if "last_tx_hash" not in st.session_state: st.session_state["last_tx_hash"] = ""
+    if "session_key" not in st.session_state: st.session_state["session_key"] = uuid.uuid4().hex
+
+@st.cache_resource(show_spinner=False)
+def get_idempotency_store() -> idem.IdempotencyStore:
+    return idem.IdempotencyStore(ttl_sec=IDEMPOTENZ_TTL_SEC)
+
+@st.cache_resource(show_spinner=False)
+def get_export_jobs() -> dict:
+    # Prozessweit, damit ein laufender Export Reruns und Sessions überdauert.
+    return {}
+
+@st.cache_resource(show_spinner=False)
+def get_work_calendar() -> absn.WorkCalendar:
+    sec = st.secrets.get("general", st.secrets)
+    return absn.WorkCalendar(sec.get("KANTON", absn.DEFAULT_CANTON), sec.get("BETRIEBSFERIEN", []))
 
 def check_idempotency(data_string: str) -> bool:
-    tx_hash = hashlib.md5(data_string.encode('utf-8')).hexdigest()
-    now = time.time()
-    if st.session_state["last_tx_hash"] == tx_hash:
-        if (now - st.session_state["last_tx_time"]) < BLOCK_SEC_108:
-            return False 
-    st.session_state["last_tx_hash"] = tx_hash
-    st.session_state["last_tx_time"] = now
-    return True
+    # Prozessübergreifend: gilt auch für zweite Tabs, andere Geräte und Reconnects.
+    return get_idempotency_store().claim(idem.tx_hash(data_string), label=st.session_state.get("user_name", ""))
+
+def release_idempotency(data_string: str):
+    get_idempotency_store().release(idem.tx_hash(data_string))
 
 def render_header():
     col_logo, col_name = st.columns([1, 6])
@@ -111,45 +137,202 @@ def validate_employee_data(df: pd.DataFrame) -> pd.DataFrame:
 # ==========================================
 # 4. DATEI-MANAGEMENT (Google Drive)
 # ==========================================
-@st.cache_data(ttl=108, show_spinner=False)
-def load_project_files_from_drive(_service, folder_id: str, project_name: str) -> list:
+# Cache-Einträge bleiben gültig, bis der Change-Feed die Generation des
+# Ordners bzw. der Datei hochzählt (siehe drive_changes.ChangeWatcher).
+# Gecachte Funktionen werfen bei Fehlern, damit Fehlschläge nicht im Cache
+# landen; die Wrapper darunter fangen sie ab.
+# Vor st.cache_data liegt ein gemeinsamer Cache aller Repliken (shared_cache);
+# Invalidierungen erhöhen dort einen Versionsstempel, der in die Generation
+# einfliesst und so auch die Caches der anderen Repliken ungültig macht.
+@st.cache_resource(show_spinner=False)
+def get_shared_cache():
+    try: cache = SharedCache()
+    except Exception as e: st.warning(f"Gemeinsamer Cache nicht verfügbar: {e}"); cache = NullCache()
+    ds.use_shared_cache(cache)
+    return cache
+
+@st.cache_resource(show_spinner=False)
+def get_change_watcher(folder_ids: tuple) -> ChangeWatcher:
+    return ChangeWatcher(ds.get_drive_service, folder_ids, on_change=ds.shared_cache().bump).start()
+
+@st.cache_resource(show_spinner=False)
+def get_prefetcher() -> Prefetcher:
+    return Prefetcher(ds.get_drive_service)
+
+# Lange Admin-Vorgänge laufen als Jobs mit Checkpoints (jobs.py); der Runner
+# übernimmt beim Start auch abgebrochene Jobs anderer oder früherer Prozesse.
+@st.cache_resource(show_spinner=False)
+def get_job_runner() -> JobRunner:
+    runner = JobRunner(ds.get_drive_service)
+    runner.register("delete_project", plan_delete_project)
+    runner.register("delete_employee", plan_delete_employee)
+    runner.register("rollover", plan_rollover)
+    return runner.start()
+
+def cache_generation(key: str, watcher=None) -> int:
+    watcher = watcher or st.session_state.get("change_watcher")
+    return (watcher.generation(key) if watcher else 0) + ds.shared_cache().version(key)
+
+def invalidate_cache(*keys: str):
+    ds.shared_cache().bump(*keys)
+    watcher = st.session_state.get("change_watcher")
+    if watcher: watcher.invalidate(*keys)
+    else: st.cache_data.clear()
+
+def refresh_cache():
+    watcher = st.session_state.get("change_watcher")
+    try: watcher.poll_once()
+    except Exception: st.cache_data.clear()
+
+@st.cache_data(max_entries=108, show_spinner=False)
+def load_csv(_service, folder_id: str, filename: str, generation: int = 0) -> pd.DataFrame:
+    df, fid = ds.read_csv(_service, folder_id, filename)
+    if fid is None: raise FileNotFoundError(filename)
+    return df
+
+@st.cache_data(max_entries=1080, show_spinner=False)
+def load_project_files_from_drive(_service, folder_id: str, project_name: str, generation: int = 0) -> list:
     if not folder_id: return []
-    try:
+    def fetch():
         query = f"'{folder_id}' in parents and trashed = false"
         results = _service.files().list(q=query, pageSize=1000, fields="files(id, name)").execute()
         return [f for f in results.get('files', []) if project_name in f.get('name', '')][:108]
-    except Exception: return []
-
-@st.cache_data(ttl=1080, show_spinner=False)
-def download_file_bytes(_service, file_id: str):
-    try:
-        request = _service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done: _, done = downloader.next_chunk()
-        return fh.getvalue()
+    shared = ds.shared_cache()
+    return shared.get_or_load(("listing", folder_id, project_name, shared.version(folder_id)), fetch)
+
+@st.cache_data(max_entries=216, show_spinner=False)
+def download_file_bytes(_service, file_id: str, generation: int = 0) -> bytes:
+    # Nur für Bilder; Blöcke landen im Spool-Puffer, gelesen wird einmal am Ende.
+    def fetch():
+        with tempfile.SpooledTemporaryFile(max_size=ds.SPOOL_MAX_SIZE) as fh:
+            ds.stream_download(_service, file_id, fh)
+            fh.seek(0)
+            return fh.read()
+    shared = ds.shared_cache()
+    key = ("media", file_id, shared.version(file_id))
+    return ds.coalesce(key + (generation,), lambda: shared.get_or_load(key, fetch))
+
+@st.cache_data(max_entries=108, show_spinner=False)
+def load_project_history(_service, P_FID: str, Z_FID: str, project: str, gen_p: int = 0, gen_z: int = 0):
+    df_hp = load_csv(_service, P_FID, "Baustellen_Rapport.csv", gen_p)
+    df_hz = load_csv(_service, Z_FID, "Arbeitszeit_AKZ.csv", gen_z)
+    if df_hp.empty or df_hz.empty or "Erfasst" not in df_hz.columns: return None
+    df_hz = validate_time_data(df_hz)
+    df_merged = pd.merge(df_hp, df_hz[["Erfasst", "Arbeitszeit_inkl_Reisezeit"]], on="Erfasst", how="left")
+    return df_merged[df_merged["Projekt"] == project].sort_values(by="Datum", ascending=False)
+
+def load_rapport_index(_service, P_FID: str, generation: int = 0) -> rq.RapportIndex:
+    # Pro Session und Datenstand: Seiten und Editor-Positionen einer Session beziehen sich nur auf ihren Index.
+    cached = st.session_state.get("rapport_index")
+    if cached and cached[0] == (P_FID, generation): return cached[1]
+    df, fid = ds.read_csv(_service, P_FID, "Baustellen_Rapport.csv")
+    if fid is None: raise FileNotFoundError("Baustellen_Rapport.csv")
+    idx = rq.RapportIndex(df)
+    st.session_state["rapport_index"] = ((P_FID, generation), idx)
+    return idx
+
+def read_cached_csv(_service, folder_id: str, filename: str, generation=None) -> pd.DataFrame:
+    if generation is None: generation = cache_generation(folder_id)
+    try: return load_csv(_service, folder_id, filename, generation)
+    except Exception: return pd.DataFrame()
+
+def load_gallery(_service, folder_ids: list, project_name: str, watcher=None) -> list:
+    files = []
+    for fid in folder_ids:
+        try: files += load_project_files_from_drive(_service, fid, project_name, cache_generation(fid, watcher))
+        except Exception: pass
+    return files
+
+def load_file_bytes(_service, file_id: str, watcher=None):
+    try: return download_file_bytes(_service, file_id, cache_generation(file_id, watcher))
     except Exception: return None
 
+def is_image(f: dict) -> bool:
+    return f.get('name', '').lower().endswith(BILD_ENDUNGEN)
+
+def render_gallery_file(_service, f: dict, key: str, **image_kwargs):
+    # Bilder aus dem Cache; andere Dateien (Pläne bis 500 MB) erst auf Klick über einen Spool-Puffer laden.
+    if is_image(f):
+        b = load_file_bytes(_service, f['id'])
+        if b: st.image(b, **image_kwargs)
+    elif st.button(f"📥 {f['name'][:15]}", key=f"{key}_{f['id']}"):
+        fh = ds.open_download(_service, f['id'])
+        if fh:
+            with fh: st.download_button(f"💾 {f['name'][:15]} speichern", fh.read(), f['name'], key=f"{key}_dl_{f['id']}", on_click="ignore")
+
+def schedule_prefetch(P_FID, Z_FID, FOTO_FID, PLAN_FID, project: str = ""):
+    # Wärmt die Caches im Hintergrund; Generationen werden hier (im Session-Thread) festgehalten.
+    watcher = st.session_state.get("change_watcher")
+    gen_p, gen_z = cache_generation(P_FID, watcher), cache_generation(Z_FID, watcher)
+
+    def warm(fn, *args):
+        def task(svc): fn(svc, *args)
+        return task
+
+    def gallery(svc):
+        return [warm(load_file_bytes, f['id'], watcher) for f in load_gallery(svc, [FOTO_FID, PLAN_FID], project, watcher) if is_image(f)]
+
+    tasks = [warm(read_cached_csv, P_FID, "Projects.csv", gen_p)]
+    if project:
+        tasks += [warm(load_project_history, P_FID, Z_FID, project, gen_p, gen_z), gallery]
+    else:
+        tasks += [warm(read_cached_csv, P_FID, "Baustellen_Rapport.csv", gen_p), warm(read_cached_csv, Z_FID, "Arbeitszeit_AKZ.csv", gen_z)]
+    get_prefetcher().schedule(st.session_state["session_key"], tasks)
+    st.session_state["prefetch_project"] = project
+
 def delete_drive_assets(_service, keyword: str, folders: list):
+    # Erst alle Treffer sammeln, dann löschen: Löschen während des Blätterns verschiebt die Seiten.
     for fid in folders:
         if not fid: continue
-        try:
-            results = _service.files().list(q=f"'{fid}' in parents and trashed = false", pageSize=1000, fields="files(id, name)").execute()
-            for f in results.get('files', []):
-                if keyword in f.get('name', ''):
-                    _service.files().delete(fileId=f['id']).execute()
-        except Exception: pass
+        hits, token = [], None
+        while True:
+            results = _service.files().list(q=f"'{fid}' in parents and trashed = false", pageSize=1000, pageToken=token, fields="nextPageToken, files(id, name)").execute()
+            hits += [f['id'] for f in results.get('files', []) if keyword in f.get('name', '')]
+            token = results.get('nextPageToken')
+            if not token: break
+        for file_id in hits:
+            try: _service.files().delete(fileId=file_id).execute()
+            except Exception as e:
+                # Schon gelöscht (z.B. vor einem Abbruch): Schritt bleibt wiederholbar.
+                if getattr(getattr(e, "resp", None), "status", None) != 404: raise
+
+def drop_csv_rows(service, folder_id: str, filename: str, column: str, value: str):
+    df, fid = ds.read_csv(service, folder_id, filename)
+    if not fid:
+        # read_csv meldet Lesefehler wie eine fehlende Datei; nur bestätigt fehlend ist "nichts zu tun".
+        found = service.files().list(q=f"'{folder_id}' in parents and name = '{ds._safe_query_value(filename)}' and trashed = false", fields="files(id)").execute()
+        if found.get("files"): raise RuntimeError(f"'{filename}' konnte nicht gelesen werden.")
+        return
+    if df.empty or column not in df.columns: return
+    keep = df[column].astype(str).str.strip() != str(value).strip()
+    if keep.all(): return
+    if not ds.save_csv(service, folder_id, filename, df[keep], fid): raise RuntimeError(f"'{filename}' konnte nicht gespeichert werden.")
+
+def plan_delete_project(p: dict) -> list:
+    name, folders = p["name"], [p["P_FID"], p["Z_FID"], p["FOTO_FID"], p["PLAN_FID"]]
+    return [
+        ("Projects.csv", lambda svc, p: drop_csv_rows(svc, p["P_FID"], "Projects.csv", "Projekt_Name", name)),
+        ("Baustellen_Rapport.csv", lambda svc, p: drop_csv_rows(svc, p["P_FID"], "Baustellen_Rapport.csv", "Projekt", name)),
+        ("Arbeitszeit_AKZ.csv", lambda svc, p: drop_csv_rows(svc, p["Z_FID"], "Arbeitszeit_AKZ.csv", "Projekt", name)),
+        ("Fotos", lambda svc, p: delete_drive_assets(svc, name, [p["FOTO_FID"]])),
+        ("Pläne", lambda svc, p: delete_drive_assets(svc, name, [p["PLAN_FID"]])),
+        ("Cache", lambda svc, p: ds.shared_cache().bump(*folders)),
+    ]
+
+def plan_rollover(p: dict) -> list:
+    # Ein Schritt genügt: der Monatswechsel gleicht selbst ab, was schon existiert.
+    return [("Vorlagen", lambda svc, p: rollover.Rollover(ds.get_drive_service, p["TEMPLATES_FID"], p["TARGET_FID"], p["period"], p["employees"], p["projects"]).run())]
+
+def plan_delete_employee(p: dict) -> list:
+    return [
+        ("Employees.csv", lambda svc, p: drop_csv_rows(svc, p["P_FID"], "Employees.csv", "Name", p["name"])),
+        ("Cache", lambda svc, p: ds.shared_cache().bump(p["P_FID"])),
+    ]
 
 # ==========================================
 # 5. GESCHÄFTSLOGIK (Speichern & Cache-Reset)
 # ==========================================
 def process_rapport(service, f_date, f_start, f_end, f_pause_min, f_arbeit, f_mat, f_bem, sel_proj, r_hin, r_rueck, P_FID, Z_FID, user_name):
-    tx_string = f"RAPP_{f_date}_{f_start}_{f_end}_{f_arbeit[:10]}_{sel_proj}_{user_name}"
-    if not check_idempotency(tx_string):
-        st.warning("Dieser Datensatz wurde soeben gespeichert. Sperre aktiv zur Vermeidung von Duplikaten.")
-        return
-
     ts_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     date_str = f_date.strftime("%Y-%m-%d")
     
@@ -159,48 +342,70 @@ def process_rapport(service, f_date, f_start, f_end, f_pause_min, f_arbeit, f_ma
         st.error("Eingabefehler: Die Endzeit abzüglich der Pause liegt vor der Startzeit.")
         return
 
+    tx_string = idem.rapport_tx_string(f_date, f_start, f_end, f_arbeit, sel_proj, user_name)
+    if not check_idempotency(tx_string):
+        st.warning("Dieser Datensatz wurde bereits gespeichert. Sperre aktiv zur Vermeidung von Duplikaten.")
+        return
+
     # SPV-KONFORME BERECHNUNG (30 Min. Abzug pro Weg bei Direktfahrt)
-    reise_min_bezahlt = max(0, r_hin - 30) + max(0, r_rueck - 30)
+    reise_min_bezahlt = int(rimp.paid_travel_min(r_hin, r_rueck))
     total_inkl_reise = round(work_hours + (reise_min_bezahlt / 60.0), 2)
     
     row_projekt = {"Erfasst": ts_str, "Datum": date_str, "Projekt": sel_proj, "Mitarbeiter": user_name, "Arbeit": f_arbeit, "Material": f_mat, "Bemerkung": f_bem, "Status": ST_OFFEN}
     row_zeit = {"Erfasst": ts_str, "Datum": date_str, "Projekt": sel_proj, "Mitarbeiter": user_name, "Start": f_start.strftime("%H:%M"), "Ende": f_end.strftime("%H:%M"), "Pause_Min": f_pause_min, "Stunden_Total": work_hours, "R_Wohn_Bau_Min": r_hin, "R_Bau_Wohn_Min": r_rueck, "Reisezeit_bezahlt_Min": reise_min_bezahlt, "Arbeitszeit_inkl_Reisezeit": total_inkl_reise, "Absenz_Typ": "", "Status": ST_OFFEN}
     
-    save_to_drive(service, row_projekt, row_zeit, P_FID, Z_FID)
+    if not save_to_drive(service, row_projekt, row_zeit, P_FID, Z_FID):
+        release_idempotency(tx_string); st.error("Rapport konnte nicht gespeichert werden. Bitte erneut versuchen."); return
     st.success(f"Rapport erfolgreich synchronisiert. (Total Stunden: {total_inkl_reise}h)")
 
 def process_absence_batch(service, start_date, end_date, f_hours, a_typ, f_bem, sel_proj, P_FID, Z_FID, user_name):
-    tx_string = f"ABS_{start_date}_{end_date}_{a_typ}_{user_name}"
+    # Feiertage selbst werden als "Feiertag" gebucht, daher dort nur Wochenenden auslassen.
+    days = get_work_calendar().business_days(start_date, end_date, skip_holidays=(a_typ != "Feiertag"))
+    if len(days) == 0:
+        st.warning("Im gewählten Zeitraum liegt kein Arbeitstag. Nichts gebucht.")
+        return
+
+    tx_string = idem.absence_tx_string(start_date, end_date, a_typ, user_name)
     if not check_idempotency(tx_string):
         st.warning("Abwesenheit wurde bereits verarbeitet. Sperre aktiv.")
         return
 
     ts_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    days_diff = (end_date - start_date).days + 1
-    
-    r_proj, r_zeit = [], []
-    for i in range(days_diff):
-        date_str = (start_date + timedelta(days=i)).strftime("%Y-%m-%d")
-        # Landet automatisch im Projekt-Controlling und in der AZK-Tabelle
-        r_proj.append({"Erfasst": ts_str, "Datum": date_str, "Projekt": sel_proj, "Mitarbeiter": user_name, "Arbeit": f"Abwesenheit: {a_typ}", "Material": "", "Bemerkung": f_bem, "Status": ST_OFFEN})
-        r_zeit.append({"Erfasst": ts_str, "Datum": date_str, "Projekt": sel_proj, "Mitarbeiter": user_name, "Start": "-", "Ende": "-", "Pause_Min": 0, "Stunden_Total": f_hours, "R_Wohn_Bau_Min": 0, "R_Bau_Wohn_Min": 0, "Reisezeit_bezahlt_Min": 0, "Arbeitszeit_inkl_Reisezeit": f_hours, "Absenz_Typ": a_typ, "Status": ST_OFFEN})
-        
-    save_to_drive_batch(service, r_proj, r_zeit, P_FID, Z_FID)
-    st.success(f"Abwesenheit für {days_diff} Tag(e) gebucht und synchronisiert.")
-
-def save_to_drive(service, row_p, row_z, P_FID, Z_FID):
+    # Landet automatisch im Projekt-Controlling und in der AZK-Tabelle
+    r_proj, r_zeit = absn.build_absence_rows(days, ts_str, sel_proj, user_name, f_hours, a_typ, f_bem, ST_OFFEN, start_date, end_date)
+
+    if not save_to_drive_batch(service, r_proj, r_zeit, P_FID, Z_FID):
+        release_idempotency(tx_string); st.error("Abwesenheit konnte nicht gespeichert werden. Bitte erneut versuchen."); return
+    st.success(f"Abwesenheit für {len(days)} Arbeitstag(e) gebucht und synchronisiert.")
+
+def process_rapport_import(service, df_valid, P_FID, Z_FID) -> int:
+    # Bereits gebuchte Zeilen (gleicher Hash wie bei Einzel-Erfassung) werden übersprungen.
+    keys = idem.rapport_tx_strings(df_valid).map(idem.tx_hash)
+    claimed = get_idempotency_store().claim_many(keys, label=f"import:{st.session_state.get('user_name', '')}")
+    fresh = df_valid[claimed].reset_index(drop=True)
+    skipped = len(df_valid) - len(fresh)
+    if fresh.empty:
+        st.warning(f"Alle {skipped} Zeile(n) wurden bereits gebucht. Nichts importiert.")
+        return 0
+
+    rows_p, rows_z = rimp.build_rows(fresh, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), ST_OFFEN)
+    if not save_to_drive_batch(service, rows_p, rows_z, P_FID, Z_FID):
+        get_idempotency_store().release_many(keys[claimed])
+        st.error("Import konnte nicht gespeichert werden. Bitte erneut versuchen.")
+        return 0
+    st.success(f"{len(fresh)} Rapport(e) importiert ({fresh['Arbeitszeit_inkl_Reisezeit'].sum():.2f}h)." + (f" {skipped} bereits gebuchte Zeile(n) übersprungen." if skipped else ""))
+    return len(fresh)
+
+def save_to_drive(service, row_p, row_z, P_FID, Z_FID) -> bool:
+    return save_to_drive_batch(service, [row_p], [row_z], P_FID, Z_FID)
+
+def save_to_drive_batch(service, rows_p, rows_z, P_FID, Z_FID) -> bool:
     df_p, fid_p = ds.read_csv(service, P_FID, "Baustellen_Rapport.csv")
-    ds.save_csv(service, P_FID, "Baustellen_Rapport.csv", pd.concat([df_p, pd.DataFrame([row_p])], ignore_index=True), fid_p)
+    ok_p = ds.save_csv(service, P_FID, "Baustellen_Rapport.csv", pd.concat([df_p, pd.DataFrame(rows_p)], ignore_index=True), fid_p)
     df_z, fid_z = ds.read_csv(service, Z_FID, "Arbeitszeit_AKZ.csv")
-    ds.save_csv(service, Z_FID, "Arbeitszeit_AKZ.csv", pd.concat([validate_time_data(df_z), pd.DataFrame([row_z])], ignore_index=True), fid_z)
-    st.cache_data.clear() 
-
-def save_to_drive_batch(service, rows_p, rows_z, P_FID, Z_FID):
-    df_p, fid_p = ds.read_csv(service, P_FID, "Baustellen_Rapport.csv")
-    ds.save_csv(service, P_FID, "Baustellen_Rapport.csv", pd.concat([df_p, pd.DataFrame(rows_p)], ignore_index=True), fid_p)
-    df_z, fid_z = ds.read_csv(service, Z_FID, "Arbeitszeit_AKZ.csv")
-    ds.save_csv(service, Z_FID, "Arbeitszeit_AKZ.csv", pd.concat([validate_time_data(df_z), pd.DataFrame(rows_z)], ignore_index=True), fid_z)
-    st.cache_data.clear()
+    ok_z = ds.save_csv(service, Z_FID, "Arbeitszeit_AKZ.csv", pd.concat([validate_time_data(df_z), pd.DataFrame(rows_z)], ignore_index=True), fid_z)
+    invalidate_cache(P_FID, Z_FID)
+    return bool(ok_p and ok_z)
 
 # ==========================================
 # 6. MITARBEITER-PORTAL (Mit zurückgekehrter Absenz-Funktion)
@@ -209,11 +414,10 @@ def render_mitarbeiter_portal(service, P_FID, Z_FID, FOTO_FID, PLAN_FID):
     user_name = st.session_state['user_name']
     col_back, col_title = st.columns([1, 4])
     with col_back:
-        if st.button("Abmelden"): st.session_state["user_name"] = ""; st.session_state["view"] = "Start"; st.rerun()
+        if st.button("Abmelden"): get_prefetcher().cancel(st.session_state["session_key"]); st.session_state["user_name"] = ""; st.session_state["view"] = "Start"; st.rerun()
     with col_title: st.subheader(f"📋 Personal-Portal: {user_name}")
     
-    df_proj, _ = ds.read_csv(service, P_FID, "Projects.csv")
-    df_proj = validate_project_data(df_proj)
+    df_proj = validate_project_data(read_cached_csv(service, P_FID, "Projects.csv"))
     
     active_projs = []
     if not df_proj.empty:
@@ -222,6 +426,8 @@ def render_mitarbeiter_portal(service, P_FID, Z_FID, FOTO_FID, PLAN_FID):
         active_projs = [p for p in active_projs if str(p).strip() != ""]
         
     sel_proj = st.selectbox("Aktuelles Projekt auswählen:", active_projs if active_projs else ["Keine aktiven Projekte gefunden"])
+    if sel_proj != "Keine aktiven Projekte gefunden" and st.session_state.get("prefetch_project") != sel_proj:
+        schedule_prefetch(P_FID, Z_FID, FOTO_FID, PLAN_FID, sel_proj)
     
     if sel_proj != "Keine aktiven Projekte gefunden":
         matching_proj = df_proj[df_proj["Projekt_Name"] == sel_proj]
@@ -241,7 +447,8 @@ def render_mitarbeiter_portal(service, P_FID, Z_FID, FOTO_FID, PLAN_FID):
     st.write(f"<div style='height: 10px;'></div>", unsafe_allow_html=True)
     
     # DIE 4 SÄULEN DES MITARBEITERS (Absenz wieder da)
-    t_arb, t_abs, t_med, t_hist = st.tabs(["🛠️ Rapport erfassen", "🏥 Abwesenheit", "📤 Medien & Dokumente", "📜 Projekt-Historie (Alle)"])
+    # Tabs laufen nur, wenn sie offen sind: Galerie und Historie lädt sonst jeder Rerun synchron, parallel zum Prefetch.
+    t_arb, t_abs, t_med, t_hist = st.tabs(["🛠️ Rapport erfassen", "🏥 Abwesenheit", "📤 Medien & Dokumente", "📜 Projekt-Historie (Alle)"], key="ma_tabs", on_change="rerun")
     
     with t_arb:
         with st.form("arb_form"):
@@ -285,66 +492,81 @@ def render_mitarbeiter_portal(service, P_FID, Z_FID, FOTO_FID, PLAN_FID):
                 else:
                     start_date = end_date = f_a_date_range
                 
-                if (end_date - start_date).days + 1 > 7:
-                    st.error("Bitte buchen Sie maximal 7 Tage in einem Vorgang.")
+                if (end_date - start_date).days + 1 > absn.MAX_RANGE_DAYS:
+                    st.error(f"Bitte buchen Sie maximal {absn.MAX_RANGE_DAYS} Tage in einem Vorgang.")
                 else:
                     with st.spinner("Verarbeite Block..."):
                         if a_file and a_typ == "Krankheit":
-                            ds.upload_image(service, PLAN_FID, f"ZEUGNIS_{user_name}_{start_date}_{a_file.name}", io.BytesIO(a_file.getvalue()), a_file.type)
+                            ds.upload_streamlit_file(service, PLAN_FID, a_file, f"ZEUGNIS_{user_name}_{start_date}_{a_file.name}")
                         process_absence_batch(service, start_date, end_date, f_a_hours, a_typ, a_bem, sel_proj, P_FID, Z_FID, user_name)
 
-    with t_med:
-        files = st.file_uploader("Fotos hochladen", accept_multiple_files=True, type=['jpg','png','jpeg'])
-        if st.button("📤 Upload starten", type="primary") and files:
-            prog = st.progress(0)
-            for idx, f in enumerate(files[:SPACING_27]):
-                ds.upload_image(service, FOTO_FID, f"{sel_proj}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{f.name}", io.BytesIO(f.getvalue()), f.type)
-                prog.progress((idx + 1) / len(files))
-            st.success("Erfolgreich."); st.cache_data.clear(); time.sleep(1); st.rerun()
+    if t_med.open:
+        with t_med:
+            files = st.file_uploader("Fotos hochladen", accept_multiple_files=True, type=['jpg','png','jpeg'])
+            if st.button("📤 Upload starten", type="primary") and files:
+                prog = st.progress(0)
+                uploader = ds.DedupUploader(service, FOTO_FID, scope=sel_proj)
+                for idx, f in enumerate(files[:SPACING_27]):
+                    uploader.upload_streamlit_file(f, f"{sel_proj}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{f.name}")
+                    prog.progress((idx + 1) / len(files))
+                st.success(f"Erfolgreich. {uploader.summary()}"); invalidate_cache(FOTO_FID); time.sleep(1); st.rerun()
             
-        st.divider()
-        if st.button("🔄 Galerie laden"): st.cache_data.clear()
-        if sel_proj != "Keine aktiven Projekte gefunden":
-            all_files = load_project_files_from_drive(service, FOTO_FID, sel_proj) + load_project_files_from_drive(service, PLAN_FID, sel_proj)
-            if all_files:
-                cols = st.columns(2)
-                for idx, img in enumerate(all_files):
-                    with cols[idx % 2]:
-                        img_b = download_file_bytes(service, img['id'])
-                        if img_b:
-                            if img['name'].lower().endswith(('.png', '.jpg', '.jpeg')): st.image(img_b, use_container_width=True)
-                            else: st.download_button(f"📥 {img['name'][:15]}", data=img_b, file_name=img['name'])
-
-    with t_hist:
-        st.markdown(f"**Alle Berichte für: {sel_proj}**")
-        df_hp, _ = ds.read_csv(service, P_FID, "Baustellen_Rapport.csv")
-        df_hz, _ = ds.read_csv(service, Z_FID, "Arbeitszeit_AKZ.csv")
+            st.divider()
+            if st.button("🔄 Galerie laden"): refresh_cache()
+            if sel_proj != "Keine aktiven Projekte gefunden":
+                all_files = load_gallery(service, [FOTO_FID, PLAN_FID], sel_proj)
+                if all_files:
+                    cols = st.columns(2)
+                    for idx, img in enumerate(all_files):
+                        with cols[idx % 2]: render_gallery_file(service, img, "med", use_container_width=True)
+
+    if t_hist.open:
+        with t_hist:
+            st.markdown(f"**Alle Berichte für: {sel_proj}**")
+            try: hist = load_project_history(service, P_FID, Z_FID, sel_proj, cache_generation(P_FID), cache_generation(Z_FID))
+            except Exception: hist = None
         
-        if not df_hp.empty and not df_hz.empty and "Erfasst" in df_hz.columns:
-            df_hz = validate_time_data(df_hz)
-            df_merged = pd.merge(df_hp, df_hz[["Erfasst", "Arbeitszeit_inkl_Reisezeit"]], on="Erfasst", how="left")
-            hist = df_merged[df_merged["Projekt"] == sel_proj].sort_values(by="Datum", ascending=False)
-            
-            if not hist.empty:
-                for _, row in hist.head(50).iterrows():
-                    stunden = row.get('Arbeitszeit_inkl_Reisezeit', '0')
-                    with st.expander(f"📅 {row['Datum']} | 👷 {row['Mitarbeiter']} | ⏱️ {stunden} Std."):
-                        st.write(f"**Tätigkeit:**\n{row.get('Arbeit', '-')}")
-                        if str(row.get('Material', '')).strip():
-                            st.write(f"**Material:**\n{row.get('Material', '-')}")
-            else:
-                st.write("Noch keine Berichte für dieses Projekt.")
+            if hist is not None:
+                if not hist.empty:
+                    for _, row in hist.head(50).iterrows():
+                        stunden = row.get('Arbeitszeit_inkl_Reisezeit', '0')
+                        with st.expander(f"📅 {row['Datum']} | 👷 {row['Mitarbeiter']} | ⏱️ {stunden} Std."):
+                            st.write(f"**Tätigkeit:**\n{row.get('Arbeit', '-')}")
+                            if str(row.get('Material', '')).strip():
+                                st.write(f"**Material:**\n{row.get('Material', '-')}")
+                else:
+                    st.write("Noch keine Berichte für dieses Projekt.")
 
 # ==========================================
 # 7. ADMIN DASHBOARD
 # ==========================================
+def render_export_progress(job: azk.ExportJob):
+    p = job.progress()
+    if job.running:
+        st.progress(job.fraction, text=f"{p['phase']}: {p['done']}/{p['total']}")
+        st.session_state["export_polling"] = True
+        return
+    # Einmal die ganze Seite neu laden, damit das Fragment ohne run_every registriert wird.
+    if st.session_state.pop("export_polling", False): st.rerun()
+    if p["error"]: st.error(f"Export fehlgeschlagen: {p['error']}")
+    else: st.progress(1.0, text=f"Fertig in {p['finished'] - p['started']:.1f}s")
+    for msg in p["failed"]: st.warning(msg)
+    if p["drive_file_id"]:
+        st.success(f"{job.filename} liegt in Drive unter '{azk.EXPORT_FOLDER_NAME}'.")
+        st.link_button(f"📂 {job.filename} in Drive öffnen", f"https://drive.google.com/file/d/{p['drive_file_id']}/view")
+    elif os.path.exists(job.path):
+        # Die ZIP-Datei erst auf Anforderung laden, nicht bei jedem Rerun.
+        if st.button(f"📥 Download {job.filename} vorbereiten", key="ex_prepare"):
+            with open(job.path, "rb") as fh:
+                st.download_button(f"📥 {job.filename} herunterladen", fh.read(), job.filename, "application/zip")
+
 def render_admin_portal(service, P_FID, Z_FID, FOTO_FID, PLAN_FID, BASE_URL):
     col1, col2 = st.columns([4, 1])
     with col1: st.subheader("🛠️ Projektleitung & Administration")
     with col2:
         if st.button("Abmelden", use_container_width=True): st.session_state["logged_in"] = False; st.session_state["view"] = "Start"; st.rerun()
     
-    t_week, t_ctrl, t_stam, t_docs, t_print, t_shiva = st.tabs(["🗓️ Wochenabschluss", "📊 Controlling", "⚙️ Stammdaten", "📂 Dateien", "🖨️ Projekt-Rapport (Drucken)", "🗑️ System"])
+    t_week, t_month, t_ctrl, t_stam, t_docs, t_print, t_shiva = st.tabs(["🗓️ Wochenabschluss", "📦 Monatsexport", "📊 Controlling", "⚙️ Stammdaten", "📂 Dateien", "🖨️ Projekt-Rapport (Drucken)", "🗑️ System"])
     
     df_proj, fid_proj = ds.read_csv(service, P_FID, "Projects.csv")
     df_proj = validate_project_data(df_proj)
@@ -386,24 +608,89 @@ def render_admin_portal(service, P_FID, Z_FID, FOTO_FID, PLAN_FID, BASE_URL):
                         df_z.update(edit_z)
                         df_z.reset_index(inplace=True)
                         ds.save_csv(service, Z_FID, "Arbeitszeit_AKZ.csv", df_z, fid_z)
-                        st.cache_data.clear()
+                        invalidate_cache(Z_FID)
                         st.success("Tabelle aktualisiert.")
                         time.sleep(1); st.rerun()
 
+    # -----------------------------
+    # 7.1b MONATSEXPORT (AZK, Rapporte, Arztzeugnisse als ZIP)
+    # -----------------------------
+    with t_month:
+        st.markdown("**Monatsabschluss: AZK, Rapporte und Arztzeugnisse pro Mitarbeiter**")
+        last_month = (datetime.now().replace(day=1) - pd.Timedelta(days=1))
+        m1, m2 = st.columns(2)
+        with m1: ex_year = st.number_input("Jahr", min_value=2020, max_value=2100, value=last_month.year, key="ex_year")
+        with m2: ex_month = st.selectbox("Monat", list(range(1, 13)), index=last_month.month - 1, key="ex_month")
+        period = azk.period_key(ex_year, ex_month)
+        export_jobs = get_export_jobs()
+        job = export_jobs.get(period)
+
+        if st.button(f"📦 Export {period} starten", type="primary", disabled=bool(job and job.running)):
+            with st.spinner("Lese Tabellen..."):
+                df_xz, _ = ds.read_csv(service, Z_FID, "Arbeitszeit_AKZ.csv")
+                df_xp, _ = ds.read_csv(service, P_FID, "Baustellen_Rapport.csv")
+                parts = azk.partition(validate_time_data(df_xz) if not df_xz.empty else df_xz, df_xp, period)
+                attachments = azk.zeugnis_files(service, PLAN_FID, sorted(set(emp_list) | set(parts)), period, azk.absence_starts(df_xz, period))
+            if not parts and not attachments:
+                st.info(f"Keine Buchungen oder Zeugnisse für {period} gefunden.")
+            else:
+                job = export_jobs[period] = azk.ExportJob(ds.get_drive_service, period, parts, attachments, upload_folder_id=Z_FID).start()
+
+        if job:
+            # Nur das Fragment pollt; die übrigen Tabs rendern währenddessen normal.
+            st.fragment(render_export_progress, run_every=1.0 if job.running else None)(job)
+
+        st.divider()
+        st.markdown("**Monatswechsel: Ordner & Vorlagen pro Mitarbeiter und Projekt**")
+        sec = st.secrets.get("general", st.secrets)
+        tpl_fid, ro_target = sec.get("TEMPLATES_FOLDER_ID", ""), sec.get("ROLLOVER_FOLDER_ID", "") or Z_FID
+        if not tpl_fid: st.caption("Kein Vorlagen-Ordner konfiguriert (TEMPLATES_FOLDER_ID in den Secrets).")
+        else:
+            this_month = datetime.now().replace(day=1)
+            next_month = (this_month + pd.Timedelta(days=32)).replace(day=1)
+            ro_period = st.selectbox("Monat anlegen", [azk.period_key(next_month.year, next_month.month), azk.period_key(this_month.year, this_month.month)], key="ro_period")
+            ro_emps = df_emp[df_emp["Status"].astype(str).str.strip().str.lower() == "aktiv"]["Name"].tolist() if not df_emp.empty else []
+            ro_projs = df_proj[df_proj["Status"].astype(str).str.strip().str.lower() == "aktiv"]["Projekt_Name"].tolist() if not df_proj.empty else []
+            ro_emps, ro_projs = [n for n in ro_emps if n], [n for n in ro_projs if n]
+            st.caption(f"{len(ro_emps)} aktive Mitarbeiter | {len(ro_projs)} aktive Projekte. Bereits vorhandene Dateien werden übersprungen.")
+            if st.button(f"📁 Monat {ro_period} bereitstellen", key="ro_start"):
+                get_job_runner().submit("rollover", {"TEMPLATES_FID": tpl_fid, "TARGET_FID": ro_target, "period": ro_period, "employees": ro_emps, "projects": ro_projs}, label=f"Monatswechsel {ro_period}")
+                st.success("Monatswechsel gestartet. Fortschritt siehe System → Auftragsprotokoll.")
+
     # -----------------------------
     # 7.2 PROJEKT-CONTROLLING
     # -----------------------------
     with t_ctrl:
         st.markdown("**Projekt-Rapporte (Tätigkeiten & Material)**")
-        df_hp, fid_hp = ds.read_csv(service, P_FID, "Baustellen_Rapport.csv")
-        if not df_hp.empty:
+        try: idx = load_rapport_index(service, P_FID, cache_generation(P_FID))
+        except Exception: idx = None
+        if idx is not None and len(idx):
+            f1, f2, f3, f4 = st.columns(4)
+            with f1: q_proj = st.selectbox("Projekt", ["Alle"] + idx.values("Projekt"), key="ctrl_proj")
+            with f2: q_emp = st.selectbox("Mitarbeiter", ["Alle"] + idx.values("Mitarbeiter"), key="ctrl_emp")
+            with f3: q_status = st.multiselect("Status", [ST_OFFEN, ST_DRUCK, ST_FINAL], key="ctrl_status")
+            with f4: q_range = st.date_input("Zeitraum", value=(), key="ctrl_range")
+            q_from, q_to = (tuple(q_range) + (None, None))[:2] if isinstance(q_range, (tuple, list)) else (q_range, q_range)
+
+            hits = idx.query(None if q_proj == "Alle" else q_proj, None if q_emp == "Alle" else q_emp, q_status, q_from, q_to or q_from)
+            p1, p2, p3 = st.columns([1, 1, 2])
+            with p1: page_size = st.selectbox("Zeilen pro Seite", rq.PAGE_SIZES, key="ctrl_size")
+            with p2: page = st.number_input("Seite", min_value=1, max_value=rq.page_count(len(hits), page_size), value=1, step=1, key="ctrl_page")
+            with p3: st.caption(f"{len(hits)} von {len(idx)} Rapporten | Seite {page} von {rq.page_count(len(hits), page_size)}")
+
+            page_df = idx.page(hits, page, page_size)
+            ed_key = f"ed_hp_{q_proj}_{q_emp}_{'-'.join(q_status)}_{q_from}_{q_to}_{page_size}_{page}"
             hp_config = {
                 "Status": st.column_config.SelectboxColumn("Status", options=[ST_OFFEN, ST_DRUCK, ST_FINAL], required=True)
             }
-            edit_hp = st.data_editor(df_hp, num_rows="dynamic", use_container_width=True, column_config=hp_config, key="ed_hp")
+            st.data_editor(page_df, num_rows="dynamic", use_container_width=True, hide_index=True, column_config=hp_config, key=ed_key)
             if st.button("💾 Projekt-Rapporte aktualisieren"):
-                ds.save_csv(service, P_FID, "Baustellen_Rapport.csv", edit_hp, fid_hp)
-                st.cache_data.clear(); st.success("Rapporte erfolgreich aktualisiert.")
+                df_hp, fid_hp = ds.read_csv(service, P_FID, "Baustellen_Rapport.csv")
+                df_new, n_changed = rq.apply_page_edits(df_hp, page_df, st.session_state.get(ed_key, {}))
+                if n_changed:
+                    ds.save_csv(service, P_FID, "Baustellen_Rapport.csv", df_new, fid_hp)
+                    invalidate_cache(P_FID)
+                st.success(f"Rapporte erfolgreich aktualisiert ({n_changed} Zeile(n)).")
 
     # -----------------------------
     # 7.3 STAMMDATEN
@@ -415,7 +702,7 @@ def render_admin_portal(service, P_FID, Z_FID, FOTO_FID, PLAN_FID, BASE_URL):
         if st.button("💾 Projekte aktualisieren"): 
             clean_proj = edit_proj[edit_proj["Projekt_Name"].astype(str).str.strip() != ""]
             ds.save_csv(service, P_FID, "Projects.csv", clean_proj, fid_proj)
-            st.cache_data.clear(); st.success("Gespeichert.")
+            invalidate_cache(P_FID); st.success("Gespeichert.")
         
         st.markdown("**Personal-Verwaltung**")
         emp_config = {"Status": st.column_config.SelectboxColumn("Status", options=["Aktiv", "Inaktiv"], required=True)}
@@ -423,7 +710,7 @@ def render_admin_portal(service, P_FID, Z_FID, FOTO_FID, PLAN_FID, BASE_URL):
         if st.button("💾 Personal aktualisieren"): 
             clean_emp = edit_emp[edit_emp["Name"].astype(str).str.strip() != ""]
             ds.save_csv(service, P_FID, "Employees.csv", clean_emp, fid_emp)
-            st.cache_data.clear(); st.success("Gespeichert.")
+            invalidate_cache(P_FID); st.success("Gespeichert.")
 
     # -----------------------------
     # 7.4 DATEIEN
@@ -434,25 +721,23 @@ def render_admin_portal(service, P_FID, Z_FID, FOTO_FID, PLAN_FID, BASE_URL):
         with c_u1:
             plan_f = st.file_uploader("📤 Pläne (PDF/Bilder)", accept_multiple_files=True, type=['pdf', 'jpg', 'png'])
             if st.button("Pläne hochladen") and plan_f and PLAN_FID and ap != "Keine Projekte gefunden":
-                for f in plan_f: ds.upload_image(service, PLAN_FID, f"{ap}_PLAN_{f.name}", io.BytesIO(f.getvalue()), f.type)
-                st.success("Upload erfolgreich."); st.cache_data.clear(); time.sleep(1); st.rerun()
+                uploader = ds.DedupUploader(service, PLAN_FID, scope=ap)
+                for f in plan_f: uploader.upload_streamlit_file(f, f"{ap}_PLAN_{f.name}")
+                st.success(f"Upload erfolgreich. {uploader.summary()}"); invalidate_cache(PLAN_FID); time.sleep(1); st.rerun()
         with c_u2:
             foto_f = st.file_uploader("📷 Projektfotos", accept_multiple_files=True, type=['jpg', 'png'])
             if st.button("Fotos hochladen") and foto_f and ap != "Keine Projekte gefunden":
-                for f in foto_f: ds.upload_image(service, FOTO_FID, f"{ap}_ADMIN_{f.name}", io.BytesIO(f.getvalue()), f.type)
-                st.success("Upload erfolgreich."); st.cache_data.clear(); time.sleep(1); st.rerun()
+                uploader = ds.DedupUploader(service, FOTO_FID, scope=ap)
+                for f in foto_f: uploader.upload_streamlit_file(f, f"{ap}_ADMIN_{f.name}")
+                st.success(f"Upload erfolgreich. {uploader.summary()}"); invalidate_cache(FOTO_FID); time.sleep(1); st.rerun()
         
         st.divider()
-        if st.button("🔄 Datei-Verzeichnis aktualisieren"): st.cache_data.clear()
+        if st.button("🔄 Datei-Verzeichnis aktualisieren"): refresh_cache()
         if ap != "Keine Projekte gefunden":
-            files = load_project_files_from_drive(service, FOTO_FID, ap) + load_project_files_from_drive(service, PLAN_FID, ap)
+            files = load_gallery(service, [FOTO_FID, PLAN_FID], ap)
             cols = st.columns(4)
             for i, img in enumerate(files):
-                with cols[i % 4]:
-                    b = download_file_bytes(service, img['id'])
-                    if b:
-                        if img['name'].lower().endswith(('.png','.jpg','.jpeg')): st.image(b)
-                        else: st.download_button(f"📥 {img['name'][:15]}", b, img['name'])
+                with cols[i % 4]: render_gallery_file(service, img, "docs")
 
     # -----------------------------
     # 7.5 DRUCKEN (IMMER VERFÜGBAR - 3 SPALTEN)
@@ -513,29 +798,83 @@ def render_admin_portal(service, P_FID, Z_FID, FOTO_FID, PLAN_FID, BASE_URL):
             st.components.v1.html(html, height=500, scrolling=True)
             st.download_button("📄 HTML Druckvorlage herunterladen", html, f"Rapport_{print_proj}.html", "text/html", type="primary")
 
+        st.divider()
+        st.markdown("**📥 Ausgefüllte Rapporte importieren (CSV / Excel)**")
+        st.caption("Eine Zeile pro Einsatz. Fehlt das Projekt, wird das oben gewählte verwendet. Zeiten als HH:MM, Pause und Reisewege in Minuten.")
+        st.download_button("Import-Vorlage (CSV)", rimp.template_csv(), "Rapport_Import_Vorlage.csv", "text/csv")
+        imp_file = st.file_uploader("Datei wählen", type=["csv", "xlsx"], key="imp_file")
+        if imp_file:
+            try:
+                df_raw = rimp.read_import_file(imp_file)
+            except ImportError:
+                st.error("Für Excel-Dateien wird das Paket 'openpyxl' benötigt. Bitte als CSV exportieren.")
+                df_raw = None
+            except Exception as e:
+                st.error(f"Datei konnte nicht gelesen werden: {e}")
+                df_raw = None
+
+            if df_raw is not None:
+                default_proj = print_proj if print_proj != "Keine Projekte gefunden" else ""
+                known_projs = [p for p in active_projs if p != "Keine Projekte gefunden"]
+                known_emps = [e for e in emp_list if e != "Keine Mitarbeiter"]
+                df_valid, df_rejected = rimp.prepare(df_raw, default_proj, known_projs, known_emps)
+
+                c1, c2, c3 = st.columns(3)
+                c1.metric("Gültige Zeilen", len(df_valid))
+                c2.metric("Fehlerhafte Zeilen", len(df_rejected))
+                c3.metric("Stunden inkl. Reisezeit", f"{df_valid['Arbeitszeit_inkl_Reisezeit'].sum():.2f}")
+                if not df_rejected.empty:
+                    st.error("Fehlerhafte Zeilen werden nicht importiert:")
+                    st.dataframe(df_rejected, use_container_width=True, hide_index=True)
+                if not df_valid.empty:
+                    st.dataframe(df_valid, use_container_width=True, hide_index=True)
+                    if st.button(f"✅ {len(df_valid)} Rapport(e) buchen", type="primary", key="imp_commit"):
+                        process_rapport_import(service, df_valid, P_FID, Z_FID)
+
     # -----------------------------
     # 7.6 SYSTEM-BEREINIGUNG
     # -----------------------------
     with t_shiva:
+        flight = ds.get_read_stats()
+        st.caption(f"Drive-Lesezugriffe seit Start: {flight['requests']} | tatsächliche Downloads: {flight['fetches']} | gebündelt: {flight['coalesced']}")
+        shared = ds.shared_cache().stats()
+        if shared: st.caption(f"Gemeinsamer Cache: {shared['entries']} Einträge | {shared['bytes'] / 1048576:.1f} MB | Treffer: {shared['hits']} | Fehlgriffe: {shared['misses']} | verdrängt: {shared['evicted']}")
+        with st.expander("🧾 Idempotenz-Index & Duplikat-Prüfung"):
+            store = get_idempotency_store()
+            st.caption(f"Aktive Sperren: {len(store)} | Sperrfrist: {IDEMPOTENZ_TTL_SEC // 3600} h")
+            if st.button("🔍 Bestand scannen & Index aufbauen"):
+                df_sp, _ = ds.read_csv(service, P_FID, "Baustellen_Rapport.csv")
+                df_sz, _ = ds.read_csv(service, Z_FID, "Arbeitszeit_AKZ.csv")
+                keys = idem.scan_existing(df_sp, df_sz)
+                store.purge_expired()
+                st.success(f"{len(keys)} Buchungen geprüft, {store.seed(keys)} Einträge im Index aktualisiert, {int(keys.duplicated().sum())} inhaltsgleiche Mehrfachbuchungen.")
+                dup = idem.find_duplicates(df_sz)
+                if not dup.empty: st.dataframe(dup, use_container_width=True)
+                else: st.info("Keine doppelten Erfasst/Mitarbeiter/Datum-Kombinationen gefunden.")
         st.error("🗑️ System-Bereinigung (Unwiderruflich)")
+        runner = get_job_runner()
+        folders = {"P_FID": P_FID, "Z_FID": Z_FID, "FOTO_FID": FOTO_FID, "PLAN_FID": PLAN_FID}
         typ = st.radio("Kategorie:", ["Projekt", "Mitarbeiter"])
         if st.checkbox("Löschvorgang verbindlich autorisieren"):
             if typ == "Projekt":
                 tgt = st.selectbox("Zu löschendes Projekt:", active_projs)
                 if st.button("🛑 Endgültig löschen") and tgt != "Keine Projekte gefunden":
-                    df_proj = df_proj[df_proj["Projekt_Name"].astype(str).str.strip() != str(tgt).strip()]
-                    ds.save_csv(service, P_FID, "Projects.csv", df_proj, fid_proj)
-                    for file, id_key in [("Baustellen_Rapport.csv", P_FID), ("Arbeitszeit_AKZ.csv", Z_FID)]:
-                        d_tmp, f_tmp = ds.read_csv(service, id_key, file)
-                        ds.save_csv(service, id_key, file, d_tmp[d_tmp["Projekt"].astype(str).str.strip() != str(tgt).strip()], f_tmp)
-                    delete_drive_assets(service, str(tgt).strip(), [FOTO_FID, PLAN_FID])
-                    st.cache_data.clear(); st.success("Bereinigt."); time.sleep(2); st.rerun()
+                    runner.submit("delete_project", dict(folders, name=str(tgt).strip()), label=f"Projekt '{tgt}' löschen")
+                    st.success("Löschauftrag gestartet. Fortschritt siehe Auftragsprotokoll.")
             else:
                 tgt = st.selectbox("Zu löschender Mitarbeiter:", emp_list)
                 if st.button("🛑 Endgültig löschen") and tgt != "Keine Mitarbeiter":
-                    df_emp = df_emp[df_emp["Name"].astype(str).str.strip() != str(tgt).strip()]
-                    ds.save_csv(service, P_FID, "Employees.csv", df_emp, fid_emp)
-                    st.cache_data.clear(); st.success("Bereinigt."); time.sleep(2); st.rerun()
+                    runner.submit("delete_employee", dict(folders, name=str(tgt).strip()), label=f"Mitarbeiter '{tgt}' löschen")
+                    st.success("Löschauftrag gestartet. Fortschritt siehe Auftragsprotokoll.")
+
+        st.markdown("**Auftragsprotokoll**")
+        if st.button("🔄 Aktualisieren", key="jobs_refresh"): st.rerun()
+        for job in runner.log.recent(10):
+            status = {jobs.QUEUED: "⏳ wartet", jobs.RUNNING: "⚙️ läuft", jobs.DONE: "✅ fertig", jobs.FAILED: "❌ fehlgeschlagen"}.get(job["status"], job["status"])
+            st.progress(job["fraction"], text=f"{job['label'] or job['kind']} – {status} ({job['step']}/{job['total'] or '?'}{': ' + job['current'] if job['current'] and job['status'] == jobs.RUNNING else ''})")
+            if job["status"] == jobs.FAILED:
+                st.caption(f"Fehler: {job['error']}")
+                if st.button("↻ Fortsetzen", key=f"job_retry_{job['id']}"): runner.retry(job["id"]); st.rerun()
 
 # ==========================================
 # 8. SYSTEM-KERN (Boot-Sequenz)
@@ -545,24 +884,31 @@ def main():
     render_header()
 
     try: 
-        s = ds.get_drive_service()
         sec = st.secrets.get("general", st.secrets)
         P_FID, Z_FID = sec.get("PROJECT_REPORTS_FOLDER_ID", ""), sec.get("TIME_REPORTS_FOLDER_ID", "")
         FOTO_FID, PLAN_FID = sec.get("PHOTOS_FOLDER_ID", ""), sec.get("PLANS_FOLDER_ID", "")
         BASE_URL = sec.get("BASE_APP_URL", "https://8bv6gzagymvrdgnm8wrtrq.streamlit.app")
     except Exception: st.error("Systemfehler: Die Konfigurationsdateien sind unvollständig."); st.stop()
-    if not s: st.warning("Verbindungsfehler: Laufwerk-Zugang fehlt."); st.stop()
 
     view = st.session_state["view"]
     
+    # Start-Ansicht ohne Drive/pandas rendern; der schwere Stack lädt danach im Hintergrund.
     if view == "Start":
         c1, c2 = st.columns(2)
         with c1: 
             if st.button("👷‍♂️ Personal-Zugang", use_container_width=True): st.session_state["view"] = "Mitarbeiter_Login"; st.rerun()
         with c2: 
             if st.button("🔐 Projektleitung", use_container_width=True): st.session_state["view"] = "Admin_Login"; st.rerun()
+        lazy_imports.preload()
+        return
+
+    s = ds.get_drive_service()
+    if not s: st.warning("Verbindungsfehler: Laufwerk-Zugang fehlt."); st.stop()
+    get_shared_cache()
+    st.session_state["change_watcher"] = get_change_watcher((P_FID, Z_FID, FOTO_FID, PLAN_FID))
+    get_job_runner()
 
-    elif view == "Admin_Login":
+    if view == "Admin_Login":
         if st.button("⬅️ Zurück zum Menü"): st.session_state["view"] = "Start"; st.rerun()
         if st.button("Login", type="primary") if st.text_input("Admin PIN", type="password") == str(sec.get("ADMIN_PIN", "1234")) else False:
             st.session_state.update({"logged_in": True, "user_role": "Admin", "view": "Admin_Dashboard"}); st.rerun()
@@ -570,8 +916,7 @@ def main():
     elif view == "Mitarbeiter_Login":
         if st.button("⬅️ Zurück zum Menü"): st.session_state["view"] = "Start"; st.rerun()
         
-        df_emp, _ = ds.read_csv(s, P_FID, "Employees.csv")
-        df_emp = validate_employee_data(df_emp) 
+        df_emp = validate_employee_data(read_cached_csv(s, P_FID, "Employees.csv"))
         
         if not df_emp.empty:
             active_mask = df_emp["Status"].astype(str).str.strip().str.lower() == "aktiv"
@@ -586,7 +931,8 @@ def main():
         if st.button("Anmelden", type="primary") and sel != "Keine aktiven Profile":
             wahre_pin = str(df_emp[df_emp["Name"] == sel]["PIN"].iloc[0]).strip()
             if str(pin_eingabe).strip() == wahre_pin:
-                st.session_state.update({"user_name": sel, "view": "Mitarbeiter_Dashboard"}); st.rerun()
+                st.session_state.update({"user_name": sel, "view": "Mitarbeiter_Dashboard"})
+                schedule_prefetch(P_FID, Z_FID, FOTO_FID, PLAN_FID); st.rerun()
             else:
                 st.error("Authentifizierung fehlgeschlagen: PIN inkorrekt.")
 
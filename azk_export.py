@@ -0,0 +1,381 @@
+"""
+Monatsabschluss: AZK-Export pro Mitarbeiter als ZIP.
+
+Arbeitszeit_AKZ.csv und Baustellen_Rapport.csv werden in einem Durchgang
+nach Mitarbeiter und Monat aufgeteilt. Ein Hintergrund-Job rendert die
+PDFs pro Mitarbeiter in einem Prozess-Pool, lädt die ZEUGNIS_*-Dateien
+parallel herunter und schreibt alles fortlaufend in eine ZIP-Datei auf
+der Festplatte; im Speicher liegen nur die gerade bearbeiteten Dateien.
+Der Fortschritt ist über ExportJob.progress() abfragbar.
+
+ZIP-Aufbau:
+    AZK_2026-03/Uebersicht_2026-03.csv
+    AZK_2026-03/<Mitarbeiter>/AZK_<Mitarbeiter>_2026-03.pdf
+    AZK_2026-03/<Mitarbeiter>/AZK_<Mitarbeiter>_2026-03.csv
+    AZK_2026-03/<Mitarbeiter>/Rapporte_<Mitarbeiter>_2026-03.csv
+    AZK_2026-03/<Mitarbeiter>/Zeugnisse/<Datei>
+"""
+from __future__ import annotations
+
+import io
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Set, TYPE_CHECKING
+
+import drive_store as ds
+from state import STATE_DIR
+from lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
+if TYPE_CHECKING:
+    import pandas
+
+
+LOGGER = logging.getLogger(__name__)
+
+EXPORT_DIR = os.path.join(STATE_DIR, "exports")
+EXPORT_FOLDER_NAME = "AZK_Exporte"
+PDF_WORKERS = min(4, os.cpu_count() or 1)
+FETCH_WORKERS = 4
+
+AZK_COLUMNS = [
+    "Datum", "Projekt", "Start", "Ende", "Pause_Min", "Stunden_Total",
+    "Reisezeit_bezahlt_Min", "Arbeitszeit_inkl_Reisezeit", "Absenz_Typ", "Status",
+]
+RAPPORT_COLUMNS = ["Datum", "Projekt", "Arbeit", "Material", "Bemerkung", "Status"]
+
+
+def period_key(year: int, month: int) -> str:
+    return f"{int(year):04d}-{int(month):02d}"
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^\w.\- ]+", "_", str(name)).strip() or "Unbenannt"
+
+
+def _month_rows(df: pandas.DataFrame, period: str) -> pandas.DataFrame:
+    if df.empty or "Datum" not in df.columns or "Mitarbeiter" not in df.columns:
+        return df.iloc[0:0]
+    months = pd.to_datetime(df["Datum"], errors="coerce").dt.strftime("%Y-%m")
+    return df[months == period]
+
+
+def partition(
+    df_z: pandas.DataFrame,
+    df_p: pandas.DataFrame,
+    period: str,
+) -> Dict[str, Dict[str, pandas.DataFrame]]:
+    """
+    Teilt beide Tabellen in einem Durchgang nach Mitarbeiter auf
+    (nur Zeilen des Monats). Ergebnis: {Mitarbeiter: {"azk": ..., "rapporte": ...}}
+    """
+    parts: Dict[str, Dict[str, pandas.DataFrame]] = {}
+    for key, df in (("azk", df_z), ("rapporte", df_p)):
+        rows = _month_rows(df, period)
+        for employee, group in rows.groupby(rows["Mitarbeiter"].astype(str).str.strip(), sort=True):
+            if employee:
+                parts.setdefault(employee, {})[key] = group.sort_values("Datum")
+    for part in parts.values():
+        part.setdefault("azk", df_z.iloc[0:0])
+        part.setdefault("rapporte", df_p.iloc[0:0])
+    return parts
+
+
+def overview(parts: Dict[str, Dict[str, pandas.DataFrame]]) -> pandas.DataFrame:
+    rows = []
+    for employee, part in parts.items():
+        azk = part["azk"]
+        numbers = {
+            col: pd.to_numeric(azk[col], errors="coerce").fillna(0).sum() if col in azk.columns else 0.0
+            for col in ("Stunden_Total", "Reisezeit_bezahlt_Min", "Arbeitszeit_inkl_Reisezeit")
+        }
+        absence = azk["Absenz_Typ"].fillna("").astype(str).str.strip() != "" if "Absenz_Typ" in azk.columns else pd.Series(False, index=azk.index)
+        rows.append({
+            "Mitarbeiter": employee,
+            "Arbeitstage": int(azk.loc[~absence, "Datum"].nunique()) if not azk.empty else 0,
+            "Absenztage": int(absence.sum()),
+            "Stunden_Total": round(numbers["Stunden_Total"], 2),
+            "Reisezeit_bezahlt_Min": int(numbers["Reisezeit_bezahlt_Min"]),
+            "Arbeitszeit_inkl_Reisezeit": round(numbers["Arbeitszeit_inkl_Reisezeit"], 2),
+            "Rapporte": len(part["rapporte"]),
+        })
+    return pd.DataFrame(rows)
+
+
+def render_pdf(employee: str, period: str, azk: List[Dict[str, Any]], rapporte: List[Dict[str, Any]]) -> bytes:
+    """
+    Rendert das AZK-Blatt eines Mitarbeiters. Läuft im Prozess-Pool und
+    bekommt daher nur einfache Datentypen.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    small = styles["BodyText"].clone("small", fontSize=8, leading=10)
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), leftMargin=12 * mm, rightMargin=12 * mm, topMargin=12 * mm, bottomMargin=12 * mm)
+    grid = TableStyle([
+        ("GRID", (0, 0), (-1, -1), 0.4, colors.grey),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#EEEEEE")),
+        ("FONTSIZE", (0, 0), (-1, -1), 8),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+    ])
+
+    def number(value) -> float:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return 0.0
+
+    story = [
+        Paragraph(f"R. Baumgartner AG - Arbeitszeitkontrolle {period}", styles["Title"]),
+        Paragraph(f"<b>Mitarbeiter:</b> {employee}", styles["Normal"]),
+        Spacer(1, 6 * mm),
+    ]
+
+    azk_rows = [AZK_COLUMNS] + [[str(r.get(c, "")) for c in AZK_COLUMNS] for r in azk]
+    total = sum(number(r.get("Stunden_Total")) for r in azk)
+    total_inkl = sum(number(r.get("Arbeitszeit_inkl_Reisezeit")) for r in azk)
+    azk_rows.append(["Total", "", "", "", "", f"{total:.2f}", "", f"{total_inkl:.2f}", "", ""])
+    table = Table(azk_rows, repeatRows=1)
+    table.setStyle(grid)
+    story += [table, Spacer(1, 8 * mm)]
+
+    if rapporte:
+        story.append(Paragraph("Rapporte", styles["Heading2"]))
+        rows = [RAPPORT_COLUMNS] + [[Paragraph(str(r.get(c, "")), small) for c in RAPPORT_COLUMNS] for r in rapporte]
+        table = Table(rows, repeatRows=1, colWidths=[22 * mm, 40 * mm, 90 * mm, 50 * mm, 50 * mm, 20 * mm])
+        table.setStyle(grid)
+        story.append(table)
+
+    story += [
+        Spacer(1, 15 * mm),
+        Paragraph("Visum Administration: ____________________ &nbsp;&nbsp;&nbsp; Unterschrift Mitarbeiter: ____________________", styles["Normal"]),
+    ]
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def absence_starts(df_z: pandas.DataFrame, period: str) -> Dict[str, Set[str]]:
+    """
+    Startdaten aller Absenz-Blöcke, die den Monat berühren, nach Mitarbeiter.
+    Ein Zeugnis trägt das Startdatum im Namen; ein Block, der im Vormonat
+    beginnt, gehört trotzdem in diesen Monat.
+    """
+    if df_z.empty or "Absenz_Typ" not in df_z.columns or "Mitarbeiter" not in df_z.columns:
+        return {}
+    z = df_z[df_z["Absenz_Typ"].fillna("").astype(str).str.strip() != ""]
+    if z.empty:
+        return {}
+    datum = z["Datum"].astype(str)
+    # Ältere Zeilen ohne Absenz_Von/Bis: erster bzw. letzter gebuchter Tag des Blocks.
+    block = [z["Erfasst"].astype(str), z["Mitarbeiter"].astype(str)]
+    von = z["Absenz_Von"].fillna("").astype(str) if "Absenz_Von" in z.columns else pd.Series("", index=z.index)
+    bis = z["Absenz_Bis"].fillna("").astype(str) if "Absenz_Bis" in z.columns else pd.Series("", index=z.index)
+    von = von.where(von != "", datum.groupby(block).transform("min"))
+    bis = bis.where(bis != "", datum.groupby(block).transform("max"))
+
+    first = pd.Period(period, "M").start_time.strftime("%Y-%m-%d")
+    last = pd.Period(period, "M").end_time.strftime("%Y-%m-%d")
+    hits = (von <= last) & (bis >= first)
+    starts: Dict[str, Set[str]] = {}
+    for employee, start in zip(z.loc[hits, "Mitarbeiter"].astype(str).str.strip(), von[hits]):
+        starts.setdefault(employee, set()).add(start)
+    return starts
+
+
+def zeugnis_files(
+    service,
+    folder_id: str,
+    employees: List[str],
+    period: str,
+    starts: Optional[Dict[str, Set[str]]] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    ZEUGNIS_<Mitarbeiter>_<JJJJ-MM-TT>_... nach Mitarbeiter: Startdatum im
+    Monat oder Start eines Absenz-Blocks, der in den Monat reicht (starts).
+    """
+    if not folder_id:
+        return {}
+    starts = starts or {}
+    files = [f for f in ds.list_files(service, folder_id) if f.get("name", "").startswith("ZEUGNIS_")]
+    result: Dict[str, List[Dict[str, Any]]] = {}
+    # Längste Namen zuerst, damit "Anna Muster" nicht als "Anna" erkannt wird.
+    for employee in sorted(set(employees) | set(starts), key=len, reverse=True):
+        prefixes = tuple(f"ZEUGNIS_{employee}_{day}" for day in [period, *sorted(starts.get(employee, ()))])
+        hits = [f for f in files if f["name"].startswith(prefixes)]
+        files = [f for f in files if not f["name"].startswith(prefixes)]
+        if hits:
+            result[employee] = hits
+    return result
+
+
+class ExportJob:
+    """
+    Ein Monatsexport im Hintergrund-Thread.
+    service_factory liefert pro Thread einen eigenen Drive-Client.
+    """
+
+    PHASES = ["Tabellen", "PDFs", "Zeugnisse", "Ablage"]
+
+    def __init__(
+        self,
+        service_factory: Callable[[], Any],
+        period: str,
+        parts: Dict[str, Dict[str, pandas.DataFrame]],
+        attachments: Dict[str, List[Dict[str, Any]]],
+        upload_folder_id: Optional[str] = None,
+        export_dir: str = EXPORT_DIR,
+    ):
+        self.period = period
+        self.filename = f"AZK_{period}.zip"
+        self.path = os.path.join(export_dir, self.filename)
+        self._service_factory = service_factory
+        self._parts = parts
+        self._attachments = attachments
+        self._upload_folder_id = upload_folder_id
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        n_files = sum(len(v) for v in attachments.values())
+        self._progress = {
+            "phase": "Wartet", "done": 0,
+            "total": 1 + 3 * len(parts) + n_files + (1 if upload_folder_id else 0),
+            "failed": [], "drive_file_id": None, "started": None, "finished": None, "error": None,
+        }
+        os.makedirs(export_dir, exist_ok=True)
+
+    # --- Status -----------------------------------------------------------
+    def progress(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._progress, failed=list(self._progress["failed"]))
+
+    @property
+    def running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    @property
+    def fraction(self) -> float:
+        p = self.progress()
+        return min(1.0, p["done"] / p["total"]) if p["total"] else 1.0
+
+    def _update(self, phase: Optional[str] = None, step: int = 0, failed: Optional[str] = None, **values) -> None:
+        with self._lock:
+            if phase:
+                self._progress["phase"] = phase
+            self._progress["done"] += step
+            if failed:
+                self._progress["failed"].append(failed)
+            self._progress.update(values)
+
+    # --- Ablauf -----------------------------------------------------------
+    def start(self) -> "ExportJob":
+        if not self.running:
+            self._thread = threading.Thread(target=self._run, name=f"azk-export-{self.period}", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        self._update("Tabellen", started=time.time())
+        partial = self.path + ".part"
+        try:
+            with zipfile.ZipFile(partial, "w", zipfile.ZIP_DEFLATED) as zf:
+                self._write_tables(zf)
+                self._write_pdfs(zf)
+                self._write_attachments(zf)
+            os.replace(partial, self.path)
+            if self._upload_folder_id:
+                self._upload()
+            self._update("Fertig", finished=time.time())
+        except Exception as e:
+            LOGGER.exception("AZK-Export %s fehlgeschlagen", self.period)
+            if os.path.exists(partial):
+                os.remove(partial)
+            self._update("Fehler", error=str(e), finished=time.time())
+
+    def _entry(self, employee: str, name: str) -> str:
+        return f"AZK_{self.period}/{_safe_name(employee)}/{name}"
+
+    def _write_tables(self, zf: zipfile.ZipFile) -> None:
+        zf.writestr(f"AZK_{self.period}/Uebersicht_{self.period}.csv", overview(self._parts).to_csv(index=False))
+        self._update(step=1)
+        for employee, part in self._parts.items():
+            safe = _safe_name(employee)
+            zf.writestr(self._entry(employee, f"AZK_{safe}_{self.period}.csv"), part["azk"].to_csv(index=False))
+            zf.writestr(self._entry(employee, f"Rapporte_{safe}_{self.period}.csv"), part["rapporte"].to_csv(index=False))
+            self._update(step=2)
+
+    def _pdf_jobs(self):
+        for employee, part in self._parts.items():
+            azk = part["azk"].reindex(columns=AZK_COLUMNS).fillna("").to_dict("records")
+            rapporte = part["rapporte"].reindex(columns=RAPPORT_COLUMNS).fillna("").to_dict("records")
+            yield employee, (employee, self.period, azk, rapporte)
+
+    def _write_pdfs(self, zf: zipfile.ZipFile) -> None:
+        self._update("PDFs")
+        jobs = dict(self._pdf_jobs())
+        if not jobs:
+            return
+        # spawn: der Server-Prozess hat Threads, fork wäre nicht sicher.
+        try:
+            pool = ProcessPoolExecutor(max_workers=min(PDF_WORKERS, len(jobs)), mp_context=multiprocessing.get_context("spawn"))
+        except (OSError, NotImplementedError):
+            pool = ThreadPoolExecutor(max_workers=1)
+        with pool:
+            futures = {pool.submit(render_pdf, *args): employee for employee, args in jobs.items()}
+            for future in as_completed(futures):
+                employee = futures[future]
+                try:
+                    zf.writestr(self._entry(employee, f"AZK_{_safe_name(employee)}_{self.period}.pdf"), future.result())
+                    self._update(step=1)
+                except Exception as e:
+                    self._update(step=1, failed=f"PDF {employee}: {e}")
+
+    def _fetch(self, file_id: str):
+        buffer = tempfile.SpooledTemporaryFile(max_size=ds.SPOOL_MAX_SIZE)
+        try:
+            ds.stream_download(self._service_factory(), file_id, buffer)
+        except Exception:
+            buffer.close()
+            raise
+        buffer.seek(0)
+        return buffer
+
+    def _write_attachments(self, zf: zipfile.ZipFile) -> None:
+        self._update("Zeugnisse")
+        files = [(employee, f) for employee, items in self._attachments.items() for f in items]
+        if not files:
+            return
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="azk-fetch") as pool:
+            futures = {pool.submit(self._fetch, f["id"]): (employee, f) for employee, f in files}
+            for future in as_completed(futures):
+                employee, meta = futures[future]
+                try:
+                    with future.result() as source, zf.open(self._entry(employee, f"Zeugnisse/{_safe_name(meta['name'])}"), "w") as target:
+                        shutil.copyfileobj(source, target, ds.DOWNLOAD_CHUNK_SIZE)
+                    self._update(step=1)
+                except Exception as e:
+                    self._update(step=1, failed=f"Zeugnis {meta['name']}: {e}")
+
+    def _upload(self) -> None:
+        self._update("Ablage")
+        service = self._service_factory()
+        folder_id = ds.ensure_folder(service, self._upload_folder_id, EXPORT_FOLDER_NAME)
+        if not folder_id:
+            raise RuntimeError(f"Ordner '{EXPORT_FOLDER_NAME}' nicht verfügbar")
+        with open(self.path, "rb") as fh:
+            file_id = ds.upload_stream(service, folder_id, self.filename, fh, "application/zip")
+        if not file_id:
+            raise RuntimeError("Hochladen nach Drive fehlgeschlagen")
+        self._update(step=1, drive_file_id=file_id)
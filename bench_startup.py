@@ -0,0 +1,88 @@
+"""
+Kaltstart-Benchmark: Zeit bis zur ersten Ansicht (Start) und bis zur
+ersten Drive-Ansicht (Mitarbeiter-Login) in einem frischen Prozess.
+
+Jede Messung läuft in einem eigenen Python-Prozess, damit keine Module aus
+vorherigen Läufen im Speicher sind. Drive wird durch drive_fake ersetzt.
+
+    python bench_startup.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _child() -> None:
+    process_start = time.perf_counter()
+    sys.path.insert(0, APP_DIR)
+
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(APP_DIR, "app.py"), default_timeout=60)
+    app.secrets["general"] = {}
+    setup_done = time.perf_counter()
+
+    # Erste Ansicht: noch kein Drive nötig, daher vor dem Fake-Setup messen.
+    app.run()
+    first_paint = time.perf_counter()
+
+    import drive_store as ds
+    from drive_fake import FakeDriveService
+
+    service = FakeDriveService()
+    folders = {key: service.add_folder(key) for key in ("P", "Z", "F", "PL")}
+    service.add_file("Employees.csv", [folders["P"]], b"Mitarbeiter_ID,Name,PIN,Status\n1,Test,1234,Aktiv\n", "text/csv")
+    ds.get_drive_service = lambda: service
+    app.secrets["general"] = {
+        "PROJECT_REPORTS_FOLDER_ID": folders["P"],
+        "TIME_REPORTS_FOLDER_ID": folders["Z"],
+        "PHOTOS_FOLDER_ID": folders["F"],
+        "PLANS_FOLDER_ID": folders["PL"],
+    }
+    fake_ready = time.perf_counter()
+
+    app.button[0].click().run()
+    login_view = time.perf_counter()
+
+    print(json.dumps({
+        "harness_setup_ms": (setup_done - process_start) * 1000,
+        "first_paint_ms": (first_paint - setup_done) * 1000,
+        "login_view_ms": (login_view - fake_ready) * 1000,
+        "errors": [e.value for e in app.exception],
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child()
+        return
+
+    results = []
+    for _ in range(args.runs):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child"],
+            capture_output=True, text=True, check=True, cwd=APP_DIR,
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    for key in ("first_paint_ms", "login_view_ms"):
+        values = [r[key] for r in results]
+        print(f"startup.{key}: median={statistics.median(values):.1f} min={min(values):.1f} max={max(values):.1f}")
+    errors = [e for r in results for e in r["errors"]]
+    if errors:
+        print(f"startup.errors: {errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Cache-Invalidierung über den Drive-Change-Feed.
+
+Ein ChangeWatcher pollt im Hintergrund changes().list und zählt für jeden
+betroffenen Ordner und jede betroffene Datei eine Generation hoch. Gecachte
+Funktionen bekommen diese Generation als Argument: solange sich nichts
+ändert, bleibt der Cache-Eintrag gültig, bei einer Änderung wird genau
+dieser Eintrag neu geladen.
+"""
+import logging
+import threading
+from typing import Optional, Iterable, Dict, Any, Set, Callable
+
+from googleapiclient.errors import HttpError
+
+
+LOGGER = logging.getLogger(__name__)
+
+POLL_INTERVAL_SEC = 10
+CHANGES_PAGE_SIZE = 1000
+CHANGES_FIELDS = "nextPageToken, newStartPageToken, changes(fileId, removed, file(parents, trashed))"
+
+
+class ChangeWatcher:
+    """
+    Überwacht eine feste Menge von Drive-Ordnern über den Change-Feed.
+    on_change wird mit allen im Feed erkannten Schlüsseln aufgerufen, z.B.
+    um einen gemeinsamen Cache anderer Repliken zu invalidieren.
+    service_factory liefert den Drive-Client des aufrufenden Threads; der
+    Hintergrund-Thread baut sich so seinen eigenen.
+    """
+
+    def __init__(
+        self,
+        service_factory: Callable[[], Any],
+        folder_ids: Iterable[str],
+        interval: float = POLL_INTERVAL_SEC,
+        on_change: Optional[Callable[..., None]] = None,
+    ):
+        self._service_factory = service_factory
+        self._local = threading.local()
+        self._folders: Set[str] = {fid for fid in folder_ids if fid}
+        self._interval = interval
+        self._on_change = on_change
+        self._lock = threading.Lock()
+        self._generations: Dict[str, int] = {}
+        self._parents: Dict[str, Set[str]] = {}
+        self._page_token: Optional[str] = None
+        self._poll_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- Generationen -----------------------------------------------------
+    def generation(self, key: str) -> int:
+        """
+        Aktuelle Generation eines Ordners oder einer Datei (0 = unverändert).
+        """
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def invalidate(self, *keys: str) -> None:
+        """
+        Markiert Ordner/Dateien sofort als geändert, z.B. nach eigenen Uploads.
+        """
+        with self._lock:
+            for key in keys:
+                if key:
+                    self._generations[key] = self._generations.get(key, 0) + 1
+
+    def invalidate_all(self) -> None:
+        self.invalidate(*self._folders)
+
+    def _changed(self, *keys: str) -> None:
+        self.invalidate(*keys)
+        if self._on_change:
+            try:
+                self._on_change(*keys)
+            except Exception as e:
+                LOGGER.warning("Änderung konnte nicht weitergegeben werden: %s", e)
+
+    def _service(self) -> Any:
+        # Drive-Clients sind nicht thread-sicher: ein Client pro Thread.
+        if getattr(self._local, "service", None) is None:
+            self._local.service = self._service_factory()
+        return self._local.service
+
+    # --- Feed ---------------------------------------------------------------
+    def poll_once(self) -> int:
+        """
+        Liest alle seit dem letzten Aufruf angefallenen Änderungen.
+        Gibt die Anzahl verarbeiteter Changes zurück.
+        """
+        with self._poll_lock:
+            return self._poll()
+
+    def _poll(self) -> int:
+        if self._page_token is None:
+            self._page_token = self._start_token()
+            return 0
+
+        processed = 0
+        token = self._page_token
+        try:
+            while token:
+                response = self._service().changes().list(
+                    pageToken=token,
+                    pageSize=CHANGES_PAGE_SIZE,
+                    fields=CHANGES_FIELDS,
+                    spaces="drive",
+                    includeItemsFromAllDrives=True,
+                    supportsAllDrives=True,
+                ).execute()
+
+                for change in response.get("changes", []):
+                    self._apply(change)
+                    processed += 1
+
+                if "newStartPageToken" in response:
+                    self._page_token = response["newStartPageToken"]
+                    break
+                token = response.get("nextPageToken")
+
+        except HttpError as e:
+            # Abgelaufener Token: Stand ist unbekannt, also alles verwerfen.
+            if getattr(e, "status_code", None) in (400, 404, 410):
+                LOGGER.warning("Change-Token ungültig, setze Feed zurück: %s", e)
+                self._page_token = self._start_token()
+                self._changed(*self._folders)
+            else:
+                raise
+
+        return processed
+
+    def refresh(self) -> None:
+        """
+        Weckt den Hintergrund-Thread für eine sofortige Abfrage.
+        """
+        self._wake.set()
+
+    def _start_token(self) -> str:
+        response = self._service().changes().getStartPageToken(supportsAllDrives=True).execute()
+        return response["startPageToken"]
+
+    def _apply(self, change: Dict[str, Any]) -> None:
+        file_id = change.get("fileId")
+        file_meta = change.get("file") or {}
+        parents = set(file_meta.get("parents", []))
+
+        with self._lock:
+            known = self._parents.get(file_id, set())
+            if change.get("removed") and not parents:
+                parents = known
+            if parents:
+                self._parents[file_id] = parents
+
+        touched = (parents | known) & self._folders
+        if change.get("removed") and not parents:
+            # Gelöschte Datei ohne bekannte Herkunft: konservativ alles.
+            touched = set(self._folders)
+
+        self._changed(file_id, *touched)
+
+    # --- Hintergrund-Thread ---------------------------------------------
+    def start(self) -> "ChangeWatcher":
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        try:
+            # Start-Token sofort holen, damit keine Änderung verloren geht.
+            self.poll_once()
+        except Exception as e:
+            LOGGER.warning("Change-Feed konnte nicht initialisiert werden: %s", e)
+        self._thread = threading.Thread(target=self._run, name="drive-change-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=self._interval + 1)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                LOGGER.warning("Change-Feed konnte nicht gelesen werden: %s", e)
+                self.invalidate_all()
+            self._wake.wait(self._interval)
+            self._wake.clear()
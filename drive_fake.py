@@ -0,0 +1,427 @@
+"""
+Lokaler In-Memory-Ersatz für den Google-Drive-Service (files/changes).
+
+Bildet die Teilmenge der Drive-v3-API nach, die drive_store, die App und
+der ChangeWatcher verwenden, inklusive blockweiser Downloads über
+MediaIoBaseDownload und resumable Uploads. Gedacht für lokale Tests und
+Entwicklung ohne Service-Account.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Callable
+
+import httplib2
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaUploadProgress
+
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+RETRY_BACKOFF_SEC = 0.05
+
+_QUERY_PARENT = re.compile(r"'((?:[^'\\]|\\.)*)' in parents")
+_QUERY_EQUALS = re.compile(r"(name|mimeType) = '((?:[^'\\]|\\.)*)'")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _http_error(status: int, message: str) -> HttpError:
+    return HttpError(httplib2.Response({"status": status}), message.encode("utf-8"))
+
+
+def _quota_error() -> HttpError:
+    content = json.dumps({"error": {
+        "code": 429,
+        "message": "Rate Limit Exceeded",
+        "errors": [{"reason": "rateLimitExceeded", "message": "Rate Limit Exceeded"}],
+    }})
+    return _http_error(429, content)
+
+
+class _Request:
+    """
+    Nachbildung eines HttpRequest mit execute().
+    """
+
+    def __init__(self, drive: "FakeDriveService", fn: Callable[[], Any]):
+        self._drive = drive
+        self._fn = fn
+
+    def execute(self, num_retries: int = 0) -> Any:
+        self._drive._call(num_retries)
+        return self._fn()
+
+
+class _UploadRequest:
+    """
+    Resumable Upload: liest das Media-Objekt blockweise über next_chunk().
+    """
+
+    def __init__(self, drive: "FakeDriveService", media, finish: Callable[[bytes], Dict[str, Any]]):
+        self._drive = drive
+        self._media = media
+        self._finish = finish
+        self._received = bytearray()
+
+    def next_chunk(self, num_retries: int = 0):
+        self._drive._call(num_retries)
+        if self._media is None:
+            return None, self._finish(b"")
+
+        size = self._media.size()
+        chunk_size = self._media.chunksize()
+        if chunk_size <= 0:
+            chunk_size = size
+
+        begin = len(self._received)
+        self._received.extend(self._media.getbytes(begin, chunk_size))
+        if len(self._received) >= size:
+            return None, self._finish(bytes(self._received))
+        return MediaUploadProgress(len(self._received), size), None
+
+    def execute(self, num_retries: int = 0) -> Dict[str, Any]:
+        response = None
+        while response is None:
+            _, response = self.next_chunk(num_retries)
+        return response
+
+
+class _FakeHttp:
+    """
+    Beantwortet die Range-Requests von MediaIoBaseDownload.
+    """
+
+    def __init__(self, drive: "FakeDriveService"):
+        self._drive = drive
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        try:
+            self._drive._call()
+        except HttpError as e:
+            return e.resp, e.content
+        file_id = uri.rsplit("/", 1)[-1]
+        content = self._drive._content(file_id)
+        total = len(content)
+
+        if total == 0:
+            return httplib2.Response({"status": 200, "content-length": "0"}), b""
+
+        start, end = 0, total - 1
+        range_header = (headers or {}).get("range")
+        if range_header:
+            first, last = range_header.split("=", 1)[1].split("-")
+            start, end = int(first), min(int(last), total - 1)
+
+        resp = httplib2.Response({
+            "status": 206,
+            "content-range": f"bytes {start}-{end}/{total}",
+        })
+        return resp, content[start:end + 1]
+
+
+class _MediaRequest:
+    """
+    Media-Request, wie ihn files().get_media() zurückgibt.
+    """
+
+    def __init__(self, drive: "FakeDriveService", file_id: str):
+        self.http = _FakeHttp(drive)
+        self.uri = f"fake://drive/files/{file_id}"
+        self.headers: Dict[str, str] = {}
+        self._drive = drive
+        self._file_id = file_id
+
+    def execute(self, num_retries: int = 0) -> bytes:
+        self._drive._call(num_retries)
+        return self._drive._content(self._file_id)
+
+
+class _Files:
+    def __init__(self, drive: "FakeDriveService"):
+        self._drive = drive
+
+    def list(self, q: str = "", pageToken: Optional[str] = None, pageSize: int = 100, **kwargs) -> _Request:
+        def run() -> Dict[str, Any]:
+            # Wie Drive: höchstens pageSize Einträge, Rest über nextPageToken.
+            files = self._drive._query(q)
+            start = int(pageToken or 0)
+            response = {"files": files[start:start + pageSize]}
+            if start + pageSize < len(files):
+                response["nextPageToken"] = str(start + pageSize)
+            return response
+        return _Request(self._drive, run)
+
+    def get(self, fileId: str, **kwargs) -> _Request:
+        return _Request(self._drive, lambda: self._drive._metadata(fileId))
+
+    def get_media(self, fileId: str, **kwargs) -> _MediaRequest:
+        self._drive._metadata(fileId)
+        return _MediaRequest(self._drive, fileId)
+
+    def create(self, body: Optional[Dict[str, Any]] = None, media_body=None, **kwargs):
+        body = dict(body or {})
+
+        def finish(content: bytes) -> Dict[str, Any]:
+            return self._drive.add_file(
+                body.get("name", "Unbenannt"),
+                body.get("parents", []),
+                content,
+                body.get("mimeType") or getattr(media_body, "mimetype", lambda: None)() or "application/octet-stream",
+            )
+
+        if media_body is None:
+            return _Request(self._drive, lambda: finish(b""))
+        return _UploadRequest(self._drive, media_body, finish)
+
+    def update(
+        self,
+        fileId: str,
+        body: Optional[Dict[str, Any]] = None,
+        media_body=None,
+        addParents: Optional[str] = None,
+        removeParents: Optional[str] = None,
+        **kwargs,
+    ):
+        def finish(content: Optional[bytes]) -> Dict[str, Any]:
+            return self._drive._update(fileId, body or {}, content, addParents, removeParents)
+
+        if media_body is None:
+            return _Request(self._drive, lambda: finish(None))
+        return _UploadRequest(self._drive, media_body, finish)
+
+    def delete(self, fileId: str, **kwargs) -> _Request:
+        return _Request(self._drive, lambda: self._drive._delete(fileId))
+
+    def copy(self, fileId: str, body: Optional[Dict[str, Any]] = None, **kwargs) -> _Request:
+        def run() -> Dict[str, Any]:
+            source = self._drive._metadata(fileId)
+            body_ = body or {}
+            return self._drive.add_file(
+                body_.get("name", source["name"]),
+                body_.get("parents", source["parents"]),
+                self._drive._content(fileId),
+                source["mimeType"],
+            )
+        return _Request(self._drive, run)
+
+
+class _Changes:
+    def __init__(self, drive: "FakeDriveService"):
+        self._drive = drive
+
+    def getStartPageToken(self, **kwargs) -> _Request:
+        return _Request(self._drive, lambda: {"startPageToken": self._drive._change_token()})
+
+    def list(self, pageToken: str, pageSize: int = 100, **kwargs) -> _Request:
+        return _Request(self._drive, lambda: self._drive._list_changes(pageToken, pageSize))
+
+
+class FakeDriveService:
+    """
+    In-Memory-Drive mit Ordnern, Dateiinhalten und Change-Feed.
+    Thread-sicher, damit Watcher und parallele Sessions sie teilen können.
+
+    Für Lasttests kann jeder API-Aufruf (auch jeder Upload-/Download-Block)
+    um latency + zufällig bis zu jitter Sekunden verzögert werden und mit
+    Wahrscheinlichkeit error_rate einen Quota-Fehler (429) liefern. Wie beim
+    echten Client wird bei num_retries > 0 mit Backoff wiederholt.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self._lock = threading.RLock()
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._blobs: Dict[str, bytes] = {}
+        self._changes: List[Dict[str, Any]] = []
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self.stats = {"calls": 0, "quota_errors": 0, "retries": 0}
+
+    # --- API-Ressourcen ---------------------------------------------------
+    def files(self) -> _Files:
+        return _Files(self)
+
+    def changes(self) -> _Changes:
+        return _Changes(self)
+
+    # --- Test-Helfer ------------------------------------------------------
+    def add_folder(self, name: str, parent_id: Optional[str] = None) -> str:
+        parents = [parent_id] if parent_id else []
+        return self.add_file(name, parents, b"", FOLDER_MIME)["id"]
+
+    def add_file(
+        self,
+        name: str,
+        parents: List[str],
+        content: bytes = b"",
+        mime_type: str = "application/octet-stream",
+    ) -> Dict[str, Any]:
+        with self._lock:
+            file_id = uuid.uuid4().hex
+            stamp = _now()
+            self._files[file_id] = {
+                "id": file_id,
+                "name": name,
+                "mimeType": mime_type,
+                "parents": list(parents),
+                "createdTime": stamp,
+                "modifiedTime": stamp,
+                "trashed": False,
+                "md5Checksum": hashlib.md5(content).hexdigest(),
+                "size": str(len(content)),
+            }
+            self._blobs[file_id] = bytes(content)
+            self._record_change(file_id)
+            return dict(self._files[file_id])
+
+    def configure(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0) -> None:
+        with self._lock:
+            self.latency, self.jitter, self.error_rate = latency, jitter, error_rate
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats)
+
+    # --- interne Operationen ----------------------------------------------
+    def _call(self, num_retries: int = 0) -> None:
+        """
+        Simuliert Netzwerk-Latenz und Quota-Fehler eines API-Aufrufs.
+        """
+        for attempt in range(num_retries + 1):
+            with self._lock:
+                delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+                failed = self.error_rate > 0 and self._rng.random() < self.error_rate
+                self.stats["calls"] += 1
+                self.stats["quota_errors"] += failed
+                self.stats["retries"] += attempt > 0
+            if delay > 0:
+                time.sleep(delay)
+            if not failed:
+                return
+            if attempt == num_retries:
+                raise _quota_error()
+            time.sleep(min(RETRY_BACKOFF_SEC * 2 ** attempt, 1.0))
+
+    def _record_change(self, file_id: str, removed: bool = False) -> None:
+        entry = {"fileId": file_id, "removed": removed, "time": _now()}
+        if not removed:
+            entry["file"] = dict(self._files[file_id])
+        self._changes.append(entry)
+
+    def _metadata(self, file_id: str) -> Dict[str, Any]:
+        with self._lock:
+            if file_id not in self._files:
+                raise _http_error(404, f"File not found: {file_id}")
+            return dict(self._files[file_id])
+
+    def _content(self, file_id: str) -> bytes:
+        with self._lock:
+            if file_id not in self._blobs:
+                raise _http_error(404, f"File not found: {file_id}")
+            return self._blobs[file_id]
+
+    def _query(self, q: str) -> List[Dict[str, Any]]:
+        # Mehrere "'x' in parents" sind mit "or" verknüpft (gebündelte Listings).
+        parents = set(_QUERY_PARENT.findall(q))
+        filters = {k: v.replace(r"\'", "'") for k, v in _QUERY_EQUALS.findall(q)}
+        with self._lock:
+            result = []
+            for meta in self._files.values():
+                if meta["trashed"] and "trashed = false" in q:
+                    continue
+                if parents and parents.isdisjoint(meta["parents"]):
+                    continue
+                if any(meta.get(k) != v for k, v in filters.items()):
+                    continue
+                result.append(dict(meta))
+            return sorted(result, key=lambda m: m["createdTime"])
+
+    def _update(
+        self,
+        file_id: str,
+        body: Dict[str, Any],
+        content: Optional[bytes],
+        add_parents: Optional[str],
+        remove_parents: Optional[str],
+    ) -> Dict[str, Any]:
+        with self._lock:
+            meta = self._files.get(file_id)
+            if meta is None:
+                raise _http_error(404, f"File not found: {file_id}")
+            meta.update({k: v for k, v in body.items() if k in ("name", "trashed")})
+            if add_parents:
+                meta["parents"].extend(p for p in add_parents.split(",") if p not in meta["parents"])
+            if remove_parents:
+                meta["parents"] = [p for p in meta["parents"] if p not in remove_parents.split(",")]
+            if content is not None:
+                self._blobs[file_id] = content
+                meta["md5Checksum"] = hashlib.md5(content).hexdigest()
+                meta["size"] = str(len(content))
+            meta["modifiedTime"] = _now()
+            self._record_change(file_id)
+            return dict(meta)
+
+    def _delete(self, file_id: str) -> str:
+        with self._lock:
+            if self._files.pop(file_id, None) is None:
+                raise _http_error(404, f"File not found: {file_id}")
+            self._blobs.pop(file_id, None)
+            self._record_change(file_id, removed=True)
+            return ""
+
+    def _change_token(self) -> str:
+        with self._lock:
+            return str(len(self._changes) + 1)
+
+    def _list_changes(self, page_token: str, page_size: int) -> Dict[str, Any]:
+        with self._lock:
+            start = int(page_token) - 1
+            if start < 0 or start > len(self._changes):
+                raise _http_error(400, f"Invalid pageToken: {page_token}")
+            page = self._changes[start:start + page_size]
+            result: Dict[str, Any] = {"changes": [dict(c) for c in page]}
+            end = start + len(page)
+            if end < len(self._changes):
+                result["nextPageToken"] = str(end + 1)
+            else:
+                result["newStartPageToken"] = str(len(self._changes) + 1)
+            return result
+
+
+# Methoden, die ein FakeDriveService hinter einem multiprocessing-Manager
+# bereitstellen muss, damit RemoteDrive ihn aus anderen Prozessen nutzen kann.
+REMOTE_METHODS = [
+    "add_folder", "add_file", "configure", "get_stats",
+    "_call", "_metadata", "_content", "_query", "_update", "_delete",
+    "_change_token", "_list_changes",
+]
+
+
+class RemoteDrive:
+    """
+    Service-Fassade für einen FakeDriveService in einem anderen Prozess
+    (z.B. ein Manager-Proxy). So teilen sich mehrere App-Prozesse ein Drive.
+    """
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def files(self) -> _Files:
+        return _Files(self._backend)
+
+    def changes(self) -> _Changes:
+        return _Changes(self._backend)
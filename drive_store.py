@@ -1,37 +1,185 @@
+from __future__ import annotations
+
+import hashlib
 import io
-from typing import Optional, Tuple, List, Dict, Any
+import json
+import tempfile
+import threading
+from typing import Optional, Tuple, List, Dict, Any, IO, Callable, Hashable, TYPE_CHECKING
 
-import pandas as pd
 import streamlit as st
-from google.oauth2 import service_account
-from googleapiclient.discovery import build, Resource
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload
+
+from lazy_imports import lazy_import
+from shared_cache import NullCache
+
+# Schwere Module erst bei Bedarf laden (Kaltstart der Start-Ansicht).
+pd = lazy_import("pandas")
+discovery = lazy_import("googleapiclient.discovery")
+discovery_cache = lazy_import("googleapiclient.discovery_cache")
+gapi_http = lazy_import("googleapiclient.http")
+service_account = lazy_import("google.oauth2.service_account")
+
+if TYPE_CHECKING:
+    import pandas
+    from googleapiclient.discovery import Resource
+    from googleapiclient.http import MediaIoBaseUpload
 
 
 DRIVE_SCOPES = [
     "https://www.googleapis.com/auth/drive"
 ]
 
+# Transfer-Parameter: Pro Block liegen höchstens so viele Bytes im Speicher.
+# Upload-Blöcke müssen ein Vielfaches von 256 KiB sein (Drive-Vorgabe).
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+UPLOAD_RETRIES = 3
+
+# Ab dieser Grösse werden Zwischenpuffer auf die Festplatte ausgelagert.
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+class SingleFlight:
+    """
+    Bündelt gleichzeitige identische Lesezugriffe.
+    Der erste Aufrufer führt den Abruf aus, alle weiteren Aufrufer mit
+    demselben Schlüssel warten auf dessen Ergebnis (oder dessen Fehler).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Dict[str, Any]] = {}
+        self._stats = {"requests": 0, "fetches": 0, "coalesced": 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Gibt (Ergebnis, geteilt) zurück. geteilt=True bedeutet, dass das
+        Ergebnis von einem anderen, bereits laufenden Abruf stammt.
+        """
+        with self._lock:
+            self._stats["requests"] += 1
+            call = self._calls.get(key)
+            shared = call is not None
+            if shared:
+                self._stats["coalesced"] += 1
+            else:
+                call = {"done": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+                self._stats["fetches"] += 1
+
+        if shared:
+            call["done"].wait()
+        else:
+            try:
+                call["result"] = fn()
+            except BaseException as e:
+                call["error"] = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call["done"].set()
+
+        if call["error"] is not None:
+            raise call["error"]
+        return call["result"], shared
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+
+_read_flight = SingleFlight()
+
+
+def coalesce(key: Hashable, fn: Callable[[], Any]) -> Any:
+    """
+    Führt fn aus, sofern nicht bereits ein Abruf mit gleichem Schlüssel
+    läuft. Das Ergebnis wird mit allen Wartenden geteilt und darf daher
+    nicht verändert werden.
+    """
+    result, _ = _read_flight.do(key, fn)
+    return result
+
+
+_epoch_lock = threading.Lock()
+_write_epochs: Dict[Tuple[str, str], int] = {}
+
+
+def _write_epoch(folder_id: str, filename: str, bump: bool = False) -> int:
+    with _epoch_lock:
+        key = (folder_id, filename)
+        if bump:
+            _write_epochs[key] = _write_epochs.get(key, 0) + 1
+        return _write_epochs.get(key, 0)
+
+
+# Gemeinsamer Cache über alle Repliken (siehe shared_cache); ohne
+# Konfiguration ein Platzhalter, der direkt lädt.
+_shared_cache = NullCache()
+
+
+def use_shared_cache(cache) -> None:
+    global _shared_cache
+    _shared_cache = cache
+
+
+def shared_cache():
+    return _shared_cache
+
+
+def get_read_stats() -> Dict[str, int]:
+    """
+    Kennzahlen der Lese-Bündelung (prozessweit):
+    requests, fetches (tatsächliche Abrufe), coalesced, in_flight.
+    """
+    return _read_flight.stats()
+
+
+_service_local = threading.local()
+_setup_lock = threading.Lock()
+_drive_setup: Dict[str, Any] = {}
+
+
+def _drive_client_setup() -> Tuple[Dict[str, Any], Any]:
+    """
+    Lädt das mitgelieferte Discovery-Dokument und die Credentials einmal pro
+    Prozess. Fällt auf None zurück, wenn kein statisches Dokument vorliegt.
+    """
+    with _setup_lock:
+        if not _drive_setup:
+            static_doc = discovery_cache.get_static_doc("drive", "v3")
+            _drive_setup["document"] = json.loads(static_doc) if static_doc else None
+            _drive_setup["credentials"] = service_account.Credentials.from_service_account_info(
+                dict(st.secrets["gcp_service_account"]),
+                scopes=DRIVE_SCOPES,
+            )
+        return _drive_setup["document"], _drive_setup["credentials"]
+
 
 def get_drive_service() -> Optional[Resource]:
     """
     Baut den Google-Drive-Service aus st.secrets['gcp_service_account'] auf.
     Erwartet einen [gcp_service_account]-Block in secrets.toml.
+    Pro Thread wird ein Client wiederverwendet (httplib2 ist nicht
+    thread-sicher), Discovery-Dokument und Credentials pro Prozess.
     """
     try:
         if "gcp_service_account" not in st.secrets:
             st.error("Service-Account-Konfiguration fehlt in secrets.toml.")
             return None
 
-        service_account_info = dict(st.secrets["gcp_service_account"])
+        service = getattr(_service_local, "service", None)
+        if service is not None:
+            return service
 
-        credentials = service_account.Credentials.from_service_account_info(
-            service_account_info,
-            scopes=DRIVE_SCOPES,
-        )
+        document, credentials = _drive_client_setup()
+        if document:
+            service = discovery.build_from_document(document, credentials=credentials)
+        else:
+            service = discovery.build("drive", "v3", credentials=credentials)
 
-        service = build("drive", "v3", credentials=credentials)
+        _service_local.service = service
         return service
 
     except Exception as e:
@@ -66,15 +214,21 @@ def list_files(
 
         query = " and ".join(query_parts)
 
-        response = service.files().list(
-            q=query,
-            fields="files(id, name, mimeType, createdTime, modifiedTime, parents)",
-            pageSize=1000,
-            supportsAllDrives=True,
-            includeItemsFromAllDrives=True,
-        ).execute()
-
-        return response.get("files", [])
+        # Drive liefert höchstens 1000 Einträge pro Seite.
+        files, token = [], None
+        while True:
+            response = service.files().list(
+                q=query,
+                fields="nextPageToken, files(id, name, mimeType, createdTime, modifiedTime, parents, md5Checksum, size)",
+                pageSize=1000,
+                pageToken=token,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True,
+            ).execute()
+            files.extend(response.get("files", []))
+            token = response.get("nextPageToken")
+            if not token:
+                return files
 
     except HttpError as e:
         st.error(f"Fehler beim Auflisten von Dateien: {e}")
@@ -146,34 +300,47 @@ def ensure_folder(
         return None
 
 
+def _download_csv(service: Resource, file_id: str) -> pandas.DataFrame:
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as buffer:
+        stream_download(service, file_id, buffer)
+        buffer.seek(0)
+        return pd.read_csv(buffer)
+
+
 def read_csv(
     service: Resource,
     folder_id: str,
     filename: str,
-) -> Tuple[pd.DataFrame, Optional[str]]:
+) -> Tuple[pandas.DataFrame, Optional[str]]:
     """
     Liest eine CSV aus Google Drive.
     Gibt (DataFrame, file_id) zurück.
     """
+    # Gleichzeitige Leser derselben Datei teilen sich Listing und Download;
+    # jeder Aufrufer bekommt eine eigene Kopie zum Weiterbearbeiten. Eigene
+    # Schreibvorgänge erhöhen die Schreib-Epoche, damit ein danach gestarteter
+    # Leser nicht an einem älteren, noch laufenden Abruf hängt.
+    # Die Dateiversion (modifiedTime) steckt im Schlüssel des gemeinsamen
+    # Caches, daher ist dieser nie veraltet.
+    def fetch():
+        files = list_files(service, folder_id, name=filename)
+        if not files:
+            return None, None
+        file_id = files[0]["id"]
+        key = ("csv", file_id, files[0].get("modifiedTime"))
+        try:
+            if not key[2]:
+                return _download_csv(service, file_id), file_id
+            return _shared_cache.get_or_load(key, lambda: _download_csv(service, file_id)), file_id
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame(), file_id
+
     try:
-        file_id = get_file_id(service, folder_id, filename)
-        if not file_id:
+        df, file_id = coalesce(("read_csv", folder_id, filename, _write_epoch(folder_id, filename)), fetch)
+        if df is None:
             return pd.DataFrame(), None
+        return df.copy(), file_id
 
-        request = service.files().get_media(fileId=file_id, supportsAllDrives=True)
-        buffer = io.BytesIO()
-        downloader = MediaIoBaseDownload(buffer, request)
-
-        done = False
-        while not done:
-            _, done = downloader.next_chunk()
-
-        buffer.seek(0)
-        df = pd.read_csv(buffer)
-        return df, file_id
-
-    except pd.errors.EmptyDataError:
-        return pd.DataFrame(), file_id if "file_id" in locals() else None
     except HttpError as e:
         st.error(f"Fehler beim Lesen von '{filename}': {e}")
         return pd.DataFrame(), None
@@ -186,7 +353,7 @@ def save_csv(
     service: Resource,
     folder_id: str,
     filename: str,
-    df: pd.DataFrame,
+    df: pandas.DataFrame,
     file_id: Optional[str] = None,
 ) -> Optional[str]:
     """
@@ -195,38 +362,31 @@ def save_csv(
     Sonst wird sie neu erstellt.
     """
     try:
-        csv_buffer = io.BytesIO()
-        df.to_csv(csv_buffer, index=False)
-        csv_buffer.seek(0)
-
-        media = MediaIoBaseUpload(
-            csv_buffer,
-            mimetype="text/csv",
-            resumable=True,
-        )
-
-        if file_id:
-            updated = service.files().update(
-                fileId=file_id,
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as csv_buffer:
+            df.to_csv(csv_buffer, index=False, encoding="utf-8")
+            media = _chunked_media(csv_buffer, "text/csv")
+
+            if file_id:
+                request = service.files().update(
+                    fileId=file_id,
+                    media_body=media,
+                    supportsAllDrives=True,
+                    fields="id",
+                )
+                return _run_resumable(request).get("id")
+
+            metadata = {
+                "name": filename,
+                "parents": [folder_id],
+            }
+
+            request = service.files().create(
+                body=metadata,
                 media_body=media,
                 supportsAllDrives=True,
                 fields="id",
-            ).execute()
-            return updated.get("id")
-
-        metadata = {
-            "name": filename,
-            "parents": [folder_id],
-        }
-
-        created = service.files().create(
-            body=metadata,
-            media_body=media,
-            supportsAllDrives=True,
-            fields="id",
-        ).execute()
-
-        return created.get("id")
+            )
+            return _run_resumable(request).get("id")
 
     except HttpError as e:
         st.error(f"Fehler beim Speichern von '{filename}': {e}")
@@ -234,6 +394,9 @@ def save_csv(
     except Exception as e:
         st.error(f"Unerwarteter Fehler beim Speichern von '{filename}': {e}")
         return None
+    finally:
+        # Leser, die ab jetzt starten, sollen nicht an einem älteren Abruf hängen.
+        _write_epoch(folder_id, filename, bump=True)
 
 
 def ensure_csv_exists(
@@ -254,36 +417,62 @@ def ensure_csv_exists(
     return save_csv(service, folder_id, filename, empty_df)
 
 
-def upload_file(
+def _chunked_media(
+    stream: IO[bytes],
+    mime_type: str,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> MediaIoBaseUpload:
+    """
+    Verpackt ein Datei-Objekt als resumable Upload, der blockweise gelesen wird.
+    """
+    stream.seek(0)
+    return gapi_http.MediaIoBaseUpload(
+        stream,
+        mimetype=mime_type,
+        chunksize=chunk_size,
+        resumable=True,
+    )
+
+
+def _run_resumable(request) -> Dict[str, Any]:
+    """
+    Überträgt einen resumable Upload Block für Block.
+    Bei Verbindungsfehlern wird ab dem letzten bestätigten Byte fortgesetzt.
+    """
+    response = None
+    while response is None:
+        _, response = request.next_chunk(num_retries=UPLOAD_RETRIES)
+    return response
+
+
+def upload_stream(
     service: Resource,
     folder_id: str,
     filename: str,
-    file_bytes: bytes,
+    stream: IO[bytes],
     mime_type: str,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
 ) -> Optional[str]:
     """
-    Lädt beliebige Datei-Bytes nach Google Drive hoch.
+    Lädt ein Datei-Objekt blockweise nach Google Drive hoch.
+    Der Inhalt wird direkt aus dem Objekt gelesen und nicht kopiert.
     """
     try:
-        media = MediaIoBaseUpload(
-            io.BytesIO(file_bytes),
-            mimetype=mime_type,
-            resumable=True,
-        )
+        media = _chunked_media(stream, mime_type or "application/octet-stream", chunk_size)
 
         metadata = {
             "name": filename,
             "parents": [folder_id],
         }
 
-        created = service.files().create(
+        request = service.files().create(
             body=metadata,
             media_body=media,
             supportsAllDrives=True,
             fields="id",
-        ).execute()
+        )
 
-        return created.get("id")
+        return _run_resumable(request).get("id")
 
     except HttpError as e:
         st.error(f"Fehler beim Hochladen von '{filename}': {e}")
@@ -293,21 +482,41 @@ def upload_file(
         return None
 
 
+def upload_file(
+    service: Resource,
+    folder_id: str,
+    filename: str,
+    file_bytes: bytes,
+    mime_type: str,
+) -> Optional[str]:
+    """
+    Lädt beliebige Datei-Bytes nach Google Drive hoch.
+    """
+    return upload_stream(
+        service=service,
+        folder_id=folder_id,
+        filename=filename,
+        stream=io.BytesIO(file_bytes),
+        mime_type=mime_type,
+    )
+
+
 def upload_streamlit_file(
     service: Resource,
     folder_id: str,
     uploaded_file,
+    filename: Optional[str] = None,
 ) -> Optional[str]:
     """
     Lädt eine von Streamlit hochgeladene Datei nach Google Drive.
+    Das UploadedFile wird direkt gestreamt (kein getvalue()).
     """
     try:
-        file_bytes = uploaded_file.getvalue()
-        return upload_file(
+        return upload_stream(
             service=service,
             folder_id=folder_id,
-            filename=uploaded_file.name,
-            file_bytes=file_bytes,
+            filename=filename or uploaded_file.name,
+            stream=uploaded_file,
             mime_type=uploaded_file.type or "application/octet-stream",
         )
     except Exception as e:
@@ -315,37 +524,194 @@ def upload_streamlit_file(
         return None
 
 
-def download_file_bytes(
+def stream_md5(
+    stream: IO[bytes],
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> Tuple[str, int]:
+    """
+    Berechnet MD5 und Grösse eines Datei-Objekts blockweise.
+    Gibt (hex_md5, anzahl_bytes) zurück; die Position wird zurückgesetzt.
+    """
+    digest = hashlib.md5()
+    size = 0
+    stream.seek(0)
+    for block in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(block)
+        size += len(block)
+    stream.seek(0)
+    return digest.hexdigest(), size
+
+
+class DedupUploader:
+    """
+    Upload mit Duplikat-Erkennung über Drive-md5Checksum.
+
+    Vor dem Senden wird der Inhalt gehasht und mit dem Index des Zielordners
+    verglichen:
+    - gleiche Datei im gleichen Projekt (scope im Dateinamen): übersprungen
+    - gleiche Datei aus einem anderen Projekt: serverseitige Kopie, es
+      werden keine Bytes übertragen
+    - sonst: normaler Upload
+    """
+
+    def __init__(
+        self,
+        service: Resource,
+        folder_id: str,
+        scope: str = "",
+    ):
+        self._service = service
+        self._folder_id = folder_id
+        self._scope = scope
+        self._index: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self.report = {
+            "uploaded": 0,
+            "skipped": 0,
+            "copied": 0,
+            "failed": 0,
+            "bytes_uploaded": 0,
+            "bytes_saved": 0,
+        }
+
+    def _checksum_index(self) -> Dict[str, List[Dict[str, Any]]]:
+        if self._index is None:
+            self._index = {}
+            for meta in list_files(self._service, self._folder_id):
+                if meta.get("md5Checksum"):
+                    self._index.setdefault(meta["md5Checksum"], []).append(meta)
+        return self._index
+
+    def upload(
+        self,
+        filename: str,
+        stream: IO[bytes],
+        mime_type: str,
+    ) -> Optional[str]:
+        """
+        Lädt eine Datei hoch, sofern sie nicht schon vorhanden ist.
+        Gibt die ID der neuen bzw. bestehenden Datei zurück.
+        """
+        try:
+            md5, size = stream_md5(stream)
+        except Exception as e:
+            st.error(f"Fehler beim Lesen von '{filename}': {e}")
+            self.report["failed"] += 1
+            return None
+
+        matches = self._checksum_index().get(md5, [])
+        in_scope = [m for m in matches if self._scope in m.get("name", "")]
+
+        if in_scope:
+            self.report["skipped"] += 1
+            self.report["bytes_saved"] += size
+            return in_scope[0]["id"]
+
+        if matches:
+            file_id = copy_file(self._service, matches[0]["id"], filename, self._folder_id)
+            if file_id:
+                self.report["copied"] += 1
+                self.report["bytes_saved"] += size
+                self._remember(file_id, filename, md5)
+                return file_id
+
+        file_id = upload_stream(self._service, self._folder_id, filename, stream, mime_type)
+        if not file_id:
+            self.report["failed"] += 1
+            return None
+
+        self.report["uploaded"] += 1
+        self.report["bytes_uploaded"] += size
+        self._remember(file_id, filename, md5)
+        return file_id
+
+    def upload_streamlit_file(
+        self,
+        uploaded_file,
+        filename: Optional[str] = None,
+    ) -> Optional[str]:
+        return self.upload(
+            filename or uploaded_file.name,
+            uploaded_file,
+            uploaded_file.type or "application/octet-stream",
+        )
+
+    def _remember(self, file_id: str, filename: str, md5: str) -> None:
+        self._checksum_index().setdefault(md5, []).append({"id": file_id, "name": filename, "md5Checksum": md5})
+
+    def summary(self) -> str:
+        r = self.report
+        saved_mb = r["bytes_saved"] / (1024 * 1024)
+        return (
+            f"{r['uploaded']} hochgeladen, {r['skipped']} Duplikat(e) übersprungen, "
+            f"{r['copied']} serverseitig kopiert – {saved_mb:.1f} MB Upload eingespart."
+        )
+
+
+def stream_download(
     service: Resource,
     file_id: str,
-) -> Optional[bytes]:
+    target: IO[bytes],
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+) -> None:
     """
-    Lädt eine Datei aus Google Drive als Bytes.
+    Schreibt den Inhalt einer Drive-Datei blockweise in ein Datei-Objekt.
+    Fehler werden an den Aufrufer weitergereicht.
     """
-    try:
-        request = service.files().get_media(fileId=file_id, supportsAllDrives=True)
-        buffer = io.BytesIO()
-        downloader = MediaIoBaseDownload(buffer, request)
+    request = service.files().get_media(fileId=file_id, supportsAllDrives=True)
+    downloader = gapi_http.MediaIoBaseDownload(target, request, chunksize=chunk_size)
+
+    done = False
+    while not done:
+        _, done = downloader.next_chunk()
 
-        done = False
-        while not done:
-            _, done = downloader.next_chunk()
 
-        return buffer.getvalue()
+def open_download(
+    service: Resource,
+    file_id: str,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+) -> Optional[IO[bytes]]:
+    """
+    Lädt eine Datei in eine temporäre Datei, die ab SPOOL_MAX_SIZE auf die
+    Festplatte ausgelagert wird. Der Aufrufer muss das Objekt schliessen.
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        stream_download(service, file_id, buffer, chunk_size)
+        buffer.seek(0)
+        return buffer
 
     except HttpError as e:
+        buffer.close()
         st.error(f"Fehler beim Download der Datei: {e}")
         return None
     except Exception as e:
+        buffer.close()
         st.error(f"Unerwarteter Fehler beim Download der Datei: {e}")
         return None
 
 
+def download_file_bytes(
+    service: Resource,
+    file_id: str,
+) -> Optional[bytes]:
+    """
+    Lädt eine Datei aus Google Drive als Bytes.
+    Der Download läuft über open_download; im Speicher liegt am Ende nur
+    das Ergebnis, keine zweite Kopie des Puffers.
+    """
+    buffer = open_download(service, file_id)
+    if buffer is None:
+        return None
+    with buffer:
+        return buffer.read()
+
+
 def copy_file(
     service: Resource,
     source_file_id: str,
     new_name: str,
     target_folder_id: str,
+    num_retries: int = 0,
 ) -> Optional[str]:
     """
     Kopiert eine bestehende Datei in einen Zielordner.
@@ -353,6 +719,7 @@ def copy_file(
     - Monatsvorlagen
     - AZK-Vorlagen
     - SPV-Dateien pro Mitarbeiter
+    num_retries > 0 wiederholt Quota-Fehler (429) mit Backoff.
     """
     try:
         copied = service.files().copy(
@@ -363,7 +730,7 @@ def copy_file(
             },
             supportsAllDrives=True,
             fields="id",
-        ).execute()
+        ).execute(num_retries=num_retries)
 
         return copied.get("id")
 
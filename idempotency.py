@@ -0,0 +1,201 @@
+"""
+Prozessübergreifender Idempotenz-Index für Buchungen.
+
+Jede Buchung (Rapport, Absenz-Block) hat einen Transaktions-Hash aus ihren
+fachlichen Werten. Der Hash wird vor dem Speichern in einer SQLite-Datei
+reserviert; ein zweiter Versuch mit demselben Hash - aus einem anderen Tab,
+von einem anderen Gerät oder nach einem Reconnect - wird abgewiesen, bis
+der Eintrag abläuft. Lookups laufen über den Primärschlüssel, ohne die
+Tabellen aus Drive zu lesen.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Iterable, List, Optional, TYPE_CHECKING
+
+from lazy_imports import lazy_import
+from state import STATE_DIR
+
+pd = lazy_import("pandas")
+
+if TYPE_CHECKING:
+    import pandas
+
+
+DEFAULT_DB_PATH = os.path.join(STATE_DIR, "idempotency.sqlite3")
+DEFAULT_TTL_SEC = 24 * 3600
+
+# Spalten, deren Kombination eine Buchung eindeutig macht.
+DUPLICATE_SUBSET = ["Erfasst", "Mitarbeiter", "Datum"]
+# Verknüpfung Rapport <-> Arbeitszeit beim Rekonstruieren der Hashes.
+RAPPORT_JOIN_KEYS = ["Erfasst", "Mitarbeiter", "Datum", "Projekt"]
+
+
+def tx_hash(data_string: str) -> str:
+    return hashlib.md5(data_string.encode("utf-8")).hexdigest()
+
+
+def rapport_tx_string(f_date, f_start, f_end, f_arbeit: str, project: str, user_name: str) -> str:
+    return f"RAPP_{f_date}_{f_start}_{f_end}_{f_arbeit[:10]}_{project}_{user_name}"
+
+
+def rapport_tx_strings(df: pandas.DataFrame) -> pandas.Series:
+    """
+    Vektorisierte Variante von rapport_tx_string für eine ganze Tabelle
+    (Start/Ende als HH:MM, Arbeit als Text).
+    """
+    return (
+        "RAPP_" + df["Datum"] + "_" + df["Start"] + ":00_" + df["Ende"] + ":00_"
+        + df["Arbeit"].str[:10] + "_" + df["Projekt"] + "_" + df["Mitarbeiter"]
+    )
+
+
+def absence_tx_string(start_date, end_date, a_typ: str, user_name: str) -> str:
+    return f"ABS_{start_date}_{end_date}_{a_typ}_{user_name}"
+
+
+class IdempotencyStore:
+    """
+    SQLite-basierter Index: tx_hash -> Ablaufzeit.
+    Eine Verbindung pro Aufruf, damit Threads und Prozesse sich nicht
+    gegenseitig blockieren; SQLite serialisiert die Schreibzugriffe.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, ttl_sec: float = DEFAULT_TTL_SEC):
+        self.path = path
+        self.ttl_sec = ttl_sec
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tx ("
+                " tx_hash TEXT PRIMARY KEY,"
+                " expires REAL NOT NULL,"
+                " label TEXT)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def claim(self, key: str, label: str = "", ttl_sec: Optional[float] = None) -> bool:
+        """
+        Reserviert einen Hash atomar. False, wenn er bereits (und noch
+        nicht abgelaufen) vergeben ist.
+        """
+        now = time.time()
+        expires = now + (self.ttl_sec if ttl_sec is None else ttl_sec)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM tx WHERE tx_hash = ? AND expires <= ?", (key, now))
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO tx (tx_hash, expires, label) VALUES (?, ?, ?)",
+                (key, expires, label),
+            )
+            conn.execute("COMMIT")
+            return cur.rowcount == 1
+
+    def claim_many(self, keys: Iterable[str], label: str = "", ttl_sec: Optional[float] = None) -> List[bool]:
+        """
+        Reserviert viele Hashes in einer Transaktion. Liefert pro Hash, ob
+        er neu reserviert wurde (auch Duplikate innerhalb von keys zählen
+        nur einmal).
+        """
+        now = time.time()
+        expires = now + (self.ttl_sec if ttl_sec is None else ttl_sec)
+        result = []
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM tx WHERE expires <= ?", (now,))
+            for key in keys:
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO tx (tx_hash, expires, label) VALUES (?, ?, ?)",
+                    (key, expires, label),
+                )
+                result.append(cur.rowcount == 1)
+            conn.execute("COMMIT")
+        return result
+
+    def release_many(self, keys: Iterable[str]) -> None:
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM tx WHERE tx_hash = ?", ((key,) for key in keys))
+
+    def release(self, key: str) -> None:
+        """
+        Gibt einen Hash wieder frei, z.B. wenn das Speichern fehlschlug.
+        """
+        with self._connect() as conn:
+            conn.execute("DELETE FROM tx WHERE tx_hash = ?", (key,))
+
+    def seen(self, key: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT expires FROM tx WHERE tx_hash = ?", (key,)).fetchone()
+        return bool(row) and row[0] > time.time()
+
+    def seed(self, keys: Iterable[str], label: str = "bestand", ttl_sec: Optional[float] = None) -> int:
+        """
+        Trägt viele Hashes auf einmal ein (z.B. aus scan_existing).
+        Gibt die Anzahl eingetragener bzw. verlängerter Hashes zurück.
+        """
+        expires = time.time() + (self.ttl_sec if ttl_sec is None else ttl_sec)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT INTO tx (tx_hash, expires, label) VALUES (?, ?, ?)"
+                " ON CONFLICT(tx_hash) DO UPDATE SET expires = MAX(expires, excluded.expires)",
+                ((key, expires, label) for key in set(keys)),
+            )
+            conn.execute("COMMIT")
+            return conn.total_changes - before
+
+    def purge_expired(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM tx WHERE expires <= ?", (time.time(),)).rowcount
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM tx WHERE expires > ?", (time.time(),)).fetchone()[0]
+
+
+def scan_existing(df_p: pandas.DataFrame, df_z: pandas.DataFrame) -> pandas.Series:
+    """
+    Rekonstruiert die Transaktions-Hashes aller bestehenden Buchungen
+    (vektorisiert, ein Durchlauf über beide Tabellen).
+    """
+    if df_z.empty or "Erfasst" not in df_z.columns:
+        return pd.Series([], dtype=object)
+
+    z = df_z.fillna("").astype(str).replace({"nan": ""})
+    absenz = z.get("Absenz_Typ", pd.Series("", index=z.index)).str.strip() != ""
+
+    # Arbeit über die ganze Buchung zuordnen: Erfasst allein ist nicht
+    # eindeutig, wenn zwei Mitarbeiter in derselben Sekunde speichern.
+    rapp = z[~absenz].drop(columns="Arbeit", errors="ignore")
+    if set(RAPPORT_JOIN_KEYS + ["Arbeit"]) <= set(df_p.columns):
+        p = df_p[RAPPORT_JOIN_KEYS + ["Arbeit"]].fillna("").astype(str).replace({"nan": ""})
+        rapp = rapp.merge(p.drop_duplicates(RAPPORT_JOIN_KEYS), on=RAPPORT_JOIN_KEYS, how="left")
+    rapp_strings = rapport_tx_strings(rapp.assign(Arbeit=rapp.get("Arbeit", pd.Series("", index=rapp.index)).fillna("")))
+
+    # Absenz-Blöcke: ein Hash pro Erfassung über den eingegebenen Zeitraum
+    # (Absenz_Von/Bis); ältere Zeilen ohne diese Spalten über erster/letzter Tag.
+    a = z[absenz]
+    von = a.get("Absenz_Von", pd.Series("", index=a.index)).where(lambda s: s != "", a["Datum"])
+    bis = a.get("Absenz_Bis", pd.Series("", index=a.index)).where(lambda s: s != "", a["Datum"])
+    blocks = a.assign(Von=von, Bis=bis).groupby(["Erfasst", "Mitarbeiter", "Absenz_Typ"]).agg(Von=("Von", "min"), Bis=("Bis", "max")).reset_index()
+    abs_strings = "ABS_" + blocks["Von"] + "_" + blocks["Bis"] + "_" + blocks["Absenz_Typ"] + "_" + blocks["Mitarbeiter"]
+
+    return pd.concat([rapp_strings, abs_strings], ignore_index=True).map(tx_hash)
+
+
+def find_duplicates(df: pandas.DataFrame, subset: Iterable[str] = DUPLICATE_SUBSET) -> pandas.DataFrame:
+    """
+    Alle Zeilen, deren Kombination aus subset mehrfach vorkommt.
+    """
+    subset = [c for c in subset if c in df.columns]
+    if df.empty or not subset:
+        return df.iloc[0:0]
+    mask = df.duplicated(subset=subset, keep=False)
+    return df[mask].sort_values(subset)
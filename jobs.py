@@ -0,0 +1,353 @@
+"""
+Wiederaufnehmbare Hintergrund-Jobs für lange Admin-Vorgänge.
+
+Ein Job ist eine Folge benannter Schritte (z.B. kaskadierendes Löschen:
+Stammdaten, Rapporte, Zeiten, Fotos, Pläne). Das Job-Protokoll liegt als
+SQLite-Datei im STATE_DIR; nach jedem Schritt wird ein Checkpoint
+geschrieben. Bricht der Prozess ab, übernimmt der nächste Runner - in
+diesem oder einem anderen Prozess - den Job ab dem unterbrochenen Schritt.
+
+- Schritte müssen wiederholbar sein: der unterbrochene Schritt läuft nach
+  einem Absturz erneut.
+- Ein laufender Job hält eine Lease, die per Heartbeat verlängert wird;
+  läuft sie ab, gilt der Job als verwaist und wird wieder aufgenommen.
+- Parallelität ist doppelt begrenzt: Worker-Pool pro Prozess und ein
+  Limit pro Job-Art (z.B. nur ein Löschjob gleichzeitig, weil alle
+  dieselben CSVs umschreiben).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from state import STATE_DIR
+
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join(STATE_DIR, "jobs.sqlite3")
+JOB_WORKERS = 2
+# Ein Job ohne Heartbeat seit LEASE_SEC gilt als verwaist.
+LEASE_SEC = 60.0
+HEARTBEAT_SEC = 15.0
+# Abbruch nach so vielen Übernahmen, damit ein Job, der den Prozess
+# selbst abstürzen lässt, nicht endlos neu startet.
+MAX_ATTEMPTS = 3
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# Ein Schritt bekommt den Drive-Service des Worker-Threads und die Parameter.
+Step = Tuple[str, Callable[[Any, Dict[str, Any]], None]]
+# Ein Plan erzeugt aus den Parametern die Schrittliste; er muss bei jedem
+# Aufruf dieselbe Liste liefern, sonst passen die Checkpoints nicht mehr.
+Plan = Callable[[Dict[str, Any]], List[Step]]
+
+
+class JobLog:
+    """
+    Persistentes Job-Protokoll.
+    Eine Verbindung pro Aufruf, wie beim IdempotencyStore.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " label TEXT,"
+                " params TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " step INTEGER NOT NULL DEFAULT 0,"
+                " total INTEGER NOT NULL DEFAULT 0,"
+                " current TEXT,"
+                " error TEXT,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " owner TEXT,"
+                " heartbeat REAL,"
+                " created REAL NOT NULL,"
+                " updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, heartbeat)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, kind: str, params: Dict[str, Any], label: str = "") -> Tuple[str, bool]:
+        """
+        Legt einen Job an. Läuft bereits ein gleicher Job (Art und
+        Parameter), wird dessen ID zurückgegeben: (job_id, neu_angelegt).
+        """
+        payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE kind = ? AND params = ? AND status IN (?, ?)",
+                (kind, payload, QUEUED, RUNNING),
+            ).fetchone()
+            if row:
+                conn.execute("COMMIT")
+                return row["id"], False
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, kind, label, params, status, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, label, payload, QUEUED, now, now),
+            )
+            conn.execute("COMMIT")
+        return job_id, True
+
+    def claim(self, job_id: str, owner: str, lease_sec: float = LEASE_SEC) -> Optional[Dict[str, Any]]:
+        """
+        Übernimmt einen wartenden oder verwaisten Job. Atomar, damit ihn
+        nur ein Runner bekommt; gibt den Job oder None zurück.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, heartbeat = ?, updated = ?, attempts = attempts + 1, error = NULL"
+                " WHERE id = ? AND (status = ? OR (status = ? AND heartbeat < ?))",
+                (RUNNING, owner, now, now, job_id, QUEUED, RUNNING, now - lease_sec),
+            )
+            if cursor.rowcount != 1:
+                return None
+        return self.get(job_id)
+
+    def checkpoint(self, job_id: str, owner: str, step: int, total: int, current: str = "") -> bool:
+        """
+        Hält den Fortschritt fest. False, wenn der Job inzwischen einem
+        anderen Runner gehört (Lease abgelaufen) - dann sofort aufhören.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET step = ?, total = ?, current = ?, heartbeat = ?, updated = ?"
+                " WHERE id = ? AND owner = ? AND status = ?",
+                (step, total, current, now, now, job_id, owner, RUNNING),
+            )
+            return cursor.rowcount == 1
+
+    def heartbeat(self, owner: str) -> None:
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status = ?", (time.time(), owner, RUNNING))
+
+    def finish(self, job_id: str, owner: str, status: str, error: Optional[str] = None) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated = ? WHERE id = ? AND owner = ?",
+                (status, error, now, job_id, owner),
+            )
+
+    def requeue(self, job_id: str) -> bool:
+        """
+        Setzt einen fehlgeschlagenen Job zurück; er läuft ab dem letzten
+        Checkpoint weiter.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, attempts = 0, owner = NULL, updated = ? WHERE id = ? AND status = ?",
+                (QUEUED, time.time(), job_id, FAILED),
+            )
+            return cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _as_dict(row) if row else None
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+        return [_as_dict(row) for row in rows]
+
+    def pending(self, lease_sec: float = LEASE_SEC) -> List[Dict[str, Any]]:
+        """
+        Wartende und verwaiste Jobs, älteste zuerst.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? OR (status = ? AND heartbeat < ?) ORDER BY created",
+                (QUEUED, RUNNING, time.time() - lease_sec),
+            ).fetchall()
+        return [_as_dict(row) for row in rows]
+
+    def purge(self, older_than_sec: float) -> int:
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status = ? AND updated < ?",
+                (DONE, time.time() - older_than_sec),
+            )
+            return cursor.rowcount
+
+
+def _as_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    job["fraction"] = min(1.0, job["step"] / job["total"]) if job["total"] else (1.0 if job["status"] == DONE else 0.0)
+    return job
+
+
+class JobRunner:
+    """
+    Prozessweiter Runner: führt Jobs aus dem Protokoll auf einem kleinen
+    Thread-Pool aus, hält ihre Leases am Leben und übernimmt verwaiste
+    Jobs, auch solche abgestürzter Prozesse.
+    """
+
+    def __init__(
+        self,
+        service_factory: Callable[[], Any],
+        log: Optional[JobLog] = None,
+        workers: int = JOB_WORKERS,
+        lease_sec: float = LEASE_SEC,
+        heartbeat_sec: float = HEARTBEAT_SEC,
+    ):
+        self._service_factory = service_factory
+        self.log = log or JobLog()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lease_sec = lease_sec
+        self._heartbeat_sec = heartbeat_sec
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._local = threading.local()
+        self._plans: Dict[str, Plan] = {}
+        self._limits: Dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+        self._active: set = set()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, kind: str, plan: Plan, limit: int = 1) -> None:
+        """
+        Meldet eine Job-Art an; limit = gleichzeitig laufende Jobs dieser Art.
+        """
+        with self._lock:
+            self._plans[kind] = plan
+            self._limits.setdefault(kind, threading.Semaphore(limit))
+
+    def submit(self, kind: str, params: Dict[str, Any], label: str = "") -> str:
+        if kind not in self._plans:
+            raise KeyError(f"Unbekannte Job-Art: {kind}")
+        job_id, created = self.log.create(kind, params, label)
+        if created:
+            self._dispatch(job_id, kind)
+        return job_id
+
+    def retry(self, job_id: str) -> bool:
+        if not self.log.requeue(job_id):
+            return False
+        job = self.log.get(job_id)
+        if job:
+            self._dispatch(job_id, job["kind"])
+        return True
+
+    def resume(self) -> int:
+        """
+        Übernimmt wartende und verwaiste Jobs. Gibt die Anzahl zurück.
+        """
+        count = 0
+        for job in self.log.pending(self._lease_sec):
+            if self._dispatch(job["id"], job["kind"]):
+                count += 1
+        return count
+
+    def _dispatch(self, job_id: str, kind: str) -> bool:
+        # Einen Pool-Thread erst belegen, wenn die Job-Art noch frei ist;
+        # sonst bleibt der Job wartend und resume() holt ihn später ab.
+        limit = self._limits.get(kind)
+        if limit is None:
+            return False
+        with self._lock:
+            if job_id in self._active or not limit.acquire(blocking=False):
+                return False
+            self._active.add(job_id)
+        try:
+            self._pool.submit(self._execute, job_id, limit)
+        except Exception:
+            self._done(job_id, limit)
+            raise
+        return True
+
+    def _done(self, job_id: str, limit: threading.Semaphore) -> None:
+        with self._lock:
+            self._active.discard(job_id)
+        limit.release()
+        # Wartende Jobs dieser Art nicht erst beim nächsten Heartbeat starten.
+        self._wake.set()
+
+    def _service(self) -> Any:
+        # Drive-Clients sind nicht thread-sicher: ein Client pro Worker.
+        if getattr(self._local, "service", None) is None:
+            self._local.service = self._service_factory()
+        return self._local.service
+
+    def _execute(self, job_id: str, limit: threading.Semaphore) -> None:
+        try:
+            self._run(job_id)
+        except Exception as e:
+            LOGGER.warning("Job %s konnte nicht ausgeführt werden: %s", job_id, e)
+        finally:
+            self._done(job_id, limit)
+
+    def _run(self, job_id: str) -> None:
+        job = self.log.claim(job_id, self.owner, self._lease_sec)
+        if not job:
+            return
+        if job["attempts"] > MAX_ATTEMPTS:
+            self.log.finish(job_id, self.owner, FAILED, f"Abgebrochen nach {MAX_ATTEMPTS} Versuchen")
+            return
+
+        steps = self._plans[job["kind"]](job["params"])
+        total = len(steps)
+        for index in range(job["step"], total):
+            name, fn = steps[index]
+            if not self.log.checkpoint(job_id, self.owner, index, total, name):
+                LOGGER.warning("Job %s wurde von einem anderen Runner übernommen.", job_id)
+                return
+            try:
+                fn(self._service(), job["params"])
+            except Exception as e:
+                LOGGER.warning("Job %s, Schritt '%s' fehlgeschlagen: %s", job_id, name, e)
+                self.log.finish(job_id, self.owner, FAILED, f"{name}: {e}")
+                return
+        if self.log.checkpoint(job_id, self.owner, total, total, ""):
+            self.log.finish(job_id, self.owner, DONE)
+
+    # --- Hintergrund-Thread ---------------------------------------------
+    def start(self) -> "JobRunner":
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="job-runner", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=self._heartbeat_sec + 1)
+
+    def _watch(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.log.heartbeat(self.owner)
+                self.resume()
+            except Exception as e:
+                LOGGER.warning("Job-Protokoll nicht erreichbar: %s", e)
+            self._wake.wait(self._heartbeat_sec)
+            self._wake.clear()
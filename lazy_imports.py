@@ -0,0 +1,80 @@
+"""
+Verzögertes Laden schwerer Module (pandas, googleapiclient, ...).
+
+lazy_import("pandas") liefert sofort einen Platzhalter; das echte Modul
+wird erst beim ersten Attributzugriff importiert. So kann die Start-Ansicht
+gerendert werden, bevor der Daten-Stack geladen ist.
+"""
+import importlib
+import threading
+from types import ModuleType
+from typing import Dict
+
+
+class LazyModule:
+    """
+    Platzhalter für ein Modul, das beim ersten Zugriff importiert wird.
+    Thread-sicher, da Prefetch- und Watcher-Threads gleichzeitig zugreifen.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self) -> ModuleType:
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+                module = self._module
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "geladen" if self.loaded else "nicht geladen"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+_registry: Dict[str, LazyModule] = {}
+_registry_lock = threading.Lock()
+_preload_started = False
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Gibt den (prozessweit geteilten) Platzhalter für ein Modul zurück.
+    """
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = LazyModule(name)
+        return _registry[name]
+
+
+def preload() -> None:
+    """
+    Importiert alle registrierten Module einmal pro Prozess im Hintergrund,
+    z.B. während der Benutzer die Start-Ansicht sieht.
+    """
+    global _preload_started
+    with _registry_lock:
+        if _preload_started:
+            return
+        _preload_started = True
+        modules = list(_registry.values())
+
+    def run():
+        for module in modules:
+            try:
+                module.load()
+            except Exception:
+                pass
+
+    threading.Thread(target=run, name="lazy-preload", daemon=True).start()
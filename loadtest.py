@@ -0,0 +1,288 @@
+"""
+Lasttest: N gleichzeitige Mitarbeiter-Sessions gegen ein lokales Fake-Drive.
+
+Jede Session läuft als AppTest in einem eigenen Prozess (AppTest ist nicht
+für parallele Läufe in einem Prozess gebaut); alle Prozesse teilen sich
+über einen multiprocessing-Manager ein FakeDriveService sowie Sperren und
+gemeinsamen Cache im Zustandsverzeichnis - wie Repliken hinter einem
+Load-Balancer. Ablauf pro Session: Login, Dashboard mit Historie und
+Galerie, mehrere Rapporte absenden, Galerie neu laden.
+
+Gemessen werden Durchsatz (Skriptläufe und Rapporte pro Sekunde), Latenz
+je Schritt (p50/p95/p99/max), verlorene Schreibvorgänge (als gespeichert
+gemeldet, aber nicht in der CSV) und Speicher pro Session.
+
+    python loadtest.py [--sessions 10] [--rapports 3] [--latency 0.05]
+                       [--jitter 0.05] [--error-rate 0.01] [--json]
+"""
+import argparse
+import io
+import json
+import multiprocessing as mp
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from multiprocessing.managers import BaseManager
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, APP_DIR)
+
+from drive_fake import FakeDriveService, RemoteDrive, REMOTE_METHODS  # noqa: E402
+
+EMPLOYEE_PIN = "1234"
+PROJECT = "LOADTEST"
+SUBMIT_LABEL = "💾 Speichern & Synchronisieren"
+SUCCESS_PREFIX = "Rapport erfolgreich"
+STEPS = ["start", "login_view", "dashboard", "submit_rapport", "gallery_reload"]
+
+
+class DriveManager(BaseManager):
+    pass
+
+
+DriveManager.register("FakeDrive", FakeDriveService, exposed=REMOTE_METHODS)
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100.0 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def _photo(seed: int) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), (seed * 40 % 256, 120, 60)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def setup_drive(drive, sessions: int) -> dict:
+    folders = {key: drive.add_folder(key) for key in ("P", "Z", "F", "PL")}
+    employees = "Mitarbeiter_ID,Name,PIN,Status\n" + "".join(
+        f"{i},LT{i:03d},{EMPLOYEE_PIN},Aktiv\n" for i in range(sessions)
+    )
+    drive.add_file("Employees.csv", [folders["P"]], employees.encode("utf-8"), "text/csv")
+    drive.add_file("Projects.csv", [folders["P"]], f"Projekt_ID,Projekt_Name,Status\n1,{PROJECT},Aktiv\n".encode("utf-8"), "text/csv")
+    drive.add_file("Baustellen_Rapport.csv", [folders["P"]], b"Erfasst,Datum,Projekt,Mitarbeiter,Arbeit,Material,Bemerkung,Status\n", "text/csv")
+    drive.add_file("Arbeitszeit_AKZ.csv", [folders["Z"]], b"Erfasst,Datum,Projekt,Mitarbeiter,Start,Ende\n", "text/csv")
+    for i in range(6):
+        drive.add_file(f"{PROJECT}_foto_{i}.jpg", [folders["F"]], _photo(i), "image/jpeg")
+    return folders
+
+
+class Session:
+    """
+    Ein simulierter Mitarbeiter; jeder Schritt ist ein Skriptlauf.
+    """
+
+    def __init__(self, index: int, folders: dict, rapports: int):
+        from streamlit.testing.v1 import AppTest
+
+        self.name = f"LT{index:03d}"
+        self.rapports = rapports
+        self.timings = defaultdict(list)
+        self.submitted, self.acknowledged, self.failed = [], [], []
+        self.errors = []
+        self.app = AppTest.from_file(os.path.join(APP_DIR, "app.py"), default_timeout=300)
+        self.app.secrets["general"] = {
+            "PROJECT_REPORTS_FOLDER_ID": folders["P"],
+            "TIME_REPORTS_FOLDER_ID": folders["Z"],
+            "PHOTOS_FOLDER_ID": folders["F"],
+            "PLANS_FOLDER_ID": folders["PL"],
+        }
+
+    def _step(self, name: str, action) -> None:
+        started = time.perf_counter()
+        action()
+        self.timings[name].append(time.perf_counter() - started)
+        self.errors += [str(e.value) for e in self.app.exception]
+
+    def _button(self, label: str):
+        return next(b for b in self.app.button if b.label == label)
+
+    def run(self) -> None:
+        app = self.app
+        self._step("start", app.run)
+        self._step("login_view", lambda: self._button("👷‍♂️ Personal-Zugang").click().run())
+        app.selectbox[0].select(self.name)
+        app.text_input[0].input(EMPLOYEE_PIN)
+        # Dashboard inkl. Historie und Galerie (alle Tabs werden gerendert).
+        self._step("dashboard", lambda: self._button("Anmelden").click().run())
+
+        for i in range(self.rapports):
+            # Der Idempotenz-Hash nutzt die ersten 10 Zeichen der Arbeit.
+            marker = f"{self.name}-{i:03d} LOADTEST"
+            next(t for t in app.text_area if t.label == "Ausgeführte Arbeiten").input(marker)
+            self.submitted.append(marker)
+            self._step("submit_rapport", lambda: self._button(SUBMIT_LABEL).click().run())
+            if any(s.value.startswith(SUCCESS_PREFIX) for s in app.success):
+                self.acknowledged.append(marker)
+            else:
+                self.failed.append(marker)
+
+        self._step("gallery_reload", lambda: self._button("🔄 Galerie laden").click().run())
+
+
+def _session_process(index, drive, folders, rapports, ready, go, results) -> None:
+    import drive_store as ds
+
+    service = RemoteDrive(drive)
+    ds.get_drive_service = lambda: service
+    result = {"name": f"LT{index:03d}", "errors": []}
+    try:
+        # Aufwärmen (Imports, Kompilieren), damit nur die Session gemessen wird.
+        Session(index, folders, 0).app.run()
+        import pandas, PIL.Image, googleapiclient.http, googleapiclient.discovery  # noqa: F401
+        result["rss_base"] = _rss_bytes()
+        session = Session(index, folders, rapports)
+    except Exception as e:
+        result["errors"].append(f"Setup: {e!r}")
+        ready.release()
+        results.put(result)
+        return
+
+    ready.release()
+    go.wait()
+    try:
+        session.run()
+    except Exception as e:
+        session.errors.append(f"Abbruch: {e!r}")
+    result.update({
+        "timings": dict(session.timings),
+        "submitted": session.submitted,
+        "acknowledged": session.acknowledged,
+        "failed": session.failed,
+        "errors": session.errors,
+        "rss_end": _rss_bytes(),
+    })
+    results.put(result)
+
+
+def run(args) -> dict:
+    # Sperren und gemeinsamer Cache eines Laufs liegen in einem eigenen Verzeichnis;
+    # die Session-Prozesse erben die Umgebung.
+    state_dir = None
+    if "BAUAPP_STATE_DIR" not in os.environ:
+        state_dir = os.environ["BAUAPP_STATE_DIR"] = tempfile.mkdtemp(prefix="bauapp_loadtest_")
+    ctx = mp.get_context("spawn")
+
+    manager = DriveManager(ctx=ctx)
+    manager.start()
+    try:
+        drive = manager.FakeDrive(seed=args.seed)
+        folders = setup_drive(drive, args.sessions)
+        # Fehler und Latenz erst nach dem Aufsetzen einschalten.
+        drive.configure(args.latency, args.jitter, args.error_rate)
+
+        ready, go, results = ctx.Semaphore(0), ctx.Event(), ctx.Queue()
+        procs = [
+            ctx.Process(target=_session_process, args=(i, drive, folders, args.rapports, ready, go, results), daemon=True)
+            for i in range(args.sessions)
+        ]
+        for proc in procs:
+            proc.start()
+        for _ in procs:
+            ready.acquire()
+
+        started = time.perf_counter()
+        go.set()
+        sessions = [results.get() for _ in procs]
+        elapsed = time.perf_counter() - started
+        for proc in procs:
+            proc.join()
+
+        drive.configure()
+        import drive_store as ds
+        df_p, _ = ds.read_csv(RemoteDrive(drive), folders["P"], "Baustellen_Rapport.csv")
+        stored = set(df_p["Arbeit"].astype(str)) if "Arbeit" in df_p.columns else set()
+        drive_stats = drive.get_stats()
+    finally:
+        manager.shutdown()
+        if state_dir:
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+    return summarize(args, sessions, elapsed, stored, drive_stats)
+
+
+def summarize(args, sessions, elapsed, stored, drive_stats) -> dict:
+    steps = defaultdict(list)
+    for s in sessions:
+        for name, values in s.get("timings", {}).items():
+            steps[name] += values
+    runs = sum(len(v) for v in steps.values())
+    acknowledged = [m for s in sessions for m in s.get("acknowledged", [])]
+    memory = [s["rss_end"] - s["rss_base"] for s in sessions if "rss_end" in s]
+
+    return {
+        "sessions": args.sessions,
+        "rapports_per_session": args.rapports,
+        "elapsed_s": elapsed,
+        "throughput_runs_per_s": runs / elapsed if elapsed else 0.0,
+        "throughput_rapports_per_s": len(acknowledged) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            name: {
+                "p50": statistics.median(steps[name]) * 1000,
+                "p95": _percentile(steps[name], 95) * 1000,
+                "p99": _percentile(steps[name], 99) * 1000,
+                "max": max(steps[name]) * 1000,
+                "n": len(steps[name]),
+            }
+            for name in STEPS if steps.get(name)
+        },
+        "writes": {
+            "submitted": sum(len(s.get("submitted", [])) for s in sessions),
+            "acknowledged": len(acknowledged),
+            "failed_reported": sum(len(s.get("failed", [])) for s in sessions),
+            "lost": len([m for m in acknowledged if m not in stored]),
+        },
+        "memory_per_session_kb": statistics.mean(memory) / 1024 if memory else 0.0,
+        "drive": drive_stats,
+        "errors": sorted({f"{s['name']}: {e}" for s in sessions for e in s["errors"]}),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--rapports", type=int, default=3, help="Rapporte pro Session")
+    parser.add_argument("--latency", type=float, default=0.05, help="Sekunden pro Drive-Aufruf")
+    parser.add_argument("--jitter", type=float, default=0.05, help="zusätzliche zufällige Latenz (max., Sekunden)")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="Anteil Quota-Fehler (429) pro Aufruf")
+    parser.add_argument("--seed", type=int, default=27)
+    parser.add_argument("--json", action="store_true", help="Ergebnis als JSON ausgeben")
+    args = parser.parse_args()
+
+    result = run(args)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"load.sessions: {result['sessions']} x {result['rapports_per_session']} Rapporte in {result['elapsed_s']:.1f}s")
+    print(f"load.throughput: {result['throughput_runs_per_s']:.2f} Skriptläufe/s | {result['throughput_rapports_per_s']:.2f} Rapporte/s")
+    for name, lat in result["latency_ms"].items():
+        print(f"load.latency.{name}: p50={lat['p50']:.0f} p95={lat['p95']:.0f} p99={lat['p99']:.0f} max={lat['max']:.0f} ms (n={lat['n']})")
+    w = result["writes"]
+    print(f"load.writes: gesendet={w['submitted']} bestätigt={w['acknowledged']} Fehler gemeldet={w['failed_reported']} verloren={w['lost']}")
+    print(f"load.memory: {result['memory_per_session_kb']:.0f} KB/Session")
+    d = result["drive"]
+    print(f"load.drive: Aufrufe={d['calls']} Quota-Fehler={d['quota_errors']} Wiederholungen={d['retries']}")
+    if result["errors"]:
+        print(f"load.errors: {result['errors']}")
+
+
+if __name__ == "__main__":
+    main()
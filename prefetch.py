@@ -0,0 +1,126 @@
+"""
+Hintergrund-Prefetch für das Mitarbeiter-Portal.
+
+Nach dem Login bzw. nach einer Projektauswahl werden Stammdaten, die
+Projekt-Historie und Galerie-Dateien auf einem kleinen Thread-Pool
+vorgeladen, damit die Caches warm sind, bevor der Tab geöffnet wird.
+Jede Session hat höchstens einen aktiven Auftrag; ein neuer Auftrag
+bricht den alten ab. Aufträge haben ein Aufgaben- und ein Zeitbudget.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Dict, List, Any, Iterable
+
+
+LOGGER = logging.getLogger(__name__)
+
+PREFETCH_WORKERS = 2
+PREFETCH_MAX_TASKS = 27
+PREFETCH_BUDGET_SEC = 27.0
+
+# Eine Aufgabe bekommt den Drive-Service des Worker-Threads und darf
+# Folgeaufgaben zurückgeben (z.B. Downloads nach einem Listing).
+PrefetchTask = Callable[[Any], Optional[Iterable["PrefetchTask"]]]
+
+
+class PrefetchBatch:
+    """
+    Ein Prefetch-Auftrag einer Session.
+    """
+
+    def __init__(self, max_tasks: int, budget_sec: float):
+        self.max_tasks = max_tasks
+        self.deadline = time.monotonic() + budget_sec
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {"scheduled": 0, "done": 0, "skipped": 0, "failed": 0}
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def active(self) -> bool:
+        return not self._cancelled.is_set() and time.monotonic() < self.deadline
+
+    def _take_slot(self) -> bool:
+        with self._lock:
+            if self.stats["scheduled"] >= self.max_tasks:
+                return False
+            self.stats["scheduled"] += 1
+            return True
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+
+class Prefetcher:
+    """
+    Prozessweiter Prefetch-Scheduler mit eigenem, kleinem Thread-Pool.
+    Der Pool ist bewusst klein, damit Vordergrund-Anfragen Vorrang haben.
+    """
+
+    def __init__(
+        self,
+        service_factory: Callable[[], Any],
+        workers: int = PREFETCH_WORKERS,
+    ):
+        self._service_factory = service_factory
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._batches: Dict[str, PrefetchBatch] = {}
+
+    def schedule(
+        self,
+        owner: str,
+        tasks: List[PrefetchTask],
+        max_tasks: int = PREFETCH_MAX_TASKS,
+        budget_sec: float = PREFETCH_BUDGET_SEC,
+    ) -> PrefetchBatch:
+        """
+        Startet einen neuen Auftrag für owner und bricht dessen alten ab.
+        """
+        batch = PrefetchBatch(max_tasks, budget_sec)
+        with self._lock:
+            previous = self._batches.get(owner)
+            self._batches[owner] = batch
+        if previous:
+            previous.cancel()
+
+        for task in tasks:
+            self._submit(batch, task)
+        return batch
+
+    def cancel(self, owner: str) -> None:
+        with self._lock:
+            batch = self._batches.pop(owner, None)
+        if batch:
+            batch.cancel()
+
+    def _submit(self, batch: PrefetchBatch, task: PrefetchTask) -> None:
+        if batch.active and batch._take_slot():
+            self._pool.submit(self._run, batch, task)
+
+    def _service(self) -> Any:
+        # Drive-Clients sind nicht thread-sicher: ein Client pro Worker.
+        if getattr(self._local, "service", None) is None:
+            self._local.service = self._service_factory()
+        return self._local.service
+
+    def _run(self, batch: PrefetchBatch, task: PrefetchTask) -> None:
+        if not batch.active:
+            batch._count("skipped")
+            return
+        try:
+            follow_ups = task(self._service())
+            batch._count("done")
+        except Exception as e:
+            LOGGER.warning("Prefetch fehlgeschlagen: %s", e)
+            batch._count("failed")
+            return
+
+        for follow_up in follow_ups or []:
+            self._submit(batch, follow_up)
@@ -0,0 +1,161 @@
+"""
+Sammel-Import ausgefüllter Papier-Rapporte (CSV/Excel).
+
+Alle Zeilen werden gemeinsam validiert und die Zeitberechnung
+(Arbeitszeit, Pause, SPV-Reiseabzug) läuft vektorisiert über den ganzen
+Stapel. Das Ergebnis sind zwei DataFrames (Projekt-Rapport und AZK), die in
+einem einzigen Schreibvorgang gespeichert werden.
+"""
+from __future__ import annotations
+
+from typing import Iterable, Tuple, TYPE_CHECKING
+
+from lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+
+if TYPE_CHECKING:
+    import pandas
+
+
+# SPV: bei Direktfahrt werden pro Weg 30 Minuten nicht vergütet.
+SPV_ABZUG_MIN = 30
+
+IMPORT_COLUMNS = [
+    "Datum", "Projekt", "Mitarbeiter", "Start", "Ende", "Pause_Min",
+    "R_Wohn_Bau_Min", "R_Bau_Wohn_Min", "Arbeit", "Material", "Bemerkung",
+]
+REQUIRED_COLUMNS = ["Datum", "Mitarbeiter", "Start", "Ende"]
+NUMERIC_DEFAULTS = {"Pause_Min": 0, "R_Wohn_Bau_Min": 0, "R_Bau_Wohn_Min": 0}
+
+
+def paid_travel_min(r_hin, r_rueck):
+    """
+    Bezahlte Reisezeit gemäss SPV. Funktioniert für Einzelwerte und Series.
+    """
+    return np.maximum(0, r_hin - SPV_ABZUG_MIN) + np.maximum(0, r_rueck - SPV_ABZUG_MIN)
+
+
+def template_csv() -> str:
+    return ",".join(IMPORT_COLUMNS) + "\n"
+
+
+def read_import_file(uploaded_file) -> pandas.DataFrame:
+    """
+    Liest eine CSV- oder Excel-Datei; alle Werte als Text.
+    Excel benötigt das optionale Paket openpyxl, das nur .xlsx/.xlsm liest.
+    """
+    name = uploaded_file.name.lower()
+    if name.endswith(".xls"):
+        raise ValueError("Das alte Excel-Format (.xls) wird nicht unterstützt. Bitte als .xlsx oder CSV speichern.")
+    if name.endswith((".xlsx", ".xlsm")):
+        return pd.read_excel(uploaded_file, dtype=str)
+    return pd.read_csv(uploaded_file, dtype=str, sep=None, engine="python")
+
+
+def prepare(
+    df: pandas.DataFrame,
+    default_project: str = "",
+    projects: Iterable[str] = (),
+    employees: Iterable[str] = (),
+) -> Tuple[pandas.DataFrame, pandas.DataFrame]:
+    """
+    Validiert und berechnet alle Zeilen in einem Durchgang.
+    Gibt (gültige Zeilen inkl. Zeiten, fehlerhafte Zeilen mit 'Fehler') zurück.
+    """
+    df = df.copy()
+    df.columns = [str(c).strip() for c in df.columns]
+    for col in IMPORT_COLUMNS:
+        if col not in df.columns:
+            df[col] = ""
+    df = df[IMPORT_COLUMNS].fillna("").astype(str).apply(lambda s: s.str.strip())
+    df = df[(df != "").any(axis=1)].reset_index(drop=True)
+    df.loc[df["Projekt"] == "", "Projekt"] = default_project
+
+    # ISO (2026-03-01) oder Schweizer Schreibweise (01.03.2026)
+    datum = pd.to_datetime(df["Datum"], errors="coerce", format="%Y-%m-%d").fillna(
+        pd.to_datetime(df["Datum"], errors="coerce", format="%d.%m.%Y")
+    ).fillna(pd.to_datetime(df["Datum"], errors="coerce", format="%d.%m.%y"))
+    start = pd.to_datetime(df["Start"], errors="coerce", format="%H:%M")
+    ende = pd.to_datetime(df["Ende"], errors="coerce", format="%H:%M")
+    numbers = {
+        col: pd.to_numeric(df[col].replace("", str(default)), errors="coerce")
+        for col, default in NUMERIC_DEFAULTS.items()
+    }
+
+    stunden = ((ende - start).dt.total_seconds() / 3600.0 - numbers["Pause_Min"] / 60.0).round(2)
+    reise = paid_travel_min(numbers["R_Wohn_Bau_Min"], numbers["R_Bau_Wohn_Min"])
+
+    checks = [
+        (df[REQUIRED_COLUMNS].eq("").any(axis=1), "Pflichtfeld leer (Datum/Mitarbeiter/Start/Ende)"),
+        (datum.isna(), "Datum ungültig"),
+        (start.isna() | ende.isna(), "Zeit ungültig (HH:MM)"),
+        (pd.concat(numbers, axis=1).isna().any(axis=1), "Minutenangabe ungültig"),
+        (pd.concat(numbers, axis=1).lt(0).any(axis=1), "Negative Minuten"),
+        ((pd.concat(numbers, axis=1) % 1).fillna(0).ne(0).any(axis=1), "Minuten nicht ganzzahlig"),
+        (stunden < 0, "Endzeit abzüglich Pause vor Startzeit"),
+        (df["Projekt"] == "", "Projekt fehlt"),
+    ]
+    projects, employees = set(projects), set(employees)
+    if projects:
+        checks.append((~df["Projekt"].isin(projects), "Unbekanntes Projekt"))
+    if employees:
+        checks.append((~df["Mitarbeiter"].isin(employees), "Unbekannter Mitarbeiter"))
+
+    errors = pd.Series("", index=df.index)
+    for mask, message in checks:
+        mask = mask.fillna(True)
+        errors[mask] = errors[mask] + message + "; "
+    invalid = errors != ""
+    rejected = df[invalid].assign(Fehler=errors[invalid].str.rstrip("; "))
+
+    df["Datum"] = datum.dt.strftime("%Y-%m-%d")
+    df["Start"] = start.dt.strftime("%H:%M")
+    df["Ende"] = ende.dt.strftime("%H:%M")
+    for col, values in numbers.items():
+        df[col] = values
+    df["Stunden_Total"] = stunden
+    df["Reisezeit_bezahlt_Min"] = reise
+    df["Arbeitszeit_inkl_Reisezeit"] = (stunden + reise / 60.0).round(2)
+
+    # Minuten als Ganzzahl wie bei der Einzel-Erfassung (gültige Zeilen haben keine Lücken).
+    valid = df[~invalid].reset_index(drop=True)
+    minutes = list(NUMERIC_DEFAULTS) + ["Reisezeit_bezahlt_Min"]
+    valid[minutes] = valid[minutes].astype(int)
+    return valid, rejected.reset_index(drop=True)
+
+
+def build_rows(
+    df: pandas.DataFrame,
+    ts_str: str,
+    status: str,
+) -> Tuple[pandas.DataFrame, pandas.DataFrame]:
+    """
+    Erzeugt die Zeilen für Baustellen_Rapport.csv und Arbeitszeit_AKZ.csv.
+    Jede Zeile bekommt einen eigenen Erfasst-Stempel, da Erfasst die beiden
+    Tabellen verbindet: ts_str plus eine Sekunde pro Zeile, im selben Format
+    wie bei der Einzel-Erfassung.
+    """
+    offsets = pd.to_timedelta(range(len(df)), unit="s")
+    erfasst = pd.Series((pd.Timestamp(ts_str) + offsets).strftime("%Y-%m-%d %H:%M:%S"), index=df.index)
+    base = pd.DataFrame({
+        "Erfasst": erfasst,
+        "Datum": df["Datum"],
+        "Projekt": df["Projekt"],
+        "Mitarbeiter": df["Mitarbeiter"],
+    })
+    rows_p = base.assign(Arbeit=df["Arbeit"], Material=df["Material"], Bemerkung=df["Bemerkung"], Status=status)
+    rows_z = base.assign(
+        Start=df["Start"],
+        Ende=df["Ende"],
+        Pause_Min=df["Pause_Min"],
+        Stunden_Total=df["Stunden_Total"],
+        R_Wohn_Bau_Min=df["R_Wohn_Bau_Min"],
+        R_Bau_Wohn_Min=df["R_Bau_Wohn_Min"],
+        Reisezeit_bezahlt_Min=df["Reisezeit_bezahlt_Min"],
+        Arbeitszeit_inkl_Reisezeit=df["Arbeitszeit_inkl_Reisezeit"],
+        Absenz_Typ="",
+        Status=status,
+    )
+    return rows_p, rows_z
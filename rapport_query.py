@@ -0,0 +1,151 @@
+"""
+Abfrage-Schicht für das Projekt-Controlling (Baustellen_Rapport.csv).
+
+Die Tabelle wird einmal pro Datenstand indexiert (Projekt, Mitarbeiter,
+Status, Datum). Filter werden über diese Indizes aufgelöst, an den Client
+geht nur die aktuelle Seite. Beim Speichern werden nur die im Editor
+geänderten, neuen oder gelöschten Zeilen dieser Seite in die Tabelle
+zurückgeschrieben.
+"""
+from __future__ import annotations
+
+from datetime import date
+from typing import Optional, List, Dict, Any, Iterable, Tuple, TYPE_CHECKING
+
+from lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+
+if TYPE_CHECKING:
+    import numpy
+    import pandas
+
+
+# Zeilen-Schlüssel: "Erfasst" allein ist bei Absenz-Blöcken nicht eindeutig.
+KEY_COLUMNS = ["Erfasst", "Datum", "Mitarbeiter", "Projekt"]
+PAGE_SIZES = [27, 54, 108]
+
+
+class RapportIndex:
+    """
+    Nur-lesender Index über eine Rapport-Tabelle.
+    Gehört einer Session und wird pro Datenstand neu aufgebaut.
+    """
+
+    def __init__(self, df: pandas.DataFrame):
+        df = df.reset_index(drop=True)
+        for col in KEY_COLUMNS + ["Status"]:
+            if col not in df.columns:
+                df[col] = ""
+        self.df = df
+        self._by = {
+            col: {str(k): v for k, v in df.groupby(df[col].astype(str).str.strip()).indices.items()}
+            for col in ("Projekt", "Mitarbeiter", "Status")
+        }
+        # Datum sortiert vorhalten, damit Zeiträume per Binärsuche gefunden werden.
+        dates = pd.to_datetime(df["Datum"], errors="coerce").to_numpy(dtype="datetime64[ns]")
+        self._date_order = np.argsort(dates, kind="stable")
+        self._dates_sorted = dates[self._date_order]
+        self._date_rank = np.empty(len(df), dtype=int)
+        self._date_rank[self._date_order] = np.arange(len(df))
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def values(self, col: str) -> List[str]:
+        return sorted(k for k in self._by.get(col, {}) if k)
+
+    def query(
+        self,
+        project: Optional[str] = None,
+        employee: Optional[str] = None,
+        statuses: Optional[Iterable[str]] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+    ) -> numpy.ndarray:
+        """
+        Gibt die Zeilenpositionen zurück, die allen Filtern entsprechen,
+        neueste Rapporte zuerst.
+        """
+        positions = np.arange(len(self.df))
+
+        for col, value in (("Projekt", project), ("Mitarbeiter", employee)):
+            if value:
+                positions = np.intersect1d(positions, self._by[col].get(value, []), assume_unique=True)
+
+        if statuses:
+            hits = [self._by["Status"].get(s, np.empty(0, dtype=int)) for s in statuses]
+            positions = np.intersect1d(positions, np.unique(np.concatenate(hits)), assume_unique=True)
+
+        if date_from or date_to:
+            lo = np.datetime64(date_from, "ns") if date_from else None
+            hi = np.datetime64(date_to, "ns") if date_to else None
+            start = np.searchsorted(self._dates_sorted, lo, side="left") if lo is not None else 0
+            stop = np.searchsorted(self._dates_sorted, hi, side="right") if hi is not None else len(self._dates_sorted)
+            positions = np.intersect1d(positions, self._date_order[start:stop])
+
+        order = np.argsort(self._date_rank[positions], kind="stable")[::-1]
+        return positions[order]
+
+    def page(
+        self,
+        positions: numpy.ndarray,
+        page: int,
+        page_size: int,
+    ) -> pandas.DataFrame:
+        """
+        Kopie der Zeilen einer Seite (page ab 1).
+        """
+        start = (page - 1) * page_size
+        return self.df.iloc[positions[start:start + page_size]].reset_index(drop=True)
+
+
+def page_count(total: int, page_size: int) -> int:
+    return max(1, -(-total // page_size))
+
+
+def _row_key(row: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(row.get(col, "")).strip() for col in KEY_COLUMNS)
+
+
+def apply_page_edits(
+    df: pandas.DataFrame,
+    page_df: pandas.DataFrame,
+    edits: Dict[str, Any],
+) -> Tuple[pandas.DataFrame, int]:
+    """
+    Überträgt die Editor-Änderungen einer Seite auf die (frisch gelesene)
+    Gesamttabelle. edits ist der Editor-Zustand aus st.session_state
+    (edited_rows, added_rows, deleted_rows, Positionen relativ zur Seite).
+    Gibt (neue Tabelle, Anzahl betroffener Zeilen) zurück.
+    """
+    df = df.copy()
+    rows_by_key: Dict[Tuple[str, ...], List[Any]] = {}
+    for label, row in zip(df.index, df.to_dict("records")):
+        rows_by_key.setdefault(_row_key(row), []).append(label)
+    page_keys = [_row_key(r) for r in page_df.to_dict("records")]
+    changed = 0
+
+    for pos, values in (edits.get("edited_rows") or {}).items():
+        labels = rows_by_key.get(page_keys[int(pos)], [])
+        for col, value in values.items():
+            if col not in df.columns:
+                df[col] = ""
+            # Leere Spalten liest pandas als float64; Text passt dort nicht hinein.
+            if df[col].dtype != object:
+                df[col] = df[col].astype(object)
+            df.loc[labels, col] = value
+        changed += len(labels)
+
+    deleted = [label for pos in edits.get("deleted_rows") or [] for label in rows_by_key.get(page_keys[int(pos)], [])]
+    if deleted:
+        df = df.drop(index=deleted)
+        changed += len(deleted)
+
+    added = [row for row in edits.get("added_rows") or [] if row]
+    if added:
+        df = pd.concat([df, pd.DataFrame(added)], ignore_index=True)
+        changed += len(added)
+
+    return df.reset_index(drop=True), changed
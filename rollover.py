@@ -0,0 +1,226 @@
+"""
+Monatswechsel: Ordnerbaum und Vorlagen pro Mitarbeiter und Projekt.
+
+Vorlagen liegen im Vorlagen-Ordner in zwei Unterordnern:
+    Mitarbeiter/<Vorlage>   -> eine Kopie je aktivem Mitarbeiter
+    Projekte/<Vorlage>      -> eine Kopie je aktivem Projekt
+
+Zielstruktur im Monatsordner:
+    <YYYY-MM>/Mitarbeiter/<Name>/<Vorlage>_<Name>_<YYYY-MM>.<ext>
+    <YYYY-MM>/Projekte/<Projekt>/<Vorlage>_<Projekt>_<YYYY-MM>.<ext>
+
+Kopiert wird serverseitig (copy_file) auf einem Thread-Pool. Ein
+Token-Bucket hält die Schreibrate unter dem Drive-Limit, verbleibende
+429-Antworten wiederholt der Client mit Backoff. Der IdCache kennt alle
+Ordner und Dateien des Monatsbaums aus gebündelten Listings; ein zweiter
+Lauf legt daher nichts doppelt an und ist ein reiner Abgleich.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import drive_store as ds
+
+
+LOGGER = logging.getLogger(__name__)
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+EMPLOYEE_FOLDER = "Mitarbeiter"
+PROJECT_FOLDER = "Projekte"
+ROLLOVER_WORKERS = 8
+# Deutlich unter der Drive-Quote pro Nutzer; Drosselungen (429) fangen
+# die Retries ab.
+WRITE_RATE_PER_SEC = 20.0
+NUM_RETRIES = 5
+# Eltern-Ordner pro Listing ("'a' in parents or 'b' in parents ...").
+LIST_BATCH = 20
+
+
+class RateLimiter:
+    """
+    Token-Bucket, thread-sicher: acquire() blockiert bis ein Token frei ist.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or rate
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class IdCache:
+    """
+    (Eltern-ID, Name) -> Datei-ID für alle bekannten Ordner und Dateien.
+    Wird aus gebündelten Listings gefüllt und bei jedem Anlegen ergänzt.
+    """
+
+    def __init__(self):
+        self._ids: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, parent_id: str, name: str) -> Optional[str]:
+        with self._lock:
+            return self._ids.get((parent_id, name))
+
+    def put(self, parent_id: str, name: str, file_id: str) -> None:
+        with self._lock:
+            self._ids.setdefault((parent_id, name), file_id)
+
+    def load(self, service, parent_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Liest den Inhalt mehrerer Ordner mit möglichst wenigen Aufrufen.
+        Gibt die gefundenen Einträge zurück; Fehler werden weitergereicht.
+        """
+        parent_ids = [pid for pid in dict.fromkeys(parent_ids) if pid]
+        found = []
+        for i in range(0, len(parent_ids), LIST_BATCH):
+            batch = parent_ids[i:i + LIST_BATCH]
+            parents = " or ".join(f"'{pid}' in parents" for pid in batch)
+            token = None
+            while True:
+                response = service.files().list(
+                    q=f"({parents}) and trashed = false",
+                    fields="nextPageToken, files(id, name, mimeType, parents)",
+                    pageSize=1000,
+                    pageToken=token,
+                    supportsAllDrives=True,
+                    includeItemsFromAllDrives=True,
+                ).execute(num_retries=NUM_RETRIES)
+                for meta in response.get("files", []):
+                    for pid in meta.get("parents", []):
+                        if pid in batch:
+                            self.put(pid, meta["name"], meta["id"])
+                    found.append(meta)
+                token = response.get("nextPageToken")
+                if not token:
+                    break
+        return found
+
+
+def target_name(template_name: str, owner: str, period: str) -> str:
+    stem, ext = os.path.splitext(template_name)
+    return f"{stem}_{owner}_{period}{ext}"
+
+
+class Rollover:
+    """
+    Legt den Monatsbaum an und kopiert alle Vorlagen. run() ist
+    wiederholbar: vorhandene Ordner und Kopien werden übersprungen.
+    """
+
+    def __init__(
+        self,
+        service_factory: Callable[[], Any],
+        templates_folder_id: str,
+        target_folder_id: str,
+        period: str,
+        employees: List[str],
+        projects: List[str],
+        workers: int = ROLLOVER_WORKERS,
+        rate: float = WRITE_RATE_PER_SEC,
+    ):
+        self._service_factory = service_factory
+        self.templates_folder_id = templates_folder_id
+        self.target_folder_id = target_folder_id
+        self.period = period
+        self.owners = {EMPLOYEE_FOLDER: employees, PROJECT_FOLDER: projects}
+        self.workers = workers
+        self.cache = IdCache()
+        self._limiter = RateLimiter(rate)
+        self._lock = threading.Lock()
+        self.report = {"folders_created": 0, "copied": 0, "skipped": 0, "failed": 0, "seconds": 0.0}
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.report[key] += n
+
+    def _folder(self, service, parent_id: str, name: str) -> str:
+        folder_id = self.cache.get(parent_id, name)
+        if folder_id:
+            return folder_id
+        self._limiter.acquire()
+        folder = service.files().create(
+            body={"name": name, "parents": [parent_id], "mimeType": FOLDER_MIME},
+            fields="id",
+            supportsAllDrives=True,
+        ).execute(num_retries=NUM_RETRIES)
+        self.cache.put(parent_id, name, folder["id"])
+        self._count("folders_created")
+        return folder["id"]
+
+    def _templates(self, service) -> Dict[str, List[Dict[str, Any]]]:
+        self.cache.load(service, [self.templates_folder_id])
+        groups = {group: self.cache.get(self.templates_folder_id, group) for group in self.owners}
+        files = self.cache.load(service, [fid for fid in groups.values() if fid])
+        return {
+            group: [m for m in files if fid in m.get("parents", []) and m.get("mimeType") != FOLDER_MIME]
+            for group, fid in groups.items()
+        }
+
+    def _parallel(self, fn: Callable, items: List) -> list:
+        # Ein Drive-Client pro Worker-Thread (ds.get_drive_service ist thread-lokal).
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="rollover") as pool:
+            return list(pool.map(fn, items))
+
+    def _copy(self, job: Tuple[str, str, str]) -> None:
+        source_id, name, folder_id = job
+        self._limiter.acquire()
+        file_id = ds.copy_file(self._service_factory(), source_id, name, folder_id, num_retries=NUM_RETRIES)
+        if file_id:
+            self.cache.put(folder_id, name, file_id)
+            self._count("copied")
+        else:
+            self._count("failed")
+
+    def run(self) -> Dict[str, Any]:
+        started = time.monotonic()
+        service = self._service_factory()
+        templates = self._templates(service)
+
+        # Monatsordner und Gruppenordner (wenige, daher sequentiell).
+        self.cache.load(service, [self.target_folder_id])
+        month_id = self._folder(service, self.target_folder_id, self.period)
+        self.cache.load(service, [month_id])
+        group_ids = {group: self._folder(service, month_id, group) for group in self.owners}
+
+        # Ordner je Mitarbeiter/Projekt: vorhandene in einem Listing, fehlende parallel.
+        self.cache.load(service, group_ids.values())
+        pairs = list(dict.fromkeys((group_ids[group], owner) for group, owners in self.owners.items() for owner in owners))
+        owner_ids = dict(zip(pairs, self._parallel(lambda pair: self._folder(self._service_factory(), *pair), pairs)))
+
+        # Vorhandene Kopien gebündelt lesen, nur fehlende kopieren.
+        self.cache.load(service, owner_ids.values())
+        copies = []
+        for (group_id, owner), folder_id in owner_ids.items():
+            group = next(g for g, gid in group_ids.items() if gid == group_id)
+            for template in templates[group]:
+                name = target_name(template["name"], owner, self.period)
+                if self.cache.get(folder_id, name):
+                    self._count("skipped")
+                else:
+                    copies.append((template["id"], name, folder_id))
+        self._parallel(self._copy, copies)
+
+        self.report["seconds"] = round(time.monotonic() - started, 2)
+        LOGGER.info("Monatswechsel %s: %s", self.period, self.report)
+        if self.report["failed"]:
+            raise RuntimeError(f"{self.report['failed']} Vorlage(n) konnten nicht kopiert werden.")
+        return self.report
@@ -0,0 +1,239 @@
+"""
+Prozessübergreifender Cache für mehrere App-Repliken.
+
+st.cache_data lebt nur in einem Streamlit-Prozess. Dieser Cache liegt als
+SQLite-Datei auf einem gemeinsamen Volume; alle Repliken schauen hier nach,
+bevor sie Drive abfragen.
+
+- Einträge werden per Schlüssel (Tupel) abgelegt und sind größenbegrenzt;
+  bei Überschreitung werden die am längsten nicht gelesenen verdrängt.
+- Versionsstempel pro Namensraum (Ordner- oder Datei-ID): bump() erhöht
+  den Zähler für alle Repliken. Wer den Stempel in den Schlüssel aufnimmt,
+  sieht nach einer Invalidierung automatisch neue Daten.
+
+WAL setzt voraus, dass alle Repliken auf demselben Host laufen (z.B.
+gemeinsames Docker-Volume); für Netzlaufwerke (NFS/SMB) ist SQLite nicht
+geeignet.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from state import STATE_DIR
+
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join(os.environ.get("BAUAPP_SHARED_CACHE_DIR", STATE_DIR), "shared_cache.sqlite3")
+DEFAULT_MAX_BYTES = int(os.environ.get("BAUAPP_SHARED_CACHE_MB", "512")) * 1024 * 1024
+# Grössere Einträge (z.B. Plan-PDFs) bleiben im Prozess-Cache; sie würden
+# den gemeinsamen Cache leerräumen und bei jedem get() ganz entpickelt.
+DEFAULT_MAX_ENTRY_BYTES = int(os.environ.get("BAUAPP_SHARED_CACHE_ENTRY_MB", "8")) * 1024 * 1024
+# Nach dem Verdrängen bleibt etwas Luft, damit nicht jeder put() aufräumt.
+EVICT_TARGET = 0.9
+# Versionsstempel werden pro Prozess kurz zwischengespeichert (Sekunden).
+VERSION_TTL_SEC = 1.0
+# Zugriffszeit nur grob nachführen, damit Lesen kaum Schreiblast erzeugt.
+TOUCH_INTERVAL_SEC = 60.0
+
+
+def _key(key: Hashable) -> str:
+    return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+
+class SharedCache:
+    """
+    SQLite-basierter Schlüssel-Wert-Cache mit Versionsstempeln.
+    Eine Verbindung pro Aufruf, wie beim IdempotencyStore.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_DB_PATH,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_entry_bytes: int = DEFAULT_MAX_ENTRY_BYTES,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self._versions: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evicted": 0, "oversize": 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            # Laufende Gesamtgrösse, von Triggern gepflegt und damit für alle
+            # Repliken gleich; put() muss so nicht über die ganze Tabelle summieren.
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO totals (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM entries")
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries"
+                " BEGIN UPDATE totals SET bytes = bytes + NEW.size WHERE id = 0; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries"
+                " BEGIN UPDATE totals SET bytes = bytes + NEW.size - OLD.size WHERE id = 0; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries"
+                " BEGIN UPDATE totals SET bytes = bytes - OLD.size WHERE id = 0; END"
+            )
+            conn.execute("COMMIT")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS versions ("
+                " namespace TEXT PRIMARY KEY,"
+                " version INTEGER NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    # --- Versionsstempel ------------------------------------------------
+    def version(self, namespace: str) -> int:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(namespace)
+            if cached and now - cached[1] < VERSION_TTL_SEC:
+                return cached[0]
+        with self._connect() as conn:
+            row = conn.execute("SELECT version FROM versions WHERE namespace = ?", (namespace,)).fetchone()
+        version = row[0] if row else 0
+        with self._lock:
+            self._versions[namespace] = (version, now)
+        return version
+
+    def bump(self, *namespaces: str) -> None:
+        """
+        Erhöht die Versionsstempel; für alle Repliken sofort sichtbar.
+        """
+        namespaces = [ns for ns in namespaces if ns]
+        if not namespaces:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO versions (namespace, version) VALUES (?, 1)"
+                " ON CONFLICT(namespace) DO UPDATE SET version = version + 1",
+                ((ns,) for ns in namespaces),
+            )
+        with self._lock:
+            for ns in namespaces:
+                self._versions.pop(ns, None)
+
+    # --- Einträge -------------------------------------------------------
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        k = _key(key)
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, accessed FROM entries WHERE key = ?", (k,)).fetchone()
+            if row and time.time() - row[1] > TOUCH_INTERVAL_SEC:
+                conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), k))
+        with self._lock:
+            self._stats["hits" if row else "misses"] += 1
+        if not row:
+            return False, None
+        return True, pickle.loads(row[0])
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Legt einen Eintrag ab. Einträge über max_entry_bytes werden nicht
+        gespeichert; Bytes werden schon vor dem Pickeln geprüft.
+        """
+        if isinstance(value, (bytes, bytearray)) and len(value) > self.max_entry_bytes:
+            self._skip_oversize()
+            return
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_entry_bytes:
+            self._skip_oversize()
+            return
+        with self._connect() as conn:
+            # Upsert statt REPLACE: REPLACE löscht ohne Delete-Trigger.
+            conn.execute(
+                "INSERT INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, accessed = excluded.accessed",
+                (_key(key), sqlite3.Binary(blob), len(blob), time.time()),
+            )
+            total = conn.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(conn, total)
+
+    def _skip_oversize(self) -> None:
+        with self._lock:
+            self._stats["oversize"] += 1
+
+    def _evict(self, conn: sqlite3.Connection, total: int) -> None:
+        target = self.max_bytes * EVICT_TARGET
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+            if total <= target:
+                break
+            victims.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+        with self._lock:
+            self._stats["evicted"] += len(victims)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Liefert den Eintrag oder lädt ihn über loader und legt ihn ab.
+        Fehler des Loaders werden nicht gespeichert; ist die Cache-Datei
+        gesperrt oder defekt, wird direkt geladen.
+        """
+        try:
+            hit, value = self.get(key)
+            if hit:
+                return value
+        except Exception as e:
+            LOGGER.warning("Gemeinsamer Cache nicht lesbar: %s", e)
+        value = loader()
+        try:
+            self.put(key, value)
+        except Exception as e:
+            LOGGER.warning("Gemeinsamer Cache nicht beschreibbar: %s", e)
+        return value
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+
+    def stats(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            size = conn.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+        with self._lock:
+            return dict(self._stats, entries=entries, bytes=size)
+
+
+class NullCache:
+    """
+    Platzhalter, solange kein gemeinsamer Cache konfiguriert ist.
+    """
+
+    def version(self, namespace: str) -> int:
+        return 0
+
+    def bump(self, *namespaces: str) -> None:
+        pass
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        return loader()
+
+    def clear(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        return {}
@@ -0,0 +1,11 @@
+"""
+Verzeichnis für lokale Zustandsdateien (SQLite-Indizes, Exporte).
+
+Alle Repliken einer Installation sollten dasselbe Verzeichnis sehen
+(z.B. ein gemeinsames Docker-Volume), sonst greift der Schutz vor
+Doppelbuchungen nur pro Replik.
+"""
+import os
+
+
+STATE_DIR = os.environ.get("BAUAPP_STATE_DIR", ".bauapp_state")
@@ -0,0 +1,48 @@
+from datetime import date
+
+import pandas as pd
+
+import absences as absn
+import idempotency as idem
+
+
+def _book(start, end, a_typ="Ferien", user="Anna", skip_holidays=True):
+    days = absn.WorkCalendar("ZH").business_days(start, end, skip_holidays=skip_holidays)
+    return absn.build_absence_rows(days, "2026-03-01 08:00:00", "P1", user, 8.5, a_typ, "", "Offen", start, end)
+
+
+def test_business_days_skip_weekend_and_easter():
+    days = absn.WorkCalendar("ZH").business_days(date(2026, 4, 2), date(2026, 4, 7))
+    # Karfreitag 3.4., Wochenende, Ostermontag 6.4.
+    assert [d.date() for d in days] == [date(2026, 4, 2), date(2026, 4, 7)]
+
+
+def test_holidays_depend_on_canton():
+    zh = absn.WorkCalendar("ZH").holidays(date(2026, 6, 4), date(2026, 6, 4))
+    lu = absn.WorkCalendar("LU").holidays(date(2026, 6, 4), date(2026, 6, 4))
+    assert zh == [] and lu == [date(2026, 6, 4)]  # Fronleichnam
+
+
+def test_absence_rows_share_erfasst_and_keep_entered_range():
+    _, rows_z = _book(date(2026, 3, 7), date(2026, 3, 13))
+    assert rows_z["Datum"].tolist() == ["2026-03-09", "2026-03-10", "2026-03-11", "2026-03-12", "2026-03-13"]
+    assert rows_z["Erfasst"].nunique() == 1
+    assert set(rows_z["Absenz_Von"]) == {"2026-03-07"} and set(rows_z["Absenz_Bis"]) == {"2026-03-13"}
+
+
+def test_scan_rebuilds_claimed_hash_for_trimmed_ranges():
+    # Sa-Fr und ein Zeitraum, der auf Ostermontag endet: gebuchte Tage != Eingabe.
+    ranges = [(date(2026, 3, 7), date(2026, 3, 13)), (date(2026, 3, 30), date(2026, 4, 6))]
+    frames = [_book(start, end)[1].assign(Erfasst=f"2026-03-01 08:00:0{i}") for i, (start, end) in enumerate(ranges)]
+    df_z = pd.concat(frames, ignore_index=True)
+
+    scanned = set(idem.scan_existing(pd.DataFrame(), df_z))
+    claimed = {idem.tx_hash(idem.absence_tx_string(start, end, "Ferien", "Anna")) for start, end in ranges}
+    assert claimed <= scanned
+
+
+def test_scan_falls_back_to_booked_days_for_legacy_rows():
+    _, rows_z = _book(date(2026, 3, 9), date(2026, 3, 10))
+    legacy = rows_z.drop(columns=["Absenz_Von", "Absenz_Bis"])
+    scanned = set(idem.scan_existing(pd.DataFrame(), legacy))
+    assert idem.tx_hash(idem.absence_tx_string(date(2026, 3, 9), date(2026, 3, 10), "Ferien", "Anna")) in scanned
@@ -0,0 +1,40 @@
+from datetime import date
+
+import pandas as pd
+
+import absences as absn
+import azk_export as azk
+from drive_fake import FakeDriveService
+
+
+def _absence(start, end, user, erfasst):
+    days = absn.WorkCalendar("ZH").business_days(start, end)
+    return absn.build_absence_rows(days, erfasst, "P1", user, 8.5, "Krankheit", "", "Offen", start, end)[1]
+
+
+def test_absence_starts_include_blocks_from_previous_month():
+    df_z = pd.concat([
+        _absence(date(2026, 2, 25), date(2026, 3, 4), "Anna", "2026-02-25 08:00:00"),
+        _absence(date(2026, 2, 10), date(2026, 2, 12), "Anna", "2026-02-10 08:00:00"),
+        _absence(date(2026, 3, 20), date(2026, 3, 20), "Beat", "2026-03-20 08:00:00"),
+    ], ignore_index=True)
+    assert azk.absence_starts(df_z, "2026-03") == {"Anna": {"2026-02-25"}, "Beat": {"2026-03-20"}}
+
+
+def test_absence_starts_for_rows_without_entered_range():
+    df_z = _absence(date(2026, 2, 26), date(2026, 3, 3), "Anna", "2026-02-26 08:00:00").drop(columns=["Absenz_Von", "Absenz_Bis"])
+    assert azk.absence_starts(df_z, "2026-03") == {"Anna": {"2026-02-26"}}
+
+
+def test_zeugnis_files_by_overlap_and_across_pages():
+    svc = FakeDriveService()
+    folder = svc.add_folder("Plaene")
+    for i in range(150):
+        svc.add_file(f"Plan_{i:03d}.pdf", [folder], b"x", "application/pdf")
+    svc.add_file("ZEUGNIS_Anna_2026-02-25_scan.pdf", [folder], b"a", "application/pdf")
+    svc.add_file("ZEUGNIS_Anna_2026-02-10_alt.pdf", [folder], b"b", "application/pdf")
+    svc.add_file("ZEUGNIS_Anna Muster_2026-03-02_x.pdf", [folder], b"c", "application/pdf")
+
+    files = azk.zeugnis_files(svc, folder, ["Anna", "Anna Muster"], "2026-03", {"Anna": {"2026-02-25"}})
+    assert [f["name"] for f in files["Anna"]] == ["ZEUGNIS_Anna_2026-02-25_scan.pdf"]
+    assert [f["name"] for f in files["Anna Muster"]] == ["ZEUGNIS_Anna Muster_2026-03-02_x.pdf"]
@@ -0,0 +1,106 @@
+import threading
+import time
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from drive_changes import ChangeWatcher
+from drive_fake import FakeDriveService
+
+
+def _setup():
+    svc = FakeDriveService()
+    a, b, other = svc.add_folder("A"), svc.add_folder("B"), svc.add_folder("X")
+    changed = []
+    watcher = ChangeWatcher(lambda: svc, [a, b], on_change=lambda *keys: changed.extend(keys))
+    watcher.poll_once()
+    return svc, watcher, changed, a, b, other
+
+
+def test_new_file_bumps_its_parent_folder_only():
+    svc, watcher, changed, a, b, other = _setup()
+    fid = svc.add_file("x.csv", [a], b"1")["id"]
+    svc.add_file("y.csv", [other], b"1")
+    assert watcher.poll_once() == 2
+    assert watcher.generation(a) == 1
+    assert watcher.generation(fid) == 1
+    assert watcher.generation(b) == 0
+    assert a in changed and b not in changed
+
+
+def test_removed_file_bumps_its_known_parent():
+    svc, watcher, changed, a, b, other = _setup()
+    fid = svc.add_file("x.csv", [b], b"1")["id"]
+    watcher.poll_once()
+    svc.files().delete(fileId=fid).execute()
+    watcher.poll_once()
+    assert watcher.generation(b) == 2
+    assert watcher.generation(a) == 0
+
+
+def test_removed_file_of_unknown_origin_bumps_all_folders():
+    svc, watcher, changed, a, b, other = _setup()
+    fid = svc.add_file("x.csv", [other], b"1")["id"]
+    watcher = ChangeWatcher(lambda: svc, [a, b])
+    watcher.poll_once()
+    svc.files().delete(fileId=fid).execute()
+    watcher.poll_once()
+    assert watcher.generation(a) == watcher.generation(b) == 1
+
+
+def test_moved_file_bumps_old_and_new_folder():
+    svc, watcher, changed, a, b, other = _setup()
+    fid = svc.add_file("x.csv", [a], b"1")["id"]
+    watcher.poll_once()
+    svc.files().update(fileId=fid, addParents=b, removeParents=a).execute()
+    watcher.poll_once()
+    assert watcher.generation(a) == 2
+    assert watcher.generation(b) == 1
+
+
+@pytest.mark.parametrize("status", [400, 410])
+def test_invalid_token_resets_feed_and_bumps_everything(status, monkeypatch):
+    svc, watcher, changed, a, b, other = _setup()
+
+    def expired(*args):
+        raise HttpError(httplib2.Response({"status": status}), b"token expired")
+
+    monkeypatch.setattr(svc, "_list_changes", expired)
+    assert watcher.poll_once() == 0
+    assert watcher.generation(a) == watcher.generation(b) == 1
+    assert set(changed) == {a, b}
+
+    monkeypatch.undo()
+    svc.add_file("x.csv", [a], b"1")
+    assert watcher.poll_once() == 1
+    assert watcher.generation(a) == 2
+
+
+def test_other_errors_are_raised(monkeypatch):
+    svc, watcher, changed, a, b, other = _setup()
+
+    def broken(*args):
+        raise HttpError(httplib2.Response({"status": 500}), b"backend error")
+
+    monkeypatch.setattr(svc, "_list_changes", broken)
+    with pytest.raises(HttpError):
+        watcher.poll_once()
+
+
+def test_background_thread_builds_its_own_client():
+    svc = FakeDriveService()
+    folder = svc.add_folder("A")
+    built = []
+
+    def factory():
+        built.append(threading.current_thread().name)
+        return svc
+
+    watcher = ChangeWatcher(factory, [folder], interval=0.05).start()
+    deadline = time.monotonic() + 2
+    while "drive-change-watcher" not in built and time.monotonic() < deadline:
+        time.sleep(0.01)
+    watcher.stop()
+    assert built.count(threading.current_thread().name) == 1
+    assert built.count("drive-change-watcher") == 1
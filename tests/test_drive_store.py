@@ -0,0 +1,82 @@
+import io
+
+import drive_store as ds
+from drive_fake import FakeDriveService
+
+
+def test_list_files_follows_next_page_token():
+    svc = FakeDriveService()
+    folder = svc.add_folder("Fotos")
+    for i in range(1005):
+        svc.add_file(f"P1_{i:04d}.jpg", [folder], f"foto {i}".encode(), "image/jpeg")
+
+    files = ds.list_files(svc, folder)
+    assert len(files) == 1005
+    assert len({f["id"] for f in files}) == 1005
+
+
+def test_dedup_uploader_sees_files_beyond_first_page():
+    svc = FakeDriveService()
+    folder = svc.add_folder("Fotos")
+    for i in range(1001):
+        svc.add_file(f"P1_{i:04d}.jpg", [folder], f"foto {i}".encode(), "image/jpeg")
+
+    uploader = ds.DedupUploader(svc, folder, scope="P1")
+    # Der Inhalt der letzten Datei liegt erst auf der zweiten Seite.
+    uploader.upload("P1_neu.jpg", io.BytesIO(b"foto 1000"), "image/jpeg")
+    assert uploader.report["skipped"] == 1
+    assert uploader.report["uploaded"] == 0
+
+
+def test_concurrent_read_csv_shares_listing_and_download():
+    import threading
+
+    svc = FakeDriveService()
+    folder = svc.add_folder("P")
+    svc.add_file("Projects.csv", [folder], b"Projekt_ID,Projekt_Name\n1,P1\n", "text/csv")
+    ds.read_csv(svc, folder, "Projects.csv")
+    single = svc.get_stats()["calls"]
+
+    svc.configure(latency=0.2)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def read():
+        barrier.wait()
+        results.append(ds.read_csv(svc, folder, "Projects.csv"))
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert svc.get_stats()["calls"] - single == single
+    assert all(df["Projekt_Name"].tolist() == ["P1"] for df, _ in results)
+    results[0][0].loc[0, "Projekt_Name"] = "geändert"
+    assert results[1][0].loc[0, "Projekt_Name"] == "P1"
+
+
+def test_read_after_save_does_not_join_older_read():
+    import pandas as pd
+
+    svc = FakeDriveService()
+    folder = svc.add_folder("P")
+    df, fid = ds.read_csv(svc, folder, "Projects.csv")
+    assert fid is None and df.empty
+    ds.save_csv(svc, folder, "Projects.csv", pd.DataFrame({"Projekt_Name": ["P1"]}))
+    df, fid = ds.read_csv(svc, folder, "Projects.csv")
+    assert fid and df["Projekt_Name"].tolist() == ["P1"]
+
+
+def test_download_file_bytes_goes_through_spooled_buffer(monkeypatch):
+    monkeypatch.setattr(ds, "SPOOL_MAX_SIZE", 1024)
+    svc = FakeDriveService()
+    folder = svc.add_folder("PL")
+    content = bytes(range(256)) * 200
+    fid = svc.add_file("plan.pdf", [folder], content, "application/pdf")["id"]
+    assert ds.download_file_bytes(svc, fid) == content
+    fh = ds.open_download(svc, fid)
+    with fh:
+        assert fh._rolled
+        assert fh.read() == content
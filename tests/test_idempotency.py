@@ -0,0 +1,90 @@
+import threading
+
+from idempotency import IdempotencyStore
+
+
+def test_claim_is_exclusive_until_released(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idem.sqlite3"))
+    assert store.claim("a", label="rapport")
+    assert not store.claim("a")
+    assert store.seen("a")
+    store.release("a")
+    assert not store.seen("a")
+    assert store.claim("a")
+
+
+def test_expired_claim_can_be_taken_again(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idem.sqlite3"))
+    assert store.claim("a", ttl_sec=-1)
+    assert not store.seen("a")
+    assert len(store) == 0
+    assert store.claim("a")
+    assert not store.claim("a")
+
+
+def test_claim_many_counts_duplicates_once(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idem.sqlite3"))
+    assert store.claim("b")
+    assert store.claim_many(["a", "b", "c", "a"]) == [True, False, True, False]
+    assert len(store) == 3
+    store.release_many(["a", "c"])
+    assert store.claim_many(["a", "c"]) == [True, True]
+
+
+def test_claim_many_purges_expired_entries(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idem.sqlite3"))
+    store.claim_many(["a", "b"], ttl_sec=-1)
+    assert store.claim_many(["a", "b"]) == [True, True]
+
+
+def test_concurrent_claims_from_separate_stores_win_once(tmp_path):
+    path = str(tmp_path / "idem.sqlite3")
+    stores = [IdempotencyStore(path) for _ in range(8)]
+    barrier = threading.Barrier(len(stores))
+    results = []
+
+    def claim(store):
+        barrier.wait()
+        results.append(store.claim("same"))
+
+    threads = [threading.Thread(target=claim, args=(s,)) for s in stores]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(results) == [False] * 7 + [True]
+
+
+def test_seed_extends_and_blocks_claims(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idem.sqlite3"))
+    assert store.seed(["a", "b", "a"]) == 2
+    assert store.claim_many(["a", "b", "c"]) == [False, False, True]
+
+
+def test_scan_existing_keeps_arbeit_of_rapports_saved_in_the_same_second():
+    import pandas as pd
+
+    import idempotency as idem
+
+    erfasst = "2026-03-05 18:00:00"
+    df_p = pd.DataFrame({
+        "Erfasst": [erfasst, erfasst],
+        "Datum": ["2026-03-05", "2026-03-05"],
+        "Projekt": ["P1", "P2"],
+        "Mitarbeiter": ["Anna", "Beat"],
+        "Arbeit": ["Plättli verlegt", "Fugen silikoniert"],
+    })
+    df_z = pd.DataFrame({
+        "Erfasst": [erfasst, erfasst],
+        "Datum": ["2026-03-05", "2026-03-05"],
+        "Projekt": ["P1", "P2"],
+        "Mitarbeiter": ["Anna", "Beat"],
+        "Start": ["07:00", "07:30"],
+        "Ende": ["16:30", "17:00"],
+        "Absenz_Typ": ["", ""],
+    })
+    expected = {
+        idem.tx_hash(idem.rapport_tx_string("2026-03-05", "07:00:00", "16:30:00", "Plättli verlegt", "P1", "Anna")),
+        idem.tx_hash(idem.rapport_tx_string("2026-03-05", "07:30:00", "17:00:00", "Fugen silikoniert", "P2", "Beat")),
+    }
+    assert set(idem.scan_existing(df_p, df_z)) == expected
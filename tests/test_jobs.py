@@ -0,0 +1,118 @@
+import sqlite3
+import time
+
+import jobs
+
+
+def _wait(log, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = log.get(job_id)
+        if job["status"] in (jobs.DONE, jobs.FAILED):
+            return job
+        time.sleep(0.02)
+    raise AssertionError("Job wurde nicht fertig")
+
+
+def _runner(log, calls, fail=None):
+    fail = fail if fail is not None else set()
+
+    def plan(params):
+        def step(name):
+            def run(service, p):
+                if name in fail:
+                    raise RuntimeError("kaputt")
+                calls.append(name)
+            return name, run
+        return [step(n) for n in ("a", "b", "c")]
+
+    runner = jobs.JobRunner(lambda: None, log=log, lease_sec=1.0, heartbeat_sec=0.1)
+    runner.register("demo", plan)
+    return runner
+
+
+def test_submit_runs_all_steps(tmp_path):
+    log = jobs.JobLog(str(tmp_path / "jobs.sqlite3"))
+    calls = []
+    job = _wait(log, _runner(log, calls).submit("demo", {"x": 1}))
+    assert calls == ["a", "b", "c"]
+    assert (job["status"], job["step"], job["total"]) == (jobs.DONE, 3, 3)
+
+
+def test_orphaned_job_resumes_at_checkpoint(tmp_path):
+    log = jobs.JobLog(str(tmp_path / "jobs.sqlite3"))
+    job_id, _ = log.create("demo", {"x": 1})
+    # Abgestürzter Prozess: Schritt "b" begonnen, Lease längst abgelaufen.
+    assert log.claim(job_id, "dead:1")
+    log.checkpoint(job_id, "dead:1", 1, 3, "b")
+    with sqlite3.connect(log.path) as conn:
+        conn.execute("UPDATE jobs SET heartbeat = 0")
+
+    calls = []
+    runner = _runner(log, calls)
+    assert runner.resume() == 1
+    job = _wait(log, job_id)
+    assert calls == ["b", "c"]
+    assert job["status"] == jobs.DONE and job["owner"] == runner.owner
+
+
+def test_live_lease_is_not_taken_over(tmp_path):
+    log = jobs.JobLog(str(tmp_path / "jobs.sqlite3"))
+    job_id, _ = log.create("demo", {"x": 1})
+    assert log.claim(job_id, "alive:1")
+    assert log.claim(job_id, "other:2", lease_sec=60) is None
+
+
+def test_failed_step_can_be_retried(tmp_path):
+    log = jobs.JobLog(str(tmp_path / "jobs.sqlite3"))
+    calls, fail = [], {"b"}
+    runner = _runner(log, calls, fail)
+    job = _wait(log, runner.submit("demo", {"x": 1}))
+    assert job["status"] == jobs.FAILED and job["step"] == 1
+
+    fail.clear()
+    assert runner.retry(job["id"])
+    job = _wait(log, job["id"])
+    assert job["status"] == jobs.DONE
+    assert calls == ["a", "b", "c"]
+
+
+def test_duplicate_submit_returns_pending_job(tmp_path):
+    log = jobs.JobLog(str(tmp_path / "jobs.sqlite3"))
+    first, created = log.create("demo", {"name": "P1"})
+    second, created_again = log.create("demo", {"name": "P1"})
+    assert created and not created_again and first == second
+
+
+def test_kind_at_its_limit_does_not_block_other_kinds(tmp_path):
+    import threading
+
+    log = jobs.JobLog(str(tmp_path / "jobs.sqlite3"))
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def blocking(params):
+        return [("warten", lambda service, p: (started.set(), release.wait(5), calls.append(p["n"])))]
+
+    def quick(params):
+        return [("los", lambda service, p: calls.append("rollover"))]
+
+    runner = jobs.JobRunner(lambda: None, log=log, workers=2, lease_sec=5.0, heartbeat_sec=0.1)
+    runner.register("delete", blocking)
+    runner.register("rollover", quick)
+    first = runner.submit("delete", {"n": 1})
+    second = runner.submit("delete", {"n": 2})
+    assert started.wait(2)
+    assert log.get(second)["status"] == jobs.QUEUED
+
+    assert _wait(log, runner.submit("rollover", {}), timeout=2)["status"] == jobs.DONE
+    assert log.get(first)["status"] == jobs.RUNNING
+
+    runner.start()
+    try:
+        release.set()
+        assert _wait(log, first)["status"] == jobs.DONE
+        assert _wait(log, second)["status"] == jobs.DONE
+    finally:
+        runner.stop()
+    assert calls == ["rollover", 1, 2]
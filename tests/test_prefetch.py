@@ -0,0 +1,87 @@
+import threading
+import time
+
+from prefetch import Prefetcher
+
+
+def _wait(batch, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        s = batch.stats
+        if s["done"] + s["skipped"] + s["failed"] == s["scheduled"]:
+            return s
+        time.sleep(0.01)
+    raise AssertionError(f"Prefetch nicht fertig: {batch.stats}")
+
+
+def test_follow_ups_stop_at_task_budget():
+    ran = []
+
+    def listing(svc):
+        return [lambda svc, i=i: ran.append(i) for i in range(10)]
+
+    batch = Prefetcher(lambda: object()).schedule("s1", [listing], max_tasks=5)
+    stats = _wait(batch)
+    assert stats["scheduled"] == 5
+    assert stats["done"] == 5
+    assert len(ran) == 4
+
+
+def _blocker():
+    started, release = threading.Event(), threading.Event()
+
+    def task(svc):
+        started.set()
+        release.wait(2)
+
+    return task, started, release
+
+
+def test_new_batch_cancels_queued_tasks_of_the_old_one():
+    block, started, release = _blocker()
+    ran = []
+    prefetcher = Prefetcher(lambda: object(), workers=1)
+
+    first = prefetcher.schedule("s1", [block, lambda svc: ran.append("alt")])
+    assert started.wait(2)
+    second = prefetcher.schedule("s1", [lambda svc: ran.append("neu")])
+    other = prefetcher.schedule("s2", [lambda svc: ran.append("andere")])
+    release.set()
+
+    assert _wait(first)["skipped"] == 1
+    assert _wait(second)["done"] == 1
+    assert _wait(other)["done"] == 1
+    assert "alt" not in ran
+
+
+def test_cancel_skips_remaining_tasks():
+    block, started, release = _blocker()
+    prefetcher = Prefetcher(lambda: object(), workers=1)
+    batch = prefetcher.schedule("s1", [block, lambda svc: None, lambda svc: None])
+    assert started.wait(2)
+    prefetcher.cancel("s1")
+    release.set()
+    assert _wait(batch)["skipped"] == 2
+
+
+def test_deadline_stops_queued_tasks_and_follow_ups():
+    def slow(svc):
+        time.sleep(0.1)
+        return [lambda svc: None]
+
+    prefetcher = Prefetcher(lambda: object(), workers=1)
+    batch = prefetcher.schedule("s1", [slow, lambda svc: None], budget_sec=0.05)
+    stats = _wait(batch)
+    assert stats == {"scheduled": 2, "done": 1, "skipped": 1, "failed": 0}
+
+
+def test_failed_task_is_counted_and_gets_worker_service():
+    services = []
+
+    def fail(svc):
+        services.append(svc)
+        raise RuntimeError("Drive weg")
+
+    batch = Prefetcher(lambda: "svc").schedule("s1", [fail])
+    assert _wait(batch)["failed"] == 1
+    assert services == ["svc"]
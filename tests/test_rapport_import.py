@@ -0,0 +1,49 @@
+import io
+
+import pandas as pd
+import pytest
+
+import rapport_import as rimp
+
+
+RAW = pd.DataFrame({
+    "Datum": ["02.03.2026", "2026-03-03", "03.03.2026", "04.03.2026"],
+    "Projekt": ["", "P1", "P1", "P1"],
+    "Mitarbeiter": ["Anna", "Beat", "Anna", "Anna"],
+    "Start": ["07:00", "07:00", "07:00", "07:00"],
+    "Ende": ["16:30", "12:00", "08:00", "16:00"],
+    "Pause_Min": ["60", "", "90", "30.5"],
+    "R_Wohn_Bau_Min": ["45", "", "", ""],
+    "R_Bau_Wohn_Min": ["20", "", "", ""],
+    "Arbeit": ["Schalung", "Armierung", "x", "y"],
+})
+
+
+def test_prepare_computes_times_and_rejects_invalid_rows():
+    valid, rejected = rimp.prepare(RAW, default_project="P1", projects=["P1"], employees=["Anna", "Beat"])
+
+    assert valid["Datum"].tolist() == ["2026-03-02", "2026-03-03"]
+    assert valid["Stunden_Total"].tolist() == [8.5, 5.0]
+    assert valid["Reisezeit_bezahlt_Min"].tolist() == [15, 0]
+    assert valid["Arbeitszeit_inkl_Reisezeit"].tolist() == [8.75, 5.0]
+    assert rejected["Fehler"].tolist() == ["Endzeit abzüglich Pause vor Startzeit", "Minuten nicht ganzzahlig"]
+    assert rejected["Datum"].tolist() == ["03.03.2026", "04.03.2026"]
+
+
+def test_build_rows_match_manual_entry_format():
+    valid, _ = rimp.prepare(RAW, default_project="P1")
+    rows_p, rows_z = rimp.build_rows(valid, "2026-03-05 18:00:00", "Offen")
+
+    assert rows_z["Erfasst"].tolist() == ["2026-03-05 18:00:00", "2026-03-05 18:00:01"]
+    assert rows_p["Erfasst"].tolist() == rows_z["Erfasst"].tolist()
+    for col in ("Pause_Min", "R_Wohn_Bau_Min", "R_Bau_Wohn_Min", "Reisezeit_bezahlt_Min"):
+        assert all(type(v) is int for v in rows_z[col].tolist()), col
+    csv = rows_z.to_csv(index=False)
+    assert ",60," in csv and ",60.0," not in csv
+
+
+def test_old_excel_format_is_rejected_with_a_clear_message():
+    upload = io.BytesIO(b"")
+    upload.name = "Rapporte.xls"
+    with pytest.raises(ValueError, match="xlsx"):
+        rimp.read_import_file(upload)
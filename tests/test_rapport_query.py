@@ -0,0 +1,50 @@
+import io
+
+import pandas as pd
+
+import rapport_query as rq
+
+
+CSV = (
+    "Erfasst,Datum,Projekt,Mitarbeiter,Arbeit,Material,Bemerkung,Status\n"
+    "2026-03-02 07:00:00,2026-03-02,P1,Anna,Schalung,,,Offen\n"
+    "2026-03-03 07:00:00,2026-03-03,P1,Beat,Armierung,,,Offen\n"
+    "2026-03-04 07:00:00,2026-03-04,P2,Anna,Betonieren,,,Offen\n"
+)
+
+
+def _table() -> pd.DataFrame:
+    return pd.read_csv(io.StringIO(CSV))
+
+
+def test_edit_in_all_empty_column():
+    df = _table()
+    assert df["Material"].dtype == "float64"
+    idx = rq.RapportIndex(df)
+    page_df = idx.page(idx.query(project="P1"), 1, 27)
+    pos = page_df.index[page_df["Mitarbeiter"] == "Anna"][0]
+
+    df_new, changed = rq.apply_page_edits(df, page_df, {"edited_rows": {str(pos): {"Material": "Zement"}}})
+
+    assert changed == 1
+    assert df_new.loc[df_new["Arbeit"] == "Schalung", "Material"].tolist() == ["Zement"]
+    assert df_new["Material"].isna().sum() == 2
+
+
+def test_edit_delete_and_add_on_page():
+    df = _table()
+    idx = rq.RapportIndex(df)
+    page_df = idx.page(idx.query(employee="Anna"), 1, 27)
+
+    edits = {
+        "edited_rows": {"0": {"Status": "Druckbereit"}},
+        "deleted_rows": [1],
+        "added_rows": [{"Erfasst": "2026-03-05 07:00:00", "Datum": "2026-03-05", "Projekt": "P2", "Mitarbeiter": "Anna"}],
+    }
+    df_new, changed = rq.apply_page_edits(df, page_df, edits)
+
+    assert changed == 3
+    assert len(df_new) == 3
+    assert df_new.loc[df_new["Arbeit"] == "Betonieren", "Status"].tolist() == ["Druckbereit"]
+    assert "Schalung" not in df_new["Arbeit"].tolist()
+    assert "Beat" in df_new["Mitarbeiter"].tolist()
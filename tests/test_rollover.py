@@ -0,0 +1,50 @@
+from collections import Counter
+
+import rollover
+from drive_fake import FakeDriveService
+
+
+def _drive():
+    svc = FakeDriveService()
+    templates = svc.add_folder("Vorlagen")
+    target = svc.add_folder("Monate")
+    employees = svc.add_file(rollover.EMPLOYEE_FOLDER, [templates], b"", rollover.FOLDER_MIME)["id"]
+    projects = svc.add_file(rollover.PROJECT_FOLDER, [templates], b"", rollover.FOLDER_MIME)["id"]
+    svc.add_file("AZK.xlsx", [employees], b"azk")
+    svc.add_file("Spesen.xlsx", [employees], b"spesen")
+    svc.add_file("Rapport.xlsx", [projects], b"rapport")
+    return svc, templates, target
+
+
+def _rollover(svc, templates, target, employees, projects):
+    return rollover.Rollover(lambda: svc, templates, target, "2026-11", employees, projects, workers=4, rate=1000)
+
+
+def _names(svc):
+    files = svc.files().list(q="trashed = false", pageSize=1000).execute()["files"]
+    return Counter((tuple(m["parents"]), m["name"]) for m in files)
+
+
+def test_rerun_creates_and_copies_nothing():
+    svc, templates, target = _drive()
+    first = _rollover(svc, templates, target, ["Anna", "Beat"], ["P1"]).run()
+    assert first["folders_created"] == 1 + 2 + 3
+    assert first["copied"] == 2 * 2 + 1
+    before = _names(svc)
+
+    second = _rollover(svc, templates, target, ["Anna", "Beat"], ["P1"]).run()
+    assert second["folders_created"] == 0
+    assert second["copied"] == 0
+    assert second["skipped"] == 5
+    assert _names(svc) == before
+    assert max(before.values()) == 1
+
+
+def test_rerun_completes_a_partial_month():
+    svc, templates, target = _drive()
+    _rollover(svc, templates, target, ["Anna"], []).run()
+    report = _rollover(svc, templates, target, ["Anna", "Beat"], ["P1"]).run()
+    assert report["folders_created"] == 2
+    assert report["copied"] == 3
+    assert report["skipped"] == 2
+    assert max(_names(svc).values()) == 1
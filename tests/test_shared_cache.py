@@ -0,0 +1,70 @@
+import pickle
+import sqlite3
+
+from shared_cache import SharedCache
+
+
+def _sum(cache):
+    with sqlite3.connect(cache.path) as conn:
+        return conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+
+def test_running_total_follows_puts_overwrites_and_clear(tmp_path):
+    cache = SharedCache(str(tmp_path / "c.sqlite3"), max_bytes=10_000_000)
+    cache.put("a", b"x" * 1000)
+    cache.put("b", b"y" * 2000)
+    cache.put("a", b"z" * 10)
+    assert cache.stats()["bytes"] == _sum(cache)
+    assert cache.stats()["entries"] == 2
+    cache.clear()
+    assert cache.stats()["bytes"] == 0
+
+
+def test_eviction_drops_least_recently_read(tmp_path):
+    cache = SharedCache(str(tmp_path / "c.sqlite3"), max_bytes=5000)
+    for key in "abcd":
+        cache.put(key, b"x" * 1000)
+    cache.put("e", b"x" * 2000)
+    assert cache.get("a") == (False, None)
+    assert cache.get("e")[0]
+    assert cache.stats()["bytes"] == _sum(cache) <= 5000
+
+
+def test_replicas_share_entries_and_versions(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    one, two = SharedCache(path), SharedCache(path)
+    calls = []
+    assert one.get_or_load(("csv", "f1"), lambda: calls.append(1) or "daten") == "daten"
+    assert two.get_or_load(("csv", "f1"), lambda: calls.append(2) or "neu") == "daten"
+    assert calls == [1]
+
+    one.bump("ordner")
+    two._versions.clear()
+    assert two.version("ordner") == 1
+
+
+def test_total_is_seeded_for_existing_files(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    SharedCache(path).put("a", b"x" * 500)
+    with sqlite3.connect(path) as conn:
+        conn.execute("DROP TABLE totals")
+    assert SharedCache(path).stats()["bytes"] == _sum(SharedCache(path))
+
+
+def test_oversize_entries_skip_the_shared_tier(tmp_path, monkeypatch):
+    cache = SharedCache(str(tmp_path / "c.sqlite3"), max_bytes=10_000_000, max_entry_bytes=1000)
+    cache.put("small", b"x" * 100)
+
+    dumped = []
+    real_dumps = pickle.dumps
+    monkeypatch.setattr(pickle, "dumps", lambda *a, **kw: dumped.append(a[0]) or real_dumps(*a, **kw))
+    cache.put("plan", b"y" * 5000)
+    assert dumped == []
+    cache.put("rows", ["z" * 600, "w" * 600])
+    assert len(dumped) == 1
+
+    assert cache.get("plan") == (False, None)
+    assert cache.get("rows") == (False, None)
+    assert cache.get("small") == (True, b"x" * 100)
+    assert cache.stats()["oversize"] == 2
+    assert cache.get_or_load("plan", lambda: b"y" * 5000) == b"y" * 5000